@@ -1,8 +1,8 @@
 # app.py - Main application file
 from flask import Flask
+import click
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from dotenv import load_dotenv
 import os
 import datetime
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -11,20 +11,27 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from routes.auth import auth_bp
 from routes.dates import dates_bp, admin_dates_bp
 from routes.users import users_bp
-
-# Load environment variables
-load_dotenv()
+from db import Database
+import health
+import metrics
+from json_provider import MongoJSONProvider
+from utils import register_jwt_callbacks, register_request_id
 
 def create_app():
     """Factory pattern for creating the Flask application"""
     app = Flask(__name__)
     
+    # Serialize ObjectId/datetime natively (orjson when available)
+    app.json = MongoJSONProvider(app)
+    
     # Configure app
     app.config.from_mapping(
         JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY"),
         JWT_ACCESS_TOKEN_EXPIRES=datetime.timedelta(days=7),
+        JWT_ROLE_CLAIMS=os.getenv("JWT_ROLE_CLAIMS", "False").lower() == "true",
         MONGO_URI=os.getenv("CONNECTION_STRING"),
-        DEBUG=os.getenv("DEBUG_MODE", "False").lower() == "true"
+        DEBUG=os.getenv("DEBUG_MODE", "False").lower() == "true",
+        METRICS_ENABLED=os.getenv("METRICS_ENABLED", "True").lower() == "true"
     )
     
     # Configure CORS
@@ -39,6 +46,17 @@ def create_app():
     
     # Set up JWT
     jwt = JWTManager(app)
+    register_jwt_callbacks(jwt)
+    
+    # Request ids for logs and the X-Request-ID header
+    register_request_id(app)
+    
+    # Per-route latency histograms and the /metrics endpoint
+    if app.config["METRICS_ENABLED"]:
+        metrics.init_app(app)
+    
+    # Liveness and readiness probes (/healthz, /readyz)
+    health.init_app(app)
     
     # Handle proxy headers for proper IP detection
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
@@ -54,6 +72,21 @@ def create_app():
     def home():
         return "<h1>DentixPro API - Backend en Flask para el sistema de citas dentales</h1>"
     
+    # CLI command to report (and optionally create) declared indexes
+    @app.cli.command("indexes")
+    @click.option("--apply", is_flag=True, help="Create missing indexes before reporting")
+    def indexes(apply):
+        """Show differences between declared and existing MongoDB indexes"""
+        db_instance = Database.get_instance()
+        if apply:
+            db_instance.ensure_indexes()
+        
+        for collection_name, diff in db_instance.diff_indexes().items():
+            click.echo(f"{collection_name}:")
+            for status in ("missing", "mismatched", "extra"):
+                names = ", ".join(diff[status]) or "-"
+                click.echo(f"  {status}: {names}")
+    
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+# asgi.py - Async (ASGI) entry point
+from quart import Quart, g, request
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import ClosingIterator
+import asyncio
+import itertools
+import os
+import time
+
+from app import create_app
+from config import configure_logging
+from db import AsyncDatabase, Database
+from json_provider import MongoJSONProvider
+from async_utils import register_request_id
+import metrics
+
+# Import async blueprints
+from routes.async_auth import auth_bp
+from routes.async_dates import dates_bp, admin_dates_bp
+from routes.async_users import users_bp
+
+# Largest request body forwarded to the WSGI app (bulk imports are big)
+WSGI_MAX_BODY_SIZE = 16 * 1024 * 1024
+
+def always_send_body(wsgi_app):
+    """Make the WSGI app yield at least one body chunk
+    
+    The hypercorn adapter only sends the status line together with the first
+    chunk, so empty responses (CORS preflight, 204) would lose their status.
+    """
+    def wrapper(environ, start_response):
+        response = wsgi_app(environ, start_response)
+        return ClosingIterator(itertools.chain(response, [b""]), getattr(response, "close", None))
+    return wrapper
+
+def create_async_app(flask_app):
+    """Create the Quart application serving the async routes"""
+    app = Quart(__name__)
+    app.json = MongoJSONProvider(app)
+    
+    # Share the JWT settings so tokens are valid in both apps
+    for key in ("JWT_SECRET_KEY", "JWT_ACCESS_TOKEN_EXPIRES", "JWT_ROLE_CLAIMS", "DEBUG"):
+        app.config[key] = flask_app.config.get(key)
+    
+    allowed_origin = os.getenv("ALLOWED_ORIGIN", "")
+    
+    # Same CORS headers as the Flask app (preflight requests are served there)
+    @app.after_request
+    async def add_cors_headers(response):
+        origin = request.headers.get("Origin")
+        if origin and allowed_origin in ("*", origin):
+            response.headers["Access-Control-Allow-Origin"] = origin
+            response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.vary.add("Origin")
+        return response
+    
+    register_request_id(app)
+    
+    # Latency of the async routes goes into the same registry as Flask's
+    if flask_app.config.get("METRICS_ENABLED"):
+        @app.before_request
+        async def start_timer():
+            g.request_started = time.perf_counter()
+        
+        @app.after_request
+        async def record_latency(response):
+            started = g.pop("request_started", None)
+            if started is not None:
+                endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+                metrics.observe_request(request.method, endpoint, response.status_code, time.perf_counter() - started)
+            return response
+    
+    # The async routes rely on the declared indexes too (active_slot_unique
+    # prevents double booking), and only the synchronous Database creates
+    # them, when it connects (MONGO_ENSURE_INDEXES)
+    @app.before_serving
+    async def ensure_indexes():
+        await asyncio.to_thread(Database.get_instance)
+    
+    @app.after_serving
+    async def close_database():
+        await AsyncDatabase.reset()
+    
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(dates_bp, url_prefix='/api/dates')
+    app.register_blueprint(admin_dates_bp, url_prefix='/api/admin/dates')
+    app.register_blueprint(users_bp, url_prefix='/api/users')
+    
+    return app
+
+def create_asgi_app():
+    """Build the ASGI application
+    
+    Requests matching an async route go to the Quart app; everything else
+    (including CORS preflight) is served by the Flask app through a WSGI
+    adapter, so routes can be ported one at a time.
+    """
+    flask_app = create_app()
+    async_app = create_async_app(flask_app)
+    wsgi_app = AsyncioWSGIMiddleware(always_send_body(flask_app), max_body_size=WSGI_MAX_BODY_SIZE)
+    adapter = async_app.url_map.bind("")
+    
+    def is_async_route(scope):
+        if scope["method"] == "OPTIONS":
+            return False
+        try:
+            adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return False
+        return True
+    
+    async def dispatcher(scope, receive, send):
+        if scope["type"] == "lifespan" or (scope["type"] == "http" and is_async_route(scope)):
+            await async_app(scope, receive, send)
+        else:
+            await wsgi_app(scope, receive, send)
+    
+    dispatcher.async_app = async_app
+    dispatcher.flask_app = flask_app
+    return dispatcher
+
+# Configure logging
+logger = configure_logging()
+
+# Create application instance (hypercorn asgi:app)
+app = create_asgi_app()
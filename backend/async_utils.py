@@ -0,0 +1,215 @@
+# async_utils.py - Helpers and middleware for the async (ASGI) routes
+import datetime
+import uuid
+from functools import wraps
+from http import HTTPStatus
+
+import jwt
+from quart import current_app, g, jsonify, make_response, request
+
+from config import request_id_var, REQUEST_ID_PATTERN
+from db import AsyncDatabase
+from utils import SERVER_BUSY_MSG, USER_CACHE_FIELDS, build_etag, build_page, build_page_query, user_cache
+
+# Same claim layout as Flask-JWT-Extended, so tokens work in both modes
+JWT_ALGORITHM = "HS256"
+
+def create_user_token(user):
+    """Create an access token compatible with the WSGI app"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    claims = {
+        "fresh": False,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "type": "access",
+        "sub": user["userId"],
+        "nbf": now,
+        "exp": now + current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+    }
+    if current_app.config.get("JWT_ROLE_CLAIMS"):
+        claims["rol"] = user.get("rol")
+        claims["ver"] = user.get("token_version", 0)
+    return jwt.encode(claims, current_app.config["JWT_SECRET_KEY"], algorithm=JWT_ALGORITHM)
+
+async def get_cached_user(user_id):
+    """Get a user (without password) through the shared in-process cache"""
+    user = user_cache.get(user_id)
+    if user is None:
+        users_collection = AsyncDatabase.get_instance().get_collection("users")
+        user = await users_collection.find_one({"userId": user_id}, USER_CACHE_FIELDS)
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+async def get_data_version(user_id):
+    """Async version of utils.get_data_version"""
+    users_collection = AsyncDatabase.get_instance().get_collection("users")
+    user = await users_collection.find_one({"userId": user_id}, {**USER_CACHE_FIELDS, "data_version": 1})
+    if not user:
+        return None
+    
+    version = user.pop("data_version", 0)
+    user_cache.set(user_id, user)
+    return version
+
+async def bump_data_version(*user_ids):
+    """Async version of utils.bump_data_version"""
+    users_collection = AsyncDatabase.get_instance().get_collection("users")
+    await users_collection.update_many({"userId": {"$in": list(user_ids)}}, {"$inc": {"data_version": 1}})
+
+async def get_user_data(user_id):
+    """Get user data from database (excluding sensitive info)"""
+    user = await get_cached_user(user_id)
+    if user:
+        return {
+            "userId": user["userId"],
+            "name": user["name"],
+            "email": user.get("email"),
+            "rol": user.get("rol")
+        }
+    return None
+
+def get_jwt_identity():
+    """Identity of the token verified for the current request"""
+    return g.jwt["sub"]
+
+async def get_current_role():
+    """Get the role of the current user, from the token when available"""
+    claims = g.jwt
+    if current_app.config.get("JWT_ROLE_CLAIMS") and "ver" in claims:
+        return claims.get("rol")
+    
+    user = await get_cached_user(claims["sub"])
+    return user.get("rol") if user else None
+
+async def _verify_jwt_in_request():
+    """Decode the bearer token, returning an error response on failure"""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"msg": "Missing Authorization Header"}), HTTPStatus.UNAUTHORIZED
+    
+    try:
+        claims = jwt.decode(
+            auth_header[len("Bearer "):],
+            current_app.config["JWT_SECRET_KEY"],
+            algorithms=[JWT_ALGORITHM]
+        )
+    except jwt.ExpiredSignatureError:
+        return jsonify({"msg": "Token has expired"}), HTTPStatus.UNAUTHORIZED
+    except jwt.InvalidTokenError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.UNPROCESSABLE_ENTITY
+    
+    if claims.get("type") != "access":
+        return jsonify({"msg": "Only non-refresh tokens are allowed"}), HTTPStatus.UNPROCESSABLE_ENTITY
+    
+    # Role tokens are revoked when the user's token_version moves on; read
+    # through the user cache, so up to USER_CACHE_TTL stale on other workers
+    if "ver" in claims:
+        user = await get_cached_user(claims["sub"])
+        if not user or user.get("token_version", 0) != claims["ver"]:
+            return jsonify({"msg": "Token has been revoked"}), HTTPStatus.UNAUTHORIZED
+    
+    g.jwt = claims
+    return None
+
+def register_request_id(app):
+    """Async version of utils.register_request_id (each request runs in its own context)"""
+    @app.before_request
+    async def set_request_id():
+        request_id = request.headers.get("X-Request-ID", "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request_id_var.set(request_id)
+    
+    @app.after_request
+    async def add_request_id_header(response):
+        response.headers["X-Request-ID"] = request_id_var.get()
+        return response
+
+async def hasher_busy_response(err):
+    """Async version of utils.hasher_busy_response"""
+    return jsonify({"msg": SERVER_BUSY_MSG}), HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": "1"}
+
+def jwt_required(fn):
+    """Decorator requiring a valid access token"""
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        error = await _verify_jwt_in_request()
+        if error:
+            return error
+        return await fn(*args, **kwargs)
+    return wrapper
+
+def admin_required(fn):
+    """Decorator to check if user has admin role"""
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        error = await _verify_jwt_in_request()
+        if error:
+            return error
+        
+        # Check if user exists and has admin role
+        if await get_current_role() != "admin":
+            return jsonify({"msg": "Acceso denegado: se requieren permisos de administrador"}), HTTPStatus.FORBIDDEN
+        
+        return await fn(*args, **kwargs)
+    return wrapper
+
+def etag_by_data_version(fn):
+    """Async version of utils.etag_by_data_version"""
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        user_id = get_jwt_identity()
+        version = await get_data_version(user_id)
+        if version is None:
+            return await fn(*args, **kwargs)
+        
+        etag = build_etag(user_id, version, request.full_path)
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class("", status=HTTPStatus.NOT_MODIFIED)
+        else:
+            response = await make_response(await fn(*args, **kwargs))
+            if response.status_code != HTTPStatus.OK:
+                return response
+        
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return wrapper
+
+def validate_request_json(required_fields):
+    """Decorator to validate request JSON data"""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            data = await request.get_json(silent=True)
+            if not data:
+                return jsonify({"msg": "Datos JSON requeridos"}), HTTPStatus.BAD_REQUEST
+            
+            missing_fields = [field for field in required_fields if field not in data]
+            if missing_fields:
+                return jsonify({
+                    "msg": f"Campos requeridos faltantes: {', '.join(missing_fields)}"
+                }), HTTPStatus.BAD_REQUEST
+            
+            return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+async def paginate_results(collection, query, page=1, page_size=10, sort_by=None, after=None, with_total=True,
+                           projection=None):
+    """Async version of utils.paginate_results"""
+    collection = AsyncDatabase.get_instance().get_collection(collection)
+    
+    find_query, sort_spec, projection = build_page_query(query, sort_by, after, projection)
+    cursor = collection.find(find_query, projection).sort(sort_spec)
+    
+    if not after:
+        cursor = cursor.skip((page - 1) * page_size)
+    
+    # Fetch one extra document to know whether another page exists
+    results = await cursor.limit(page_size + 1).to_list(page_size + 1)
+    
+    total_count = await collection.count_documents(query) if with_total else None
+    
+    return build_page(results, page, page_size, sort_by, after, total_count)
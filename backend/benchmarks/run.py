@@ -0,0 +1,402 @@
+# benchmarks/run.py - Route benchmarks with regression baselines
+#
+# Usage (from backend/):
+#   python -m benchmarks.run                      # mongomock stand-in
+#   python -m benchmarks.run --mongo-uri mongodb://localhost:27017
+#   python -m benchmarks.run --routes dates. --requests 500 --concurrency 16
+#   python -m benchmarks.run --save-baseline      # record the current numbers
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from werkzeug.security import generate_password_hash
+
+# mongomock is only needed when no MongoDB URI is given
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+from app import create_app
+from config import get_config
+from db import Database
+from utils import create_user_token, user_cache
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+BENCH_DB_NAME = "dentixpro_bench"
+BENCH_PASSWORD = "benchpassword123"
+
+# Bookable times used when seeding (one appointment per slot)
+SLOT_TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(9, 17) for minute in (0, 30)]
+
+class Context:
+    """Seeded data and tokens shared by the scenarios"""
+    
+    def __init__(self, app, db, users, admin, date_ids):
+        self.app = app
+        self.db = db
+        self.users = users
+        self.admin = admin
+        self.date_ids = date_ids
+        self.today = datetime.date.today()
+        
+        with app.app_context():
+            self.user_headers = {"Authorization": f"Bearer {create_user_token(users[0])}"}
+            self.admin_headers = {"Authorization": f"Bearer {create_user_token(admin)}"}
+    
+    def day(self, offset):
+        return (self.today + datetime.timedelta(days=offset)).isoformat()
+    
+    def pending_dates(self, count, first_day, user_id=None):
+        """Insert pending appointments on free days and return their ids"""
+        user_id = user_id or self.users[0]["userId"]
+        dates = [{
+            "userId": user_id,
+            "title": "Cita de benchmark",
+            "date": self.day(first_day + i // len(SLOT_TIMES)),
+            "time": SLOT_TIMES[i % len(SLOT_TIMES)],
+            "description": "Preparada para el benchmark",
+            "status": "pending",
+            "created_at": datetime.datetime.now()
+        } for i in range(count)]
+        return [str(date_id) for date_id in self.db.get_collection("dates").insert_many(dates).inserted_ids]
+    
+    def fresh_users(self, count, prefix):
+        """Insert users sharing the benchmark password; returns (user id, headers) pairs"""
+        template = {key: value for key, value in self.users[0].items() if key != "_id"}
+        users = [{
+            **template,
+            "userId": f"bench-{prefix}-{i:06d}",
+            "name": f"Bench {prefix} {i}",
+            "email": f"{prefix}-{i}@bench.dentixpro"
+        } for i in range(count)]
+        self.db.get_collection("users").insert_many([dict(user) for user in users])
+        
+        with self.app.app_context():
+            return [(user["userId"], {"Authorization": f"Bearer {create_user_token(user)}"}) for user in users]
+
+class Scenario:
+    """One route driven by the benchmark
+    
+    ``build(ctx, i, items)`` returns ``(method, path, kwargs)`` for the i-th
+    request; ``prepare(ctx, count)`` creates the items consumed by requests
+    that change state (one per request).
+    """
+    
+    def __init__(self, name, build, expected=200, prepare=None):
+        self.name = name
+        self.build = build
+        self.expected = expected
+        self.prepare = prepare
+
+# Days far enough ahead that prepared data never collides with the seed
+def _days_ahead(block):
+    return 400 + block * 200
+
+def _pending_batches(ctx, count, size=10):
+    """Groups of pending appointment ids for the bulk status route"""
+    ids = ctx.pending_dates(count * size, _days_ahead(3))
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+def _import_body(ctx, i):
+    """NDJSON body filling every slot of one free day"""
+    # The last block: one day per request, however many there are
+    return "\n".join(json.dumps({
+        "userId": ctx.users[0]["userId"],
+        "title": "Cita importada",
+        "description": "Importada por el benchmark",
+        "date": ctx.day(_days_ahead(5) + i),
+        "time": time_slot
+    }) for time_slot in SLOT_TIMES)
+
+SCENARIOS = [
+    # auth
+    Scenario("auth.login", lambda ctx, i, items: ("POST", "/api/auth/login", {"json": {
+        "email": ctx.users[i % len(ctx.users)]["email"], "password": BENCH_PASSWORD}})),
+    Scenario("auth.signup", lambda ctx, i, items: ("POST", "/api/auth/signup", {"json": {
+        "name": "Bench Signup", "email": f"signup-{i}@bench.dentixpro", "password": BENCH_PASSWORD}}),
+        expected=201),
+    # dates
+    Scenario("dates.create_date", lambda ctx, i, items: ("POST", "/api/dates", {"headers": ctx.user_headers, "json": {
+        "title": "Cita de benchmark", "description": "Creada por el benchmark",
+        "date": ctx.day(_days_ahead(0) + i // len(SLOT_TIMES)), "time": SLOT_TIMES[i % len(SLOT_TIMES)]}}),
+        expected=201),
+    Scenario("dates.get_availability", lambda ctx, i, items: (
+        "GET", f"/api/dates/availability?from={ctx.day(1)}&to={ctx.day(14)}", {"headers": ctx.user_headers})),
+    Scenario("dates.cancel_date", lambda ctx, i, items: ("DELETE", f"/api/dates/{items[i]}", {"headers": ctx.user_headers}),
+             prepare=lambda ctx, count: ctx.pending_dates(count, _days_ahead(1))),
+    # admin_dates
+    Scenario("admin_dates.get_all_dates", lambda ctx, i, items: (
+        "GET", f"/api/admin/dates?page={i % 10 + 1}&page_size=20", {"headers": ctx.admin_headers})),
+    Scenario("admin_dates.get_all_dates_cursor", lambda ctx, i, items: (
+        "GET", "/api/admin/dates?page_size=20&with_total=false", {"headers": ctx.admin_headers})),
+    Scenario("admin_dates.get_dates_summary", lambda ctx, i, items: (
+        "GET", "/api/admin/dates/summary", {"headers": ctx.admin_headers})),
+    Scenario("admin_dates.export_dates", lambda ctx, i, items: (
+        "GET", f"/api/admin/dates/export?date_from={ctx.day(0)}&date_to={ctx.day(7)}", {"headers": ctx.admin_headers})),
+    Scenario("admin_dates.update_date", lambda ctx, i, items: (
+        "PUT", f"/api/admin/dates/{ctx.date_ids[i % len(ctx.date_ids)]}",
+        {"headers": ctx.admin_headers, "json": {"description": f"Actualizada {i}"}})),
+    Scenario("admin_dates.complete_date", lambda ctx, i, items: (
+        "PUT", f"/api/admin/dates/{items[i]}/complete", {"headers": ctx.admin_headers}),
+        prepare=lambda ctx, count: ctx.pending_dates(count, _days_ahead(2))),
+    Scenario("admin_dates.cancel_date", lambda ctx, i, items: (
+        "PUT", f"/api/admin/dates/{items[i]}/cancel", {"headers": ctx.admin_headers}),
+        prepare=lambda ctx, count: ctx.pending_dates(count, _days_ahead(4))),
+    Scenario("admin_dates.bulk_update_status", lambda ctx, i, items: (
+        "PUT", "/api/admin/dates/bulk/status",
+        {"headers": ctx.admin_headers, "json": {"ids": items[i], "status": "completed"}}),
+        prepare=_pending_batches),
+    Scenario("admin_dates.import_dates", lambda ctx, i, items: (
+        "POST", "/api/admin/dates/bulk",
+        {"headers": ctx.admin_headers, "content_type": "application/x-ndjson", "data": _import_body(ctx, i)})),
+    # users
+    Scenario("users.get_current_user", lambda ctx, i, items: ("GET", "/api/users/me", {"headers": ctx.user_headers})),
+    Scenario("users.get_user_dates", lambda ctx, i, items: (
+        "GET", "/api/users/me/dates?page_size=20", {"headers": ctx.user_headers})),
+    Scenario("users.update_current_user", lambda ctx, i, items: (
+        "PUT", "/api/users/me", {"headers": ctx.user_headers, "json": {"name": f"Bench User {i}"}})),
+    Scenario("users.change_password", lambda ctx, i, items: (
+        "PUT", "/api/users/me/password", {"headers": items[i][1], "json": {
+            "current_password": BENCH_PASSWORD, "new_password": f"{BENCH_PASSWORD}-new"}}),
+        prepare=lambda ctx, count: ctx.fresh_users(count, "password")),
+    Scenario("users.get_all_users", lambda ctx, i, items: (
+        "GET", f"/api/users?page={i % 5 + 1}&page_size=20", {"headers": ctx.admin_headers})),
+    Scenario("users.get_user_by_id", lambda ctx, i, items: (
+        "GET", f"/api/users/{ctx.users[i % len(ctx.users)]['userId']}", {"headers": ctx.admin_headers})),
+    # Promoting revokes the user's tokens too, the costlier path of the update
+    Scenario("users.update_user", lambda ctx, i, items: (
+        "PUT", f"/api/users/{items[i][0]}", {"headers": ctx.admin_headers, "json": {"name": f"Promoted {i}", "rol": "admin"}}),
+        prepare=lambda ctx, count: ctx.fresh_users(count, "promoted")),
+    Scenario("users.reset_user_password", lambda ctx, i, items: (
+        "PUT", f"/api/users/{items[i][0]}/reset-password",
+        {"headers": ctx.admin_headers, "json": {"new_password": f"{BENCH_PASSWORD}-reset"}}),
+        prepare=lambda ctx, count: ctx.fresh_users(count, "reset")),
+]
+
+@contextmanager
+def copied_projections():
+    """Give every mongomock find its own copy of the projection
+    
+    mongomock edits the projection dict it is given, which races when
+    concurrent requests pass the same *_FIELDS constant; pymongo doesn't,
+    so the routes keep passing the constants. find_one goes through find.
+    """
+    original = mongomock.collection.Collection.find
+    
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        if isinstance(projection, dict):
+            projection = dict(projection)
+        return original(self, filter, projection, *args, **kwargs)
+    
+    mongomock.collection.Collection.find = find
+    try:
+        yield
+    finally:
+        mongomock.collection.Collection.find = original
+
+@contextmanager
+def bench_database(mongo_uri=None):
+    """Install a throw-away database as the process-wide Database instance"""
+    if mongo_uri:
+        config = {**get_config(), "CONNECTION_STRING": mongo_uri, "MONGO_DB_NAME": BENCH_DB_NAME,
+                  "METRICS_ENABLED": False}
+        db = Database(config)
+        db.client.drop_database(BENCH_DB_NAME)
+        db.ensure_indexes()
+    else:
+        if mongomock is None:
+            sys.exit("mongomock is not installed; pass --mongo-uri to use a MongoDB server")
+        db = Database.__new__(Database)
+        db.config = get_config()
+        db.client = mongomock.MongoClient()
+        db.db = db.client[BENCH_DB_NAME]
+    
+    Database._instance, Database._instance_pid = db, os.getpid()
+    user_cache.clear()
+    try:
+        with nullcontext() if mongo_uri else copied_projections():
+            yield db
+    finally:
+        if mongo_uri:
+            db.client.drop_database(BENCH_DB_NAME)
+        Database.reset()
+        user_cache.clear()
+
+def seed(db, users_count, dates_count):
+    """Insert users and appointments; returns (users, admin, date ids)"""
+    # Hash once: seeding measures nothing and hashing is the slow part
+    password_hash = generate_password_hash(BENCH_PASSWORD, get_config()["PASSWORD_HASH_METHOD"])
+    
+    users = [{
+        "userId": f"bench-user-{i:06d}",
+        "name": f"Bench User {i}",
+        "email": f"user{i}@bench.dentixpro",
+        "password": password_hash,
+        "rol": "user",
+        "token_version": 0,
+        "created_at": datetime.datetime.now()
+    } for i in range(users_count)]
+    admin = {**users[0], "userId": "bench-admin", "name": "Bench Admin", "email": "admin@bench.dentixpro", "rol": "admin"}
+    db.get_collection("users").insert_many(users + [admin])
+    
+    # Spread appointments over past and future days, one per slot
+    today = datetime.date.today()
+    statuses = ["pending", "completed", "cancelled"]
+    first_day = -(dates_count // len(SLOT_TIMES) // 2)
+    dates = [{
+        "userId": users[i % users_count]["userId"],
+        "title": f"Cita de prueba {i}",
+        "date": (today + datetime.timedelta(days=first_day + i // len(SLOT_TIMES))).isoformat(),
+        "time": SLOT_TIMES[i % len(SLOT_TIMES)],
+        "description": "Generada para el benchmark",
+        "status": statuses[i % len(statuses)],
+        "created_at": datetime.datetime.now()
+    } for i in range(dates_count)]
+    date_ids = db.get_collection("dates").insert_many(dates).inserted_ids if dates else []
+    
+    return users, admin, [str(date_id) for date_id in date_ids]
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_scenario(ctx, scenario, requests, concurrency, warmup):
+    """Drive one route at a fixed concurrency and summarize its latency"""
+    items = scenario.prepare(ctx, warmup + requests) if scenario.prepare else None
+    local = threading.local()
+    
+    def send(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = ctx.app.test_client()
+        method, path, kwargs = scenario.build(ctx, i, items)
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(warmup)))
+        
+        started = time.perf_counter()
+        samples = list(executor.map(send, range(warmup, warmup + requests)))
+        elapsed = time.perf_counter() - started
+    
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status != scenario.expected)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2)
+    }
+
+def run_suite(mongo_uri=None, users=200, dates=2000, requests=200, concurrency=8, warmup=10, routes=None):
+    """Seed a fresh database and benchmark every selected route"""
+    selected = [scenario for scenario in SCENARIOS
+                if not routes or any(scenario.name.startswith(prefix) for prefix in routes)]
+    
+    with bench_database(mongo_uri) as db:
+        users_list, admin, date_ids = seed(db, users, dates)
+        ctx = Context(create_app(), db, users_list, admin, date_ids)
+        
+        results = {}
+        for scenario in selected:
+            results[scenario.name] = run_scenario(ctx, scenario, requests, concurrency, warmup)
+            # Keep cached users from leaking across scenarios
+            user_cache.clear()
+    return results
+
+def compare(results, baseline, tolerance):
+    """List the routes slower than the baseline by more than tolerance"""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if current["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms > baseline {reference['p95_ms']} ms")
+        if current["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['rps']} req/s < baseline {reference['rps']} req/s")
+        if current["errors"] > reference.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} unexpected responses")
+    return regressions
+
+def print_results(results):
+    print(f"{'route':<36} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<36} {result['rps']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['errors']:>7}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API routes against stored baselines")
+    parser.add_argument("--mongo-uri", help="MongoDB server to seed (default: in-memory mongomock)")
+    parser.add_argument("--users", type=int, default=200, help="Users to seed")
+    parser.add_argument("--dates", type=int, default=2000, help="Appointments to seed")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per route")
+    parser.add_argument("--routes", nargs="*", help="Route name prefixes to run, e.g. dates. users.get_")
+    parser.add_argument("--baseline", default=BASELINES_PATH, help="Baselines file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args(argv)
+    
+    settings = {key: getattr(args, key) for key in ("users", "dates", "requests", "concurrency")}
+    backend = "mongodb" if args.mongo_uri else "mongomock"
+    
+    results = run_suite(args.mongo_uri, args.users, args.dates, args.requests, args.concurrency, args.warmup, args.routes)
+    print_results(results)
+    
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)
+    
+    if args.save_baseline:
+        stored = baselines.get(backend, {}).get("routes", {}) if baselines.get(backend, {}).get("settings") == settings else {}
+        baselines[backend] = {
+            "settings": settings,
+            "recorded_at": datetime.date.today().isoformat(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs, Python {platform.python_version()}",
+            "routes": {**stored, **results}
+        }
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baselines, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Baseline for {backend} saved to {args.baseline}")
+        return 0
+    
+    baseline = baselines.get(backend)
+    if not baseline:
+        print(f"No {backend} baseline stored; run with --save-baseline to create one")
+        return 0
+    if baseline["settings"] != settings:
+        print(f"Baseline was recorded with {baseline['settings']}, not comparing")
+        return 0
+    
+    regressions = compare(results, baseline["routes"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions against the {backend} baseline ({baseline['recorded_at']})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# benchmarks/seed.py - Synthetic clinic dataset for production-sized load tests
+#
+# Usage (from backend/, writes to CONNECTION_STRING / MONGO_DB_NAME):
+#   python -m benchmarks.seed                     # 20k users, 1M appointments
+#   python -m benchmarks.seed --users 500 --dates 20000 --drop --seed 42
+import argparse
+import datetime
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from werkzeug.security import generate_password_hash
+
+from config import configure_logging, get_config
+from db import Database
+from routes.dates import opening_slots_mask
+
+logger = configure_logging()
+
+FIRST_NAMES = ["Ana", "Carlos", "Lucía", "Javier", "María", "Diego", "Sofía", "Pablo", "Valentina", "Andrés",
+               "Camila", "Miguel", "Daniela", "José", "Paula", "Luis", "Elena", "Jorge", "Isabel", "Fernando"]
+LAST_NAMES = ["García", "Rodríguez", "López", "Martínez", "Hernández", "González", "Pérez", "Sánchez",
+              "Ramírez", "Torres", "Flores", "Rivera", "Gómez", "Díaz", "Morales", "Ortiz"]
+
+# (title, description, relative frequency)
+TREATMENTS = [
+    ("Limpieza dental", "Limpieza y profilaxis semestral", 30),
+    ("Revisión general", "Control rutinario y radiografías", 25),
+    ("Empaste dental", "Tratamiento de caries", 15),
+    ("Control de ortodoncia", "Ajuste de brackets", 12),
+    ("Extracción dental", "Extracción de pieza dental", 6),
+    ("Endodoncia", "Tratamiento de conducto", 5),
+    ("Blanqueamiento", "Blanqueamiento dental en consulta", 4),
+    ("Urgencia por dolor", "Atención de dolor agudo", 3),
+]
+TREATMENT_WEIGHTS = [weight for _, _, weight in TREATMENTS]
+
+# Status mix for past and future appointments
+PAST_STATUSES = (["completed", "cancelled", "pending"], [80, 15, 5])
+FUTURE_STATUSES = (["pending", "cancelled"], [90, 10])
+
+# Relative load per weekday (Monday first; the clinic closes on Sundays)
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 1.1, 0.5, 0.0]
+
+def display_name(i):
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+
+def generate_users(count, admins, password_hash, rng, now):
+    """Build user documents shaped like the ones signup creates"""
+    users = []
+    for i in range(count):
+        users.append({
+            "userId": str(ObjectId()),
+            "name": display_name(i),
+            "email": f"paciente{i}@seed.dentixpro",
+            "password": password_hash,
+            "rol": "admin" if i < admins else "user",
+            "token_version": 0,
+            "created_at": now - datetime.timedelta(days=rng.randint(0, 5 * 365), seconds=rng.randint(0, 86399))
+        })
+    return users
+
+def open_slot_weights(clinic_hours, slot_minutes):
+    """Bookable slot start times (minutes) with a morning/after-lunch peak"""
+    mask = opening_slots_mask(clinic_hours, slot_minutes)
+    slots = [slot * slot_minutes for slot in range(24 * 60 // slot_minutes) if mask >> slot & 1]
+    
+    weights = []
+    for minute in slots:
+        # Busier in the first opening hours of each session
+        weights.append(1.5 if 9 * 60 <= minute < 11 * 60 or 15 * 60 <= minute < 16 * 60 else 1.0)
+    return slots, weights
+
+def plan_days(total, start, days, capacity):
+    """Spread appointments over days by weekday load, at most capacity each"""
+    day_weights = [WEEKDAY_WEIGHTS[(start + datetime.timedelta(days=offset)).weekday()] for offset in range(days)]
+    scale = total / sum(day_weights)
+    
+    plan, assigned = [], 0
+    for offset, weight in enumerate(day_weights):
+        count = min(capacity, round(weight * scale))
+        count = min(count, total - assigned)
+        plan.append([offset, count])
+        assigned += count
+    
+    # Hand out what rounding or full days left over to days with room
+    for day in plan:
+        if assigned >= total:
+            break
+        if day_weights[day[0]]:
+            extra = min(capacity - day[1], total - assigned)
+            day[1] += extra
+            assigned += extra
+    return [tuple(day) for day in plan], assigned
+
+def generate_day(day, count, user_ids, slots, weights, today, rng):
+    """Appointments of one day, each in a distinct slot (the active-slot index allows one)"""
+    # Weighted sampling without replacement (Efraimidis-Spirakis)
+    keys = sorted(range(len(slots)), key=lambda i: rng.random() ** (1 / weights[i]), reverse=True)
+    statuses, status_weights = PAST_STATUSES if day < today else FUTURE_STATUSES
+    day_iso = day.isoformat()
+    
+    appointments = []
+    for slot_index in keys[:count]:
+        minute = slots[slot_index]
+        title, description, _ = rng.choices(TREATMENTS, TREATMENT_WEIGHTS)[0]
+        starts_at = datetime.datetime.combine(day, datetime.time(minute // 60, minute % 60))
+        created_at = starts_at - datetime.timedelta(days=rng.randint(1, 60), minutes=rng.randint(0, 1439))
+        status = rng.choices(statuses, status_weights)[0]
+        
+        appointment = {
+            "userId": rng.choice(user_ids),
+            "title": title,
+            "date": day_iso,
+            "time": f"{minute // 60:02d}:{minute % 60:02d}",
+            "description": description,
+            "status": status,
+            "created_at": created_at
+        }
+        if status == "completed":
+            appointment["completed_at"] = starts_at + datetime.timedelta(minutes=rng.randint(20, 90))
+        elif status == "cancelled":
+            appointment["cancelled_at"] = created_at + (starts_at - created_at) * rng.random()
+        appointments.append(appointment)
+    return appointments
+
+def insert_in_batches(collection, documents, batch_size):
+    """insert_many in unordered batches, returning (inserted, indexes of the documents that failed)"""
+    inserted, failed = 0, []
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        try:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as err:
+            # Slots already taken by existing data are skipped, not fatal
+            inserted += err.details["nInserted"]
+            failed.extend(start + error["index"] for error in err.details["writeErrors"])
+    return inserted, failed
+
+def produce_days(task):
+    """Generate and insert the appointments of a block of days (runs in a worker)"""
+    plan, start, user_ids, slot_minutes, batch_size, seed = task
+    rng = random.Random(seed)
+    config = get_config()
+    slots, weights = open_slot_weights(config["CLINIC_HOURS"], slot_minutes)
+    today = datetime.date.today()
+    
+    dates_collection = Database.get_instance().get_collection("dates")
+    inserted = failed = 0
+    buffer = []
+    for offset, count in plan:
+        buffer.extend(generate_day(start + datetime.timedelta(days=offset), count, user_ids, slots, weights, today, rng))
+        if len(buffer) >= batch_size:
+            batch_inserted, batch_failed = insert_in_batches(dates_collection, buffer, batch_size)
+            inserted, failed = inserted + batch_inserted, failed + len(batch_failed)
+            buffer = []
+    
+    batch_inserted, batch_failed = insert_in_batches(dates_collection, buffer, batch_size)
+    return inserted + batch_inserted, failed + len(batch_failed)
+
+def seed_appointments(total, user_ids, days_ahead=60, slot_minutes=1, batch_size=5000, workers=0, seed=None):
+    """Generate ``total`` appointments ending ``days_ahead`` days from today
+    
+    The range reaches as far back as needed to fit every appointment in a
+    free slot. Blocks of days are produced in parallel by ``workers``
+    processes, each with its own MongoClient (0 runs in this process).
+    """
+    slots, _ = open_slot_weights(get_config()["CLINIC_HOURS"], slot_minutes)
+    # Six open days a week, with some headroom for uneven weekdays
+    days = max(days_ahead + 1, math.ceil(total / len(slots) * 7 / 6 * 1.25))
+    start = datetime.date.today() + datetime.timedelta(days=days_ahead - days + 1)
+    plan, planned = plan_days(total, start, days, len(slots))
+    
+    base_seed = seed if seed is not None else random.randrange(2 ** 32)
+    block = max(1, math.ceil(len(plan) / max(1, workers * 4)))
+    tasks = [(plan[i:i + block], start, user_ids, slot_minutes, batch_size, base_seed + i)
+             for i in range(0, len(plan), block)]
+    
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(produce_days, tasks))
+    else:
+        results = [produce_days(task) for task in tasks]
+    
+    inserted = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    return {"planned": planned, "inserted": inserted, "failed": failed,
+            "from": start.isoformat(), "to": (start + datetime.timedelta(days=days - 1)).isoformat()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill MongoDB with a synthetic clinic dataset")
+    parser.add_argument("--users", type=int, default=20000, help="Users to create")
+    parser.add_argument("--admins", type=int, default=2, help="How many of them are admins")
+    parser.add_argument("--dates", type=int, default=1000000, help="Appointments to create")
+    parser.add_argument("--days-ahead", type=int, default=60, help="Last appointment day, counted from today")
+    parser.add_argument("--slot-minutes", type=int, default=1, help="Granularity of appointment times")
+    parser.add_argument("--password", default="password123", help="Password shared by every generated user")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Producer processes (0 = none)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible data")
+    parser.add_argument("--drop", action="store_true", help="Delete existing users and appointments first")
+    args = parser.parse_args(argv)
+    
+    db_instance = Database.get_instance()
+    users_collection = db_instance.get_collection("users")
+    dates_collection = db_instance.get_collection("dates")
+    
+    if args.drop:
+        users_collection.delete_many({})
+        dates_collection.delete_many({})
+        logger.info("Usuarios y citas existentes eliminados")
+    
+    started = time.perf_counter()
+    rng = random.Random(args.seed)
+    
+    # One hash for everyone: hashing a million passwords would take hours
+    password_hash = generate_password_hash(args.password, get_config()["PASSWORD_HASH_METHOD"])
+    users = generate_users(args.users, args.admins, password_hash, rng, datetime.datetime.now())
+    inserted_users, failed_users = insert_in_batches(users_collection, users, args.batch_size)
+    logger.info("%s usuarios creados (%s omitidos) en %.1fs", inserted_users, len(failed_users), time.perf_counter() - started)
+    
+    # Users whose email already existed were not created; don't book for them
+    skipped = set(failed_users)
+    user_ids = [user["userId"] for index, user in enumerate(users) if index not in skipped]
+    if not user_ids:
+        logger.error("No se creó ningún usuario; use --drop para reemplazar los datos existentes")
+        return 1
+    
+    result = seed_appointments(args.dates, user_ids, args.days_ahead, args.slot_minutes, args.batch_size,
+                               args.workers, args.seed)
+    elapsed = time.perf_counter() - started
+    logger.info("%s citas creadas (%s omitidas) entre %s y %s en %.1fs (%.0f citas/s)",
+                result["inserted"], result["failed"], result["from"], result["to"], elapsed,
+                result["inserted"] / elapsed if elapsed else 0)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,107 @@
 # config.py - Application configuration
 import os
+import atexit
+import contextvars
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import re
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import datetime
+from dotenv import load_dotenv
+
+# Read .env before anything builds settings from get_config() at import time
+# (the user cache, gunicorn.conf.py); variables already set still win. This
+# is the only place it is loaded, and it doesn't depend on the working directory
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+# Id of the request being handled, attached to every log record
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# Accepted format for client-supplied X-Request-ID headers
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Background thread writing queued log records (one per process)
+_log_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+    
+    def format(self, record):
+        created = datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+        entry = {
+            "time": created.isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to each record"""
+    
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO/DEBUG records; warnings and errors always pass"""
+    
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue records without formatting them on the calling thread
+    
+    The listener formats them later; records never leave the process, so
+    the stdlib's pre-formatting (meant for pickling) is skipped.
+    """
+    
+    def prepare(self, record):
+        return record
+
+def _start_log_listener(handlers):
+    """Route the root logger through a queue drained by a background thread"""
+    global _log_listener
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, DeferredQueueHandler):
+            handler.queue = log_queue
+    
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def _stop_log_listener():
+    """Flush queued records on exit"""
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    if listener is not None:
+        listener.stop()
+
+def _restart_log_listener_in_child():
+    """The listener thread doesn't survive fork: give the child its own"""
+    if _log_listener is not None:
+        _start_log_listener(_log_listener.handlers)
 
 def configure_logging():
-    """Set up application logging"""
+    """Set up application logging
+    
+    Route modules only put records on a queue; formatting (JSON lines by
+    default) and file/console I/O happen on a listener thread. Safe to
+    call more than once.
+    """
+    root_logger = logging.getLogger()
+    if _log_listener is not None:
+        return root_logger
+    
     log_level = os.getenv("LOG_LEVEL", "INFO")
     log_level_map = {
         "DEBUG": logging.DEBUG,
@@ -19,32 +115,49 @@ def configure_logging():
     if not os.path.exists('logs'):
         os.makedirs('logs')
     
-    # Configure logging
-    logging.basicConfig(
-        level=log_level_map.get(log_level, logging.INFO),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    else:
+        formatter = JsonFormatter()
     
-    # Create file handler for logging to file
+    # Console and file handlers, written by the listener thread
+    console_handler = logging.StreamHandler()
     file_handler = RotatingFileHandler(
         'logs/dentixpro.log', 
         maxBytes=1024 * 1024 * 10,  # 10 MB
         backupCount=5
     )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    ))
+    for handler in (console_handler, file_handler):
+        handler.setFormatter(formatter)
     
-    # Get root logger and add handler
-    root_logger = logging.getLogger()
-    root_logger.addHandler(file_handler)
+    # The request thread only tags, samples and enqueues records
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestIdFilter())
+    sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+    if sample_rate < 1:
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+    
+    root_logger.setLevel(log_level_map.get(log_level, logging.INFO))
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    
+    _start_log_listener([console_handler, file_handler])
+    atexit.register(_stop_log_listener)
     
     # Set SQLAlchemy logging to WARNING level to reduce noise
     logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
     
     return root_logger
 
+def _optional_int(name):
+    """Read an integer environment variable, None when unset or empty"""
+    value = os.getenv(name)
+    return int(value) if value else None
+
 def get_config():
     """Get application configuration"""
     return {
@@ -53,6 +166,43 @@ def get_config():
         "DEBUG": os.getenv("DEBUG_MODE", "False").lower() == "true",
         "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY", "change-this-in-production"),
         "JWT_ACCESS_TOKEN_EXPIRES": datetime.timedelta(days=7),
+        "JWT_ROLE_CLAIMS": os.getenv("JWT_ROLE_CLAIMS", "False").lower() == "true",
         "CONNECTION_STRING": os.getenv("CONNECTION_STRING"),
+        "MONGO_DB_NAME": os.getenv("MONGO_DB_NAME", "dentixpro"),
+        "MONGO_MAX_POOL_SIZE": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "MONGO_MIN_POOL_SIZE": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "MONGO_MAX_IDLE_TIME_MS": _optional_int("MONGO_MAX_IDLE_TIME_MS"),
+        "MONGO_WAIT_QUEUE_TIMEOUT_MS": _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "MONGO_SOCKET_TIMEOUT_MS": _optional_int("MONGO_SOCKET_TIMEOUT_MS"),
+        "MONGO_CONNECT_TIMEOUT_MS": _optional_int("MONGO_CONNECT_TIMEOUT_MS"),
+        "MONGO_SERVER_SELECTION_TIMEOUT_MS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "MONGO_COMPRESSORS": os.getenv("MONGO_COMPRESSORS", ""),
+        "MONGO_READ_PREFERENCE": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+        "MONGO_ENSURE_INDEXES": os.getenv("MONGO_ENSURE_INDEXES", "True").lower() == "true",
+        "MONGO_WARMUP": os.getenv("MONGO_WARMUP", "True").lower() == "true",
         "ALLOWED_ORIGINS": os.getenv("ALLOWED_ORIGINS", "").split(","),
-    }
\ No newline at end of file
+        "CLINIC_HOURS": os.getenv("CLINIC_HOURS", "09:00-13:30,15:00-18:30"),
+        "USER_CACHE_TTL": float(os.getenv("USER_CACHE_TTL", "30")),
+        "USER_CACHE_SIZE": int(os.getenv("USER_CACHE_SIZE", "1024")),
+        "PASSWORD_HASH_METHOD": os.getenv("PASSWORD_HASH_METHOD", "scrypt"),
+        "PASSWORD_POOL_SIZE": int(os.getenv("PASSWORD_POOL_SIZE", "1")),
+        "PASSWORD_POOL_MAX_PENDING": int(os.getenv("PASSWORD_POOL_MAX_PENDING", "16")),
+        "PASSWORD_HASH_TIMEOUT": float(os.getenv("PASSWORD_HASH_TIMEOUT", "10")),
+        "METRICS_ENABLED": os.getenv("METRICS_ENABLED", "True").lower() == "true",
+        "METRICS_MULTIPROC_DIR": os.getenv("METRICS_MULTIPROC_DIR", ""),
+        "METRICS_FLUSH_SECONDS": float(os.getenv("METRICS_FLUSH_SECONDS", "5")),
+        "METRICS_TOKEN": os.getenv("METRICS_TOKEN", ""),
+        "METRICS_ALLOWED_IPS": os.getenv("METRICS_ALLOWED_IPS", ""),
+        "HEALTH_CACHE_SECONDS": float(os.getenv("HEALTH_CACHE_SECONDS", "2")),
+        "HEALTH_PING_TIMEOUT_MS": int(os.getenv("HEALTH_PING_TIMEOUT_MS", "1000")),
+        "GUNICORN_WORKERS": _optional_int("GUNICORN_WORKERS"),
+        "GUNICORN_THREADS": _optional_int("GUNICORN_THREADS"),
+        "GUNICORN_TIMEOUT": int(os.getenv("GUNICORN_TIMEOUT", "120")),
+        "GUNICORN_KEEPALIVE": int(os.getenv("GUNICORN_KEEPALIVE", "5")),
+        "GUNICORN_BACKLOG": int(os.getenv("GUNICORN_BACKLOG", "2048")),
+        "GUNICORN_MAX_REQUESTS": int(os.getenv("GUNICORN_MAX_REQUESTS", "0")),
+        "GUNICORN_PRELOAD": os.getenv("GUNICORN_PRELOAD", "True").lower() == "true",
+    }
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_log_listener_in_child)
@@ -1,54 +1,301 @@
 # db.py - Database configuration
 import pymongo
 import certifi
+import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel, monitoring
+
+from config import get_config
+from metrics import MongoCommandListener
+
+logger = logging.getLogger(__name__)
+
+# Statuses that keep a time slot occupied
+ACTIVE_DATE_STATUSES = ["pending", "completed"]
+
+class MissingIndexError(Exception):
+    """Raised when an index the application relies on for correctness can't be created"""
+
+class PoolUsageListener(monitoring.ConnectionPoolListener):
+    """Count connections checked out of the pool (pymongo exposes no gauge)"""
+    
+    def __init__(self):
+        self.checked_out = 0
+        self._lock = threading.Lock()
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+    
+    # Every other pool event is irrelevant here
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_check_out_failed(self, event):
+        pass
 
 class Database:
     _instance = None
+    _instance_pid = None
+    _lock = threading.Lock()
+    
+    # Indexes declared per collection and ensured at startup
+    INDEXES = {
+        "users": [
+            IndexModel([("userId", ASCENDING)], name="userId_unique", unique=True),
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+            IndexModel([("name", ASCENDING)], name="name"),
+        ],
+        "dates": [
+            IndexModel([("userId", ASCENDING), ("date", ASCENDING)], name="userId_date"),
+            IndexModel([("status", ASCENDING), ("date", ASCENDING)], name="status_date"),
+            IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="date_id"),
+            IndexModel(
+                [("date", ASCENDING), ("time", ASCENDING)],
+                name="active_slot_unique",
+                unique=True,
+                partialFilterExpression={"status": {"$in": ACTIVE_DATE_STATUSES}}
+            ),
+        ],
+    }
+    
+    # Indexes that enforce invariants no route checks itself (no double booking)
+    REQUIRED_INDEXES = {
+        "dates": ["active_slot_unique"],
+    }
     
     @classmethod
     def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = Database()
-        return cls._instance
+        """Get the process-wide instance, creating it once per process"""
+        instance = cls._instance
+        if instance is not None and cls._instance_pid == os.getpid():
+            return instance
+        
+        with cls._lock:
+            # A client inherited through fork is never reused
+            if cls._instance is None or cls._instance_pid != os.getpid():
+                cls._instance = Database()
+                cls._instance_pid = os.getpid()
+            return cls._instance
     
-    def __init__(self):
+    @classmethod
+    def reset(cls):
+        """Close and drop the shared instance so the next call recreates it"""
+        with cls._lock:
+            # Only the process that created the client may close it
+            if cls._instance is not None and cls._instance_pid == os.getpid():
+                cls._instance.close()
+            cls._instance = None
+            cls._instance_pid = None
+    
+    @classmethod
+    def _after_fork_in_child(cls):
+        """Discard state copied from the parent, including a possibly held lock"""
+        cls._lock = threading.Lock()
+        cls._instance = None
+        cls._instance_pid = None
+    
+    def __init__(self, config=None):
         """Initialize database connection"""
+        self.config = config or get_config()
+        
+        # Connections in use, reported by the readiness probe
+        self.pool_listener = PoolUsageListener()
+        options = self.client_options(self.config)
+        options["event_listeners"] = options.get("event_listeners", []) + [self.pool_listener]
+        
         try:
-            self.client = pymongo.MongoClient(
-                os.getenv("CONNECTION_STRING"), 
-                tlsCAFile=certifi.where(),
-                serverSelectionTimeoutMS=5000  # 5-second timeout
-            )
-            # Test connection
-            self.client.server_info()
-            self.db = self.client.get_database("dentixpro")
-            print("Connected to MongoDB successfully!")
+            self.client = pymongo.MongoClient(self.config["CONNECTION_STRING"], **options)
+            self.db = self.client.get_database(self.config["MONGO_DB_NAME"])
+            
+            # Test connection and open the minimum pool up front
+            if self.config["MONGO_WARMUP"]:
+                self.warmup()
+            logger.info("Conectado a MongoDB")
         except pymongo.errors.ServerSelectionTimeoutError as err:
-            print(f"Could not connect to MongoDB: {err}")
+            logger.error("No se pudo conectar a MongoDB: %s", err)
             raise
+        
+        # Indexes can be managed out-of-band with `flask indexes --apply`
+        if self.config["MONGO_ENSURE_INDEXES"]:
+            self.ensure_indexes()
+    
+    @staticmethod
+    def client_options(config):
+        """Build MongoClient keyword arguments from the application config"""
+        options = {
+            "tlsCAFile": certifi.where(),
+            "maxPoolSize": config["MONGO_MAX_POOL_SIZE"],
+            "minPoolSize": config["MONGO_MIN_POOL_SIZE"],
+            "serverSelectionTimeoutMS": config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+            "readPreference": config["MONGO_READ_PREFERENCE"],
+            "appname": "dentixpro-api",
+            # Defer monitor threads and sockets until the first operation
+            "connect": False,
+        }
+        
+        # Only override driver defaults that were explicitly configured
+        optional = {
+            "maxIdleTimeMS": config["MONGO_MAX_IDLE_TIME_MS"],
+            "waitQueueTimeoutMS": config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+            "socketTimeoutMS": config["MONGO_SOCKET_TIMEOUT_MS"],
+            "connectTimeoutMS": config["MONGO_CONNECT_TIMEOUT_MS"],
+            "compressors": config["MONGO_COMPRESSORS"],
+        }
+        options.update({key: value for key, value in optional.items() if value})
+        
+        # Per-command latency for /metrics
+        if config["METRICS_ENABLED"]:
+            options["event_listeners"] = [MongoCommandListener()]
+        return options
+    
+    def warmup(self):
+        """Ping the server with concurrent requests to fill the minimum pool"""
+        connections = max(1, self.config["MONGO_MIN_POOL_SIZE"])
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(lambda _: self.client.admin.command("ping"), range(connections)))
+    
+    def ensure_indexes(self):
+        """Create every declared index that is missing (idempotent)
+        
+        Raises MissingIndexError when a required index can't be created, so
+        the app never runs without the guarantees it depends on.
+        """
+        failed_required = []
+        for collection_name, indexes in self.INDEXES.items():
+            collection = self.get_collection(collection_name)
+            for index in indexes:
+                name = index.document["name"]
+                try:
+                    collection.create_indexes([index])
+                except pymongo.errors.OperationFailure as err:
+                    # Existing data (e.g. duplicated emails) can block a unique index
+                    logger.error("No se pudo crear el índice %s en %s: %s", name, collection_name, err)
+                    if name in self.REQUIRED_INDEXES.get(collection_name, []):
+                        failed_required.append(f"{collection_name}.{name}")
+        
+        if failed_required:
+            raise MissingIndexError(f"Required indexes could not be created: {', '.join(failed_required)}")
+    
+    def diff_indexes(self):
+        """Compare declared indexes with the ones present in the database"""
+        report = {}
+        for collection_name, indexes in self.INDEXES.items():
+            existing = self.get_collection(collection_name).index_information()
+            existing.pop("_id_", None)
+            
+            missing, mismatched = [], []
+            for index in indexes:
+                spec = index.document
+                current = existing.pop(spec["name"], None)
+                if current is None:
+                    missing.append(spec["name"])
+                elif (list(current["key"]) != list(spec["key"].items())
+                      or current.get("unique", False) != spec.get("unique", False)
+                      or current.get("partialFilterExpression") != spec.get("partialFilterExpression")):
+                    mismatched.append(spec["name"])
+            
+            report[collection_name] = {
+                "missing": missing,
+                "mismatched": mismatched,
+                "extra": sorted(existing)
+            }
+        return report
+    
+    def pool_usage(self):
+        """Connections checked out of the pool against its configured maximum"""
+        return {
+            "in_use": self.pool_listener.checked_out,
+            "max_size": self.config["MONGO_MAX_POOL_SIZE"]
+        }
+    
+    def close(self):
+        """Close the client and its connection pool"""
+        self.client.close()
     
     def get_collection(self, collection_name):
         """Get a collection from the database"""
         return self.db[collection_name]
     
-    @staticmethod    
-    def fix_id(obj):
-        """Convert MongoDB ObjectId to string in a single object"""
-        if obj and "_id" in obj:
-            obj["_id"] = str(obj["_id"])
-        return obj
-    
-    @staticmethod
-    def fix_ids(objects):
-        """Convert MongoDB ObjectIds to strings in a list of objects"""
-        return [Database.fix_id(obj) for obj in objects]
-    
     @staticmethod
     def to_object_id(id_str):
         """Convert string ID to MongoDB ObjectId"""
         try:
             return ObjectId(id_str)
         except:
-            return None
\ No newline at end of file
+            return None
+
+class AsyncDatabase:
+    """Async counterpart of Database for the ASGI app
+    
+    Uses PyMongo's asyncio client with the same connection options. The
+    instance is bound to the event loop of the process that first uses it.
+    It never creates indexes: the ASGI app connects the synchronous
+    Database, which does, before serving.
+    """
+    _instance = None
+    _instance_pid = None
+    
+    @classmethod
+    def get_instance(cls):
+        """Get the process-wide async instance, creating it once per process"""
+        if cls._instance is None or cls._instance_pid != os.getpid():
+            cls._instance = AsyncDatabase()
+            cls._instance_pid = os.getpid()
+        return cls._instance
+    
+    @classmethod
+    async def reset(cls):
+        """Close and drop the shared async instance"""
+        instance, cls._instance = cls._instance, None
+        if instance is not None and cls._instance_pid == os.getpid():
+            await instance.close()
+        cls._instance_pid = None
+    
+    def __init__(self, config=None):
+        """Initialize the async client (connections open on first use)"""
+        self.config = config or get_config()
+        self.client = pymongo.AsyncMongoClient(
+            self.config["CONNECTION_STRING"],
+            **Database.client_options(self.config)
+        )
+        self.db = self.client.get_database(self.config["MONGO_DB_NAME"])
+    
+    async def close(self):
+        """Close the client and its connection pool"""
+        await self.client.close()
+    
+    def get_collection(self, collection_name):
+        """Get a collection from the database"""
+        return self.db[collection_name]
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Database._after_fork_in_child)
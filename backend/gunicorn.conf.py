@@ -0,0 +1,81 @@
+# gunicorn.conf.py - Production server settings and hooks
+#
+# Run with: gunicorn -c gunicorn.conf.py run:app
+import os
+
+# Importing config reads backend/.env, so these settings see it too
+from config import get_config
+from db import Database, MissingIndexError
+from metrics import use_multiprocess_dir
+from passwords import PasswordHasher
+
+def cpu_count():
+    """CPUs available to this process (respects container/affinity limits)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def default_workers(cpus):
+    """One process per core plus headroom for workers blocked on I/O"""
+    return cpus * 2 + 1
+
+def default_threads(cpus):
+    """Threads per worker; requests mostly wait on MongoDB"""
+    return 4 if cpus > 1 else 2
+
+config = get_config()
+cpus = cpu_count()
+
+bind = f"{config['HOST']}:{config['PORT']}"
+workers = config["GUNICORN_WORKERS"] or default_workers(cpus)
+threads = config["GUNICORN_THREADS"] or default_threads(cpus)
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = config["GUNICORN_TIMEOUT"]
+keepalive = config["GUNICORN_KEEPALIVE"]
+backlog = config["GUNICORN_BACKLOG"]
+# Recycle workers now and then so slow leaks can't grow forever
+max_requests = config["GUNICORN_MAX_REQUESTS"]
+max_requests_jitter = max_requests // 10
+# Import the app once in the master; workers share its memory pages
+preload_app = config["GUNICORN_PRELOAD"]
+
+# Each worker keeps its own metrics; this directory lets /metrics add them up
+metrics_store = None
+if config["METRICS_ENABLED"]:
+    metrics_store = use_multiprocess_dir(config["METRICS_MULTIPROC_DIR"], config["METRICS_FLUSH_SECONDS"])
+
+def on_starting(server):
+    """Drop the metrics of a previous run"""
+    if metrics_store is not None:
+        metrics_store.clear()
+
+def post_fork(server, worker):
+    """Give every worker its own MongoClient and hashing pool instead of the master's"""
+    Database.reset()
+    PasswordHasher.reset()
+    if metrics_store is not None:
+        metrics_store.start()
+
+def post_worker_init(worker):
+    """Connect, warm up the pool and check indexes before the first request"""
+    try:
+        Database.get_instance()
+    except MissingIndexError:
+        # Without the slot index double bookings are possible; failing here
+        # makes gunicorn stop instead of serving 500s
+        raise
+    except Exception as err:
+        # MongoDB may come up later: requests and /readyz retry the connection
+        worker.log.warning("No se pudo conectar a MongoDB al iniciar el worker: %s", err)
+
+def worker_exit(server, worker):
+    """Close the worker's connection and hashing pools on shutdown"""
+    Database.reset()
+    PasswordHasher.reset()
+    if metrics_store is not None:
+        metrics_store.flush()
+
+def child_exit(server, worker):
+    """Keep the totals of a worker that exited (runs in the master, even after a crash)"""
+    if metrics_store is not None:
+        metrics_store.retire(worker.pid)
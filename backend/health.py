@@ -0,0 +1,127 @@
+# health.py - Liveness and readiness probes for load balancers and orchestrators
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import pymongo
+from flask import jsonify
+
+from config import get_config
+from db import Database
+from passwords import pool_stats
+
+logger = logging.getLogger(__name__)
+
+class ReadinessProbe:
+    """Decides whether this worker should receive traffic
+    
+    A worker is ready when MongoDB answers a ping, its connection pool and
+    password hashing queue have room, and no declared index is missing.
+    Results are reused for ``HEALTH_CACHE_SECONDS`` so frequent probes
+    don't cost a database round-trip each, and while one probe runs the
+    others get the previous result instead of waiting.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.ttl = self.config["HEALTH_CACHE_SECONDS"]
+        self.ping_timeout = self.config["HEALTH_PING_TIMEOUT_MS"] / 1000
+        
+        self._result = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        
+        # Connecting may block for the server selection timeout, so it runs
+        # here and a probe gives up after the ping timeout
+        self._connector = ThreadPoolExecutor(max_workers=1, thread_name_prefix="readiness")
+        self._connecting = None
+        
+        # Indexes are only listed until they are all found once
+        self._indexes_ready = False
+    
+    def check(self):
+        """Return (ready, checks), probing again once the cached result expires"""
+        result = self._result
+        if result is not None and time.monotonic() - self._checked_at < self.ttl:
+            return result
+        
+        if not self._lock.acquire(blocking=result is None):
+            return result
+        try:
+            self._result = self._run_checks()
+            self._checked_at = time.monotonic()
+            return self._result
+        finally:
+            self._lock.release()
+    
+    def _run_checks(self):
+        checks = {}
+        try:
+            db_instance = self._database()
+            with pymongo.timeout(self.ping_timeout):
+                db_instance.client.admin.command("ping")
+                checks["mongo"] = {"ok": True}
+                checks["indexes"] = self._check_indexes(db_instance)
+            
+            usage = db_instance.pool_usage()
+            checks["mongo_pool"] = {**usage, "ok": usage["in_use"] < usage["max_size"]}
+        except Exception as err:
+            logger.warning("Verificación de MongoDB fallida: %s", err)
+            checks.setdefault("mongo", {"ok": False, "error": type(err).__name__})
+            checks.setdefault("indexes", {"ok": False})
+        
+        stats = pool_stats()
+        if stats is not None:
+            checks["password_pool"] = {
+                "pending": stats["pending"],
+                "max_pending": stats["max_pending"],
+                "ok": stats["pending"] < stats["max_pending"]
+            }
+        
+        return all(check["ok"] for check in checks.values()), checks
+    
+    def _database(self):
+        """This worker's Database, waiting at most the ping timeout for it"""
+        # The first probe also connects and warms up the pool; until that
+        # finishes later probes keep waiting on the same attempt
+        if self._connecting is None or self._connecting.done():
+            self._connecting = self._connector.submit(Database.get_instance)
+        return self._connecting.result(timeout=self.ping_timeout)
+    
+    def _check_indexes(self, db_instance):
+        if self._indexes_ready:
+            return {"ok": True}
+        
+        missing, mismatched = {}, {}
+        for collection_name, diff in db_instance.diff_indexes().items():
+            if diff["missing"]:
+                missing[collection_name] = diff["missing"]
+            # A required index with another definition doesn't give its guarantee
+            required = set(Database.REQUIRED_INDEXES.get(collection_name, [])) & set(diff["mismatched"])
+            if required:
+                mismatched[collection_name] = sorted(required)
+        
+        self._indexes_ready = not missing and not mismatched
+        check = {"ok": self._indexes_ready, "missing": missing}
+        if mismatched:
+            check["mismatched"] = mismatched
+        return check
+
+def init_app(app):
+    """Register /healthz (process alive) and /readyz (ready for traffic)"""
+    probe = ReadinessProbe()
+    
+    @app.route('/healthz')
+    def healthz():
+        return jsonify({"status": "ok"}), HTTPStatus.OK
+    
+    @app.route('/readyz')
+    def readyz():
+        ready, checks = probe.check()
+        if ready:
+            return jsonify({"status": "ready", "checks": checks}), HTTPStatus.OK
+        return jsonify({"status": "unavailable", "checks": checks}), HTTPStatus.SERVICE_UNAVAILABLE
+    
+    return probe
@@ -0,0 +1,383 @@
+# metrics.py - Request and MongoDB instrumentation (Prometheus text format)
+import bisect
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from flask import Response, g, request
+from pymongo import monitoring
+
+from config import get_config
+
+# fcntl is Unix only, like gunicorn; elsewhere there is a single process anyway
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every metric rendered by /metrics, in registration order
+REGISTRY = []
+
+def _escape(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Thread-safe histogram keyed by label values
+    
+    Values are kept per process; with several gunicorn workers set
+    ``METRICS_MULTIPROC_DIR`` so /metrics adds up every worker's series
+    (see MultiprocessStore).
+    """
+    
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+    
+    def observe(self, value, *labelvalues):
+        """Record one observation for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # One slot per bucket plus +Inf, then the running sum
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+    
+    def clear(self):
+        """Drop every recorded series"""
+        with self._lock:
+            self._series.clear()
+    
+    def snapshot(self):
+        """Copy of every series: bucket counts followed by the sum"""
+        with self._lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+    
+    def collect(self, series=None):
+        """Render the histogram (or the given series) in Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            series = self.snapshot()
+        
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class CallbackMetric:
+    """Gauge or counter whose values are read from a function at scrape time"""
+    
+    def __init__(self, name, documentation, kind, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        REGISTRY.append(self)
+    
+    def snapshot(self):
+        """Current values keyed by label values"""
+        return self.callback()
+    
+    def collect(self, values=None, extra_labelnames=()):
+        """Render the current (or the given) values in Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            values = self.snapshot()
+        
+        labelnames = self.labelnames + tuple(extra_labelnames)
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+def _merge_series(target, series):
+    """Add histogram series read from a file into target, bucket by bucket"""
+    for labelvalues, values in series:
+        current = target.get(tuple(labelvalues))
+        if current is None:
+            target[tuple(labelvalues)] = list(values)
+        else:
+            target[tuple(labelvalues)] = [a + b for a, b in zip(current, values)]
+
+class MultiprocessStore:
+    """Shares metric values between the worker processes of one server
+    
+    Every worker writes its metrics to ``<path>/<pid>.json`` each
+    ``flush_seconds`` and when it exits, and /metrics merges the files of
+    all workers, so whichever worker answers a scrape reports them all.
+    Histograms are added up; callback metrics describe a single process
+    and get a ``pid`` label. Once a worker is gone its histograms are
+    folded into ``archive.json`` so totals never go backwards. A worker
+    that is killed loses what it recorded since its last flush.
+    """
+    ARCHIVE = "archive.json"
+    
+    def __init__(self, path, flush_seconds):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._flusher_pid = None
+    
+    def _file(self, name):
+        return os.path.join(self.path, name)
+    
+    @contextmanager
+    def _locked(self):
+        # Readers must not see a retired worker both in its file and in the archive
+        if fcntl is None:
+            yield
+            return
+        with open(self._file(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _read(self, path):
+        try:
+            with open(path) as metrics_file:
+                return json.load(metrics_file)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def _write(self, path, snapshot):
+        # Readers only ever see complete files
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as metrics_file:
+            json.dump(snapshot, metrics_file)
+        os.replace(tmp_path, path)
+    
+    def clear(self):
+        """Remove the files left by a previous run of the server"""
+        os.makedirs(self.path, exist_ok=True)
+        for name in os.listdir(self.path):
+            if name.endswith(".json"):
+                os.remove(self._file(name))
+    
+    def start(self):
+        """Flush this worker's metrics in the background, once per process"""
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        
+        # Whatever the master recorded before the fork is not this worker's
+        for metric in REGISTRY:
+            if isinstance(metric, Histogram):
+                metric.clear()
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as err:
+                logger.warning("No se pudieron guardar las métricas: %s", err)
+    
+    def flush(self):
+        """Write this process's metrics to its file"""
+        snapshot = {"histograms": {}, "callbacks": {}}
+        for metric in REGISTRY:
+            kind = "histograms" if isinstance(metric, Histogram) else "callbacks"
+            snapshot[kind][metric.name] = [[list(labels), value] for labels, value in metric.snapshot().items()]
+        self._write(self._file(f"{os.getpid()}.json"), snapshot)
+    
+    def retire(self, pid):
+        """Fold the histograms of an exited worker into the archive"""
+        path = self._file(f"{pid}.json")
+        with self._locked():
+            snapshot = self._read(path)
+            if snapshot is None:
+                return
+            
+            archive = self._read(self._file(self.ARCHIVE)) or {"histograms": {}}
+            for name, series in snapshot["histograms"].items():
+                merged = {tuple(labels): values for labels, values in archive["histograms"].get(name, [])}
+                _merge_series(merged, series)
+                archive["histograms"][name] = [[list(labels), values] for labels, values in merged.items()]
+            
+            self._write(self._file(self.ARCHIVE), archive)
+            os.remove(path)
+    
+    def render(self):
+        """Render the merged metrics of every worker, this one up to date"""
+        self.flush()
+        histograms, callbacks = {}, {}
+        with self._locked():
+            for name in sorted(os.listdir(self.path)):
+                if not name.endswith(".json"):
+                    continue
+                snapshot = self._read(self._file(name))
+                if snapshot is None:
+                    continue
+                
+                for metric_name, series in snapshot["histograms"].items():
+                    _merge_series(histograms.setdefault(metric_name, {}), series)
+                if name != self.ARCHIVE:
+                    pid = name[:-len(".json")]
+                    for metric_name, values in snapshot.get("callbacks", {}).items():
+                        target = callbacks.setdefault(metric_name, {})
+                        for labelvalues, value in values:
+                            target[tuple(labelvalues) + (pid,)] = value
+        
+        lines = []
+        for metric in REGISTRY:
+            if isinstance(metric, Histogram):
+                lines.extend(metric.collect(histograms.get(metric.name, {})))
+            else:
+                lines.extend(metric.collect(callbacks.get(metric.name, {}), extra_labelnames=("pid",)))
+        return "\n".join(lines) + "\n"
+
+# Set by use_multiprocess_dir; None keeps every process on its own
+_store = None
+
+def use_multiprocess_dir(path, flush_seconds=5.0):
+    """Share metrics through files under path (no sharing when path is empty)"""
+    global _store
+    if not path:
+        _store = None
+    elif _store is None or _store.path != path:
+        _store = MultiprocessStore(path, flush_seconds)
+    return _store
+
+REQUEST_LATENCY = Histogram(
+    "dentixpro_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "endpoint", "status"]
+)
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "dentixpro_mongo_command_duration_seconds",
+    "MongoDB command latency by collection and command",
+    ["collection", "command", "outcome"]
+)
+
+def render():
+    """Render every registered metric"""
+    if _store is not None:
+        return _store.render()
+    
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+def observe_request(method, endpoint, status, duration):
+    """Record the latency of one HTTP request"""
+    REQUEST_LATENCY.observe(duration, method, endpoint, str(status))
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Record the duration of every MongoDB command by collection"""
+    
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(event):
+        return event.request_id, event.connection_id
+    
+    def started(self, event):
+        # The collection is only known from the command document
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.database_name
+        with self._lock:
+            self._inflight[self._key(event)] = collection
+    
+    def _finished(self, event, outcome):
+        with self._lock:
+            collection = self._inflight.pop(self._key(event), "unknown")
+        MONGO_COMMAND_LATENCY.observe(event.duration_micros / 1e6, collection, event.command_name, outcome)
+    
+    def succeeded(self, event):
+        self._finished(event, "success")
+    
+    def failed(self, event):
+        self._finished(event, "failure")
+
+def parse_networks(value):
+    """Parse a comma separated list of addresses or CIDR ranges"""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+def scrape_denied(token, networks):
+    """Response refusing a /metrics request, or None when it is allowed"""
+    if networks:
+        try:
+            address = ipaddress.ip_address(request.remote_addr or "")
+        except ValueError:
+            address = None
+        if address is None or not any(address in network for network in networks):
+            return Response("Forbidden\n", status=HTTPStatus.FORBIDDEN, content_type="text/plain")
+    
+    if token:
+        expected = f"Bearer {token}".encode()
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+            return Response("Unauthorized\n", status=HTTPStatus.UNAUTHORIZED, content_type="text/plain",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return None
+
+def init_app(app):
+    """Time every request and serve the registry at /metrics
+    
+    /metrics is open unless ``METRICS_TOKEN`` (bearer token) and/or
+    ``METRICS_ALLOWED_IPS`` (addresses or CIDR ranges) are set.
+    """
+    config = get_config()
+    use_multiprocess_dir(config["METRICS_MULTIPROC_DIR"], config["METRICS_FLUSH_SECONDS"])
+    token = config["METRICS_TOKEN"]
+    networks = parse_networks(config["METRICS_ALLOWED_IPS"])
+    
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def record_latency(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            # Route templates keep the number of series bounded
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(request.method, endpoint, response.status_code, time.perf_counter() - started)
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        denied = scrape_denied(token, networks)
+        if denied is not None:
+            return denied
+        return Response(render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,298 @@
+# passwords.py - Password hashing on a bounded process pool
+import asyncio
+import multiprocessing
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+from config import get_config
+from db import Database
+from metrics import CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+class HasherBusyError(Exception):
+    """Raised when the hashing pool cannot take (or finish) a request in time"""
+
+def normalize_method(method):
+    """Spell out the defaults werkzeug fills in, e.g. scrypt -> scrypt:32768:8:1"""
+    name, *params = method.split(":")
+    if name == "scrypt":
+        defaults = ["32768", "8", "1"]
+    elif name == "pbkdf2":
+        defaults = ["sha256", str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ":".join([name] + params + defaults[len(params):])
+
+class PasswordHasher:
+    """Runs password hashing off the request threads
+    
+    Hashes are computed by a small process pool so a burst of logins can't
+    starve other requests of CPU. At most ``max_pending`` calls may be queued
+    or running; beyond that (or when a result takes longer than ``timeout``)
+    HasherBusyError is raised and the caller answers 503. A pool whose worker
+    died is replaced so later calls don't keep failing. A pool size of 0
+    hashes inline on the calling thread. Hashes made with an older method
+    or cost can be upgraded in the background after a successful login.
+    """
+    _instance = None
+    _instance_pid = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get_instance(cls):
+        """Get the process-wide instance, creating it once per process"""
+        instance = cls._instance
+        if instance is not None and cls._instance_pid == os.getpid():
+            return instance
+        
+        with cls._lock:
+            # A pool inherited through fork is never reused
+            if cls._instance is None or cls._instance_pid != os.getpid():
+                cls._instance = PasswordHasher()
+                cls._instance_pid = os.getpid()
+            return cls._instance
+    
+    @classmethod
+    def reset(cls):
+        """Shut down and drop the shared instance so the next call recreates it"""
+        with cls._lock:
+            if cls._instance is not None and cls._instance_pid == os.getpid():
+                cls._instance.close()
+            cls._instance = None
+            cls._instance_pid = None
+    
+    @classmethod
+    def _after_fork_in_child(cls):
+        """Discard state copied from the parent, including a possibly held lock"""
+        cls._lock = threading.Lock()
+        cls._instance = None
+        cls._instance_pid = None
+    
+    def __init__(self, config=None):
+        """Start the hashing pool"""
+        self.config = config or get_config()
+        self.method = self.config["PASSWORD_HASH_METHOD"]
+        self.target_method = normalize_method(self.method)
+        self.pool_size = self.config["PASSWORD_POOL_SIZE"]
+        self.max_pending = self.config["PASSWORD_POOL_MAX_PENDING"]
+        self.timeout = self.config["PASSWORD_HASH_TIMEOUT"]
+        
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.upgrades_pending = 0
+        self._counter_lock = threading.Lock()
+        
+        # Hash upgrades run one at a time, behind live requests
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-rehash")
+        
+        self.executor = self._create_pool() if self.pool_size > 0 else None
+    
+    def _create_pool(self):
+        # Spawned workers don't inherit the server's threads or sockets
+        return ProcessPoolExecutor(
+            max_workers=self.pool_size,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    
+    def _replace_pool(self, broken):
+        """Swap in a new pool after a worker of ``broken`` died"""
+        with self._counter_lock:
+            # Another thread may have replaced it already
+            if self.executor is not broken:
+                return
+            logger.error("Pool de hash de contraseñas roto, creando uno nuevo")
+            self.executor = self._create_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+    
+    def close(self):
+        """Stop the pool, dropping calls that haven't started yet"""
+        self._background.shutdown(wait=False, cancel_futures=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self):
+        """Queue depth and counters of the hashing pool"""
+        with self._counter_lock:
+            return {
+                "pool_size": self.pool_size,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "upgrades_pending": self.upgrades_pending
+            }
+    
+    def submit(self, fn, *args):
+        """Queue a call on the pool, raising HasherBusyError when it is full"""
+        with self._counter_lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusyError("Password hashing queue is full")
+            self.pending += 1
+        
+        try:
+            executor = self.executor
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._replace_pool(executor)
+                future = self.executor.submit(fn, *args)
+        except Exception:
+            with self._counter_lock:
+                self.pending -= 1
+            raise
+        
+        future.add_done_callback(self._task_done)
+        return future
+    
+    def _task_done(self, future):
+        with self._counter_lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+    
+    def run(self, fn, *args):
+        """Run a call on the pool and wait for its result"""
+        if self.executor is None:
+            return fn(*args)
+        
+        executor = self.executor
+        try:
+            return self.submit(fn, *args).result(timeout=self.timeout)
+        except TimeoutError:
+            logger.warning("Hash de contraseña sin respuesta tras %ss: %s", self.timeout, self.stats())
+            raise HasherBusyError("Password hashing timed out")
+        except BrokenProcessPool:
+            # The call was lost with the worker; the client can retry on the new pool
+            self._replace_pool(executor)
+            raise HasherBusyError("Password hashing pool was restarted")
+    
+    async def run_async(self, fn, *args):
+        """Run a call on the pool without blocking the event loop"""
+        if self.executor is None:
+            return await asyncio.to_thread(fn, *args)
+        
+        executor = self.executor
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.submit(fn, *args)), self.timeout)
+        except TimeoutError:
+            logger.warning("Hash de contraseña sin respuesta tras %ss: %s", self.timeout, self.stats())
+            raise HasherBusyError("Password hashing timed out")
+        except BrokenProcessPool:
+            self._replace_pool(executor)
+            raise HasherBusyError("Password hashing pool was restarted")
+    
+    def hash(self, password):
+        """Hash a password with the configured method and cost"""
+        return self.run(generate_password_hash, password, self.method)
+    
+    def check(self, pwhash, password):
+        """Check a password against a stored hash"""
+        return self.run(check_password_hash, pwhash, password)
+    
+    def needs_rehash(self, pwhash):
+        """Whether a stored hash was made with another method or cost"""
+        return pwhash.split("$", 1)[0] != self.target_method
+    
+    def hash_in_background(self, password, callback):
+        """Hash a password off the request and pass the new hash to callback
+        
+        Skipped (returning False) while the pool is half full or enough
+        upgrades are already queued, so live requests always come first.
+        """
+        with self._counter_lock:
+            if self.pending * 2 >= self.max_pending or self.upgrades_pending >= self.max_pending:
+                return False
+            self.upgrades_pending += 1
+        
+        self._background.submit(self._background_hash, password, callback)
+        return True
+    
+    def _background_hash(self, password, callback):
+        try:
+            callback(self.hash(password))
+        except HasherBusyError:
+            # Tried again on the next login
+            pass
+        except Exception as err:
+            logger.error("Error al actualizar el hash de contraseña: %s", err)
+        finally:
+            with self._counter_lock:
+                self.upgrades_pending -= 1
+    
+    async def hash_async(self, password):
+        """Async version of hash"""
+        return await self.run_async(generate_password_hash, password, self.method)
+    
+    async def check_async(self, pwhash, password):
+        """Async version of check"""
+        return await self.run_async(check_password_hash, pwhash, password)
+
+def hash_password(password):
+    """Hash a password on the shared pool"""
+    return PasswordHasher.get_instance().hash(password)
+
+def verify_password(pwhash, password):
+    """Check a password on the shared pool"""
+    return PasswordHasher.get_instance().check(pwhash, password)
+
+def upgrade_password_hash(user_id, pwhash, password):
+    """Rehash a just-verified password when its method or cost is outdated"""
+    hasher = PasswordHasher.get_instance()
+    if not hasher.needs_rehash(pwhash):
+        return False
+    
+    def store(new_hash):
+        users_collection = Database.get_instance().get_collection("users")
+        # Only replace the hash that was checked, never one changed meanwhile
+        users_collection.update_one(
+            {"userId": user_id, "password": pwhash},
+            {"$set": {"password": new_hash}}
+        )
+    
+    return hasher.hash_in_background(password, store)
+
+async def hash_password_async(password):
+    """Async version of hash_password"""
+    return await PasswordHasher.get_instance().hash_async(password)
+
+async def verify_password_async(pwhash, password):
+    """Async version of verify_password"""
+    return await PasswordHasher.get_instance().check_async(pwhash, password)
+
+def pool_stats():
+    """Stats of this process's hashing pool, None if it hasn't started"""
+    hasher = PasswordHasher._instance
+    if hasher is None or PasswordHasher._instance_pid != os.getpid():
+        return None
+    return hasher.stats()
+
+def _pool_stats(*names):
+    """Read some of this process's hashing pool stats for /metrics"""
+    stats = pool_stats()
+    if stats is None:
+        return {}
+    return {(name,): stats[name] for name in names}
+
+CallbackMetric(
+    "dentixpro_password_hash_queue",
+    "Password hashing pool size and queue depth",
+    "gauge", ["state"],
+    lambda: _pool_stats("pool_size", "max_pending", "pending", "upgrades_pending")
+)
+
+CallbackMetric(
+    "dentixpro_password_hash_total",
+    "Password hashing calls by outcome",
+    "counter", ["outcome"],
+    lambda: _pool_stats("completed", "rejected")
+)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=PasswordHasher._after_fork_in_child)
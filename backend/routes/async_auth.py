@@ -0,0 +1,118 @@
+# routes/async_auth.py - Authentication routes (async mode)
+from quart import Blueprint, request, jsonify
+from http import HTTPStatus
+import re
+from bson.objectid import ObjectId
+import logging
+from datetime import datetime
+
+from db import AsyncDatabase
+from passwords import hash_password_async, verify_password_async, upgrade_password_hash, HasherBusyError
+from async_utils import get_user_data, validate_request_json, create_user_token, hasher_busy_response
+
+auth_bp = Blueprint('async_auth', __name__)
+auth_bp.register_error_handler(HasherBusyError, hasher_busy_response)
+logger = logging.getLogger(__name__)
+
+@auth_bp.route('/login', methods=['POST'])
+@validate_request_json(['email', 'password'])
+async def login():
+    """Authenticate user and return JWT token"""
+    data = await request.get_json()
+    email = data.get("email").lower().strip()
+    password = data.get("password")
+    
+    # Input validation
+    if not email or not password:
+        return jsonify({"msg": "Email y contraseña son requeridos"}), HTTPStatus.BAD_REQUEST
+    
+    users_collection = AsyncDatabase.get_instance().get_collection("users")
+    
+    # Find user by email
+    user = await users_collection.find_one(
+        {"email": email},
+        {"userId": 1, "password": 1, "rol": 1, "token_version": 1}
+    )
+    if not user:
+        # Use same error message to prevent user enumeration
+        return jsonify({"msg": "Credenciales inválidas"}), HTTPStatus.UNAUTHORIZED
+    
+    # Verify password on the hashing pool
+    valid_password = await verify_password_async(user.get("password", ""), password)
+    
+    if not valid_password:
+        return jsonify({"msg": "Credenciales inválidas"}), HTTPStatus.UNAUTHORIZED
+    
+    # Move hashes made with an older method or cost to the configured one
+    upgrade_password_hash(user["userId"], user["password"], password)
+    
+    # Create access token
+    access_token = create_user_token(user)
+    
+    # Log successful login
+    logger.info("Usuario con ID %s ha iniciado sesión exitosamente", user['userId'])
+    
+    return jsonify({
+        "access_token": access_token, 
+        "user": await get_user_data(user["userId"])
+    }), HTTPStatus.OK
+
+@auth_bp.route('/signup', methods=['POST'])
+@validate_request_json(['name', 'email', 'password'])
+async def signup():
+    """Register a new user"""
+    data = await request.get_json()
+    name = data.get("name", "").strip()
+    email = data.get("email", "").lower().strip()
+    password = data.get("password", "")
+    rol = data.get("rol", "user").lower().strip()
+    
+    # Input validation
+    if not name or len(name) < 3:
+        return jsonify({"msg": "El nombre debe tener al menos 3 caracteres"}), HTTPStatus.BAD_REQUEST
+        
+    if not email or not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        return jsonify({"msg": "Email inválido"}), HTTPStatus.BAD_REQUEST
+    
+    if not password or len(password) < 8:
+        return jsonify({"msg": "La contraseña debe tener al menos 8 caracteres"}), HTTPStatus.BAD_REQUEST
+    
+    if rol not in ["admin", "user"]:
+        return jsonify({"msg": "Rol inválido. Debe ser 'admin' o 'user'"}), HTTPStatus.BAD_REQUEST
+    
+    users_collection = AsyncDatabase.get_instance().get_collection("users")
+    
+    # Check if email already exists
+    if await users_collection.find_one({"email": email}, {"_id": 1}):
+        return jsonify({"msg": "Ya existe un usuario con este email"}), HTTPStatus.CONFLICT
+    
+    # Hash password on the hashing pool
+    hashed_password = await hash_password_async(password)
+    
+    # Create user ID
+    user_id = str(ObjectId())
+    
+    # Insert new user
+    user_data = {
+        "userId": user_id,
+        "name": name,
+        "email": email,
+        "password": hashed_password,
+        "rol": rol,
+        "token_version": 0,
+        "created_at": datetime.utcnow()
+    }
+    
+    await users_collection.insert_one(user_data)
+    
+    # Create token for automatic login
+    token = create_user_token(user_data)
+    
+    # Log user creation
+    logger.info("Nuevo usuario creado con ID %s y rol %s", user_id, rol)
+    
+    return jsonify({
+        "msg": "Usuario creado exitosamente",
+        "access_token": token, 
+        "user": await get_user_data(user_id)
+    }), HTTPStatus.CREATED
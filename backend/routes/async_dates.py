@@ -0,0 +1,165 @@
+# routes/async_dates.py - Routes for appointments (async mode)
+from quart import Blueprint, request, jsonify
+from http import HTTPStatus
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+import datetime
+import logging
+
+from db import AsyncDatabase
+from async_utils import (jwt_required, admin_required, get_jwt_identity, get_current_role,
+                         validate_request_json, paginate_results, bump_data_version)
+from utils import DATE_FIELDS
+from routes.dates import validate_date_format, validate_time_format, build_date_range_query
+
+dates_bp = Blueprint('async_dates', __name__)
+admin_dates_bp = Blueprint('async_admin_dates', __name__)
+logger = logging.getLogger(__name__)
+
+# Helper functions
+async def pending_guard_error(dates_collection, date_id, action):
+    """Explain why a pending-only update matched nothing (miss path only)"""
+    date = await dates_collection.find_one({"_id": date_id}, {"status": 1})
+    if not date:
+        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
+    return jsonify({"msg": f"No se puede {action} una cita con estado: {date['status']}"}), HTTPStatus.BAD_REQUEST
+
+# User Routes
+@dates_bp.route('', methods=['POST'])
+@jwt_required
+@validate_request_json(['date', 'time', 'description'])
+async def create_date():
+    """Create a new appointment"""
+    user_id = get_jwt_identity()
+    data = await request.get_json()
+    
+    # Check if title is valid
+    if not data["title"] or len(data["title"]) < 5:
+        return jsonify({"msg": "El título debe tener al menos 5 caracteres"}), HTTPStatus.BAD_REQUEST
+    
+    # Validate date and time formats
+    if not validate_date_format(data["date"]):
+        return jsonify({"msg": "Formato de fecha inválido. Use YYYY-MM-DD"}), HTTPStatus.BAD_REQUEST
+    
+    if not validate_time_format(data["time"]):
+        return jsonify({"msg": "Formato de hora inválido. Use HH:MM (24h)"}), HTTPStatus.BAD_REQUEST
+    
+    # Check if date is in the future
+    date_obj = datetime.datetime.strptime(f"{data['date']} {data['time']}", "%Y-%m-%d %H:%M")
+    if date_obj < datetime.datetime.now():
+        return jsonify({"msg": "La cita debe ser en el futuro"}), HTTPStatus.BAD_REQUEST
+    
+    dates_collection = AsyncDatabase.get_instance().get_collection("dates")
+    
+    # Create new date
+    new_date = {
+        "userId": user_id,
+        "title": data["title"],
+        "date": data["date"],
+        "time": data["time"],
+        "description": data["description"],
+        "status": "pending",
+        "created_at": datetime.datetime.now()
+    }
+    
+    # Reserve the slot atomically through the partial unique index
+    try:
+        result = await dates_collection.insert_one(new_date)
+    except DuplicateKeyError:
+        return jsonify({"msg": "Este horario ya está ocupado"}), HTTPStatus.CONFLICT
+    await bump_data_version(user_id)
+    
+    # Log date creation
+    logger.info("Nueva cita creada con ID %s para usuario %s", result.inserted_id, user_id)
+    
+    return jsonify({
+        "msg": "Cita creada exitosamente",
+        "date": new_date
+    }), HTTPStatus.CREATED
+
+@dates_bp.route('/<id>', methods=['DELETE'])
+@jwt_required
+async def cancel_date(id):
+    """Cancel an appointment"""
+    user_id = get_jwt_identity()
+    
+    # Validate ID format
+    try:
+        date_id = ObjectId(id)
+    except:
+        return jsonify({"msg": "ID de cita inválido"}), HTTPStatus.BAD_REQUEST
+    
+    dates_collection = AsyncDatabase.get_instance().get_collection("dates")
+    
+    update = {"$set": {"status": "cancelled", "cancelled_at": datetime.datetime.now()}}
+    
+    # Cancel in one write when the date is pending and belongs to the user
+    date = await dates_collection.find_one_and_update(
+        {"_id": date_id, "userId": user_id, "status": "pending"},
+        update,
+        projection={"userId": 1}
+    )
+    
+    if not date:
+        # Miss path: find out why before answering
+        date = await dates_collection.find_one({"_id": date_id}, {"userId": 1, "status": 1})
+        if not date:
+            return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
+        
+        # Check if user is the owner of the date or an admin
+        if date["userId"] != user_id and await get_current_role() != "admin":
+            return jsonify({"msg": "No tiene permiso para cancelar esta cita"}), HTTPStatus.FORBIDDEN
+        
+        # Admins may cancel someone else's date, still only while pending
+        if date["status"] != "pending" or not await dates_collection.find_one_and_update(
+            {"_id": date_id, "status": "pending"}, update, projection={"_id": 1}
+        ):
+            return await pending_guard_error(dates_collection, date_id, "cancelar")
+    await bump_data_version(date["userId"])
+    
+    # Log date cancellation
+    logger.info("Cita con ID %s cancelada por usuario %s", id, user_id)
+    
+    return jsonify({"msg": "Cita cancelada exitosamente"}), HTTPStatus.OK
+
+# Admin Routes
+@admin_dates_bp.route('', methods=['GET'])
+@admin_required
+async def get_all_dates():
+    """Get all appointments (admin only)"""
+    # Get query parameters
+    page = int(request.args.get('page', 1))
+    page_size = int(request.args.get('page_size', 10))
+    after = request.args.get('after')
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
+    status = request.args.get('status')
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    
+    # Build query
+    query = {}
+    
+    # Filter by status if provided
+    if status:
+        query["status"] = status
+    
+    # Filter by date range if provided
+    if date_from or date_to:
+        query["date"] = build_date_range_query(date_from, date_to)
+    
+    # Get paginated results
+    try:
+        result = await paginate_results(
+            collection="dates", 
+            query=query, 
+            page=page, 
+            page_size=page_size,
+            sort_by=("date", 1),  # Sort by date ascending
+            after=after,
+            with_total=with_total,
+            projection=DATE_FIELDS
+        )
+    except ValueError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.BAD_REQUEST
+    
+    return jsonify(result), HTTPStatus.OK
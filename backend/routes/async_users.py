@@ -0,0 +1,98 @@
+# routes/async_users.py - User routes (async mode)
+from quart import Blueprint, request, jsonify
+from http import HTTPStatus
+import logging
+
+from async_utils import (jwt_required, admin_required, etag_by_data_version, get_jwt_identity, get_user_data,
+                         paginate_results)
+from utils import USER_PUBLIC_FIELDS, DATE_FIELDS
+
+users_bp = Blueprint('async_users', __name__)
+logger = logging.getLogger(__name__)
+
+@users_bp.route('/me', methods=['GET'])
+@jwt_required
+@etag_by_data_version
+async def get_current_user():
+    """Get current user information"""
+    user_id = get_jwt_identity()
+    user_data = await get_user_data(user_id)
+    
+    if not user_data:
+        return jsonify({"msg": "Usuario no encontrado"}), HTTPStatus.NOT_FOUND
+    
+    return jsonify(user_data), HTTPStatus.OK
+
+@users_bp.route('/me/dates', methods=['GET'])
+@jwt_required
+@etag_by_data_version
+async def get_user_dates():
+    """Get current user appointments"""
+    user_id = get_jwt_identity()
+    
+    # Get query parameters
+    page = int(request.args.get('page', 1))
+    page_size = int(request.args.get('page_size', 10))
+    after = request.args.get('after')
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
+    status = request.args.get('status')
+    
+    # Build query
+    query = {"userId": user_id}
+    
+    # Filter by status if provided
+    if status:
+        query["status"] = status
+    
+    # Get paginated results
+    try:
+        result = await paginate_results(
+            collection="dates", 
+            query=query, 
+            page=page, 
+            page_size=page_size,
+            sort_by=("date", 1),  # Sort by date ascending
+            after=after,
+            with_total=with_total,
+            projection=DATE_FIELDS
+        )
+    except ValueError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.BAD_REQUEST
+    
+    return jsonify(result), HTTPStatus.OK
+
+# Admin routes for managing users
+@users_bp.route('', methods=['GET'])
+@admin_required
+async def get_all_users():
+    """Get all users (admin only)"""
+    # Get query parameters
+    page = int(request.args.get('page', 1))
+    page_size = int(request.args.get('page_size', 10))
+    after = request.args.get('after')
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
+    rol = request.args.get('rol')
+    
+    # Build query
+    query = {}
+    
+    # Filter by role if provided
+    if rol:
+        query["rol"] = rol
+    
+    # Get paginated results
+    try:
+        result = await paginate_results(
+            collection="users", 
+            query=query, 
+            page=page, 
+            page_size=page_size,
+            sort_by=("name", 1),  # Sort by name ascending
+            after=after,
+            with_total=with_total,
+            projection=USER_PUBLIC_FIELDS
+        )
+    except ValueError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.BAD_REQUEST
+    
+    return jsonify(result), HTTPStatus.OK
@@ -1,17 +1,17 @@
 # routes/auth.py - Authentication routes
 from flask import Blueprint, request, jsonify
 from http import HTTPStatus
-from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
 import re
 from bson.objectid import ObjectId
 import logging
 from datetime import datetime
 
 from db import Database
-from utils import get_user_data, validate_request_json
+from passwords import hash_password, verify_password, upgrade_password_hash, HasherBusyError
+from utils import get_user_data, validate_request_json, create_user_token, hasher_busy_response
 
 auth_bp = Blueprint('auth', __name__)
+auth_bp.register_error_handler(HasherBusyError, hasher_busy_response)
 logger = logging.getLogger(__name__)
 
 @auth_bp.route('/login', methods=['POST'])
@@ -30,20 +30,28 @@ def login():
     users_collection = db_instance.get_collection("users")
     
     # Find user by email
-    user = users_collection.find_one({"email": email})
+    user = users_collection.find_one(
+        {"email": email},
+        {"userId": 1, "password": 1, "rol": 1, "token_version": 1}
+    )
     if not user:
         # Use same error message to prevent user enumeration
         return jsonify({"msg": "Credenciales inválidas"}), HTTPStatus.UNAUTHORIZED
     
     # Verify password
-    if not check_password_hash(user.get("password", ""), password):
+    valid_password = verify_password(user.get("password", ""), password)
+    
+    if not valid_password:
         return jsonify({"msg": "Credenciales inválidas"}), HTTPStatus.UNAUTHORIZED
     
+    # Move hashes made with an older method or cost to the configured one
+    upgrade_password_hash(user["userId"], user["password"], password)
+    
     # Create access token
-    access_token = create_access_token(identity=user["userId"])
+    access_token = create_user_token(user)
     
     # Log successful login
-    logger.info(f"Usuario con ID {user['userId']} ha iniciado sesión exitosamente")
+    logger.info("Usuario con ID %s ha iniciado sesión exitosamente", user['userId'])
     
     return jsonify({
         "access_token": access_token, 
@@ -77,11 +85,11 @@ def signup():
     users_collection = db_instance.get_collection("users")
     
     # Check if email already exists
-    if users_collection.find_one({"email": email}):
+    if users_collection.find_one({"email": email}, {"_id": 1}):
         return jsonify({"msg": "Ya existe un usuario con este email"}), HTTPStatus.CONFLICT
     
     # Hash password
-    hashed_password = generate_password_hash(password)
+    hashed_password = hash_password(password)
     
     # Create user ID
     user_id = str(ObjectId())
@@ -93,16 +101,17 @@ def signup():
         "email": email,
         "password": hashed_password,
         "rol": rol,
+        "token_version": 0,
         "created_at": datetime.utcnow()
     }
     
     users_collection.insert_one(user_data)
     
     # Create token for automatic login
-    token = create_access_token(identity=user_id)
+    token = create_user_token(user_data)
     
     # Log user creation
-    logger.info(f"Nuevo usuario creado con ID {user_id} y rol {rol}")
+    logger.info("Nuevo usuario creado con ID %s y rol %s", user_id, rol)
     
     return jsonify({
         "msg": "Usuario creado exitosamente",
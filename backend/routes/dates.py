@@ -1,14 +1,41 @@
 # routes/dates.py - Routes for appointments
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from http import HTTPStatus
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import csv
 import datetime
+import io
+import json
 import re
 import logging
 
-from db import Database
-from utils import admin_required, validate_request_json, paginate_results
+from db import Database, ACTIVE_DATE_STATUSES
+from config import get_config
+from utils import (admin_required, validate_request_json, paginate_results, get_current_role, bump_data_version,
+                   DATE_FIELDS)
+
+# Longest range accepted by the availability endpoint
+MAX_AVAILABILITY_DAYS = 62
+
+# Documents fetched per round-trip (and flushed per chunk) by the export
+EXPORT_BATCH_SIZE = 500
+
+# Rows validated and written per insert_many by the bulk import
+IMPORT_CHUNK_SIZE = 1000
+
+# Most appointments accepted by one bulk status change
+BULK_STATUS_MAX_IDS = 500
+
+# Valid appointment statuses
+DATE_STATUSES = ["pending", "completed", "cancelled"]
+
+# Column order of the CSV export
+EXPORT_CSV_FIELDS = ["_id"] + list(DATE_FIELDS)
+
+# Leading characters that make spreadsheets evaluate a cell as a formula
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
 
 dates_bp = Blueprint('dates', __name__)
 admin_dates_bp = Blueprint('admin_dates', __name__)
@@ -27,17 +54,76 @@ def validate_time_format(time_str):
     """Validate time string format (HH:MM)"""
     return bool(re.match(r"^([01]\d|2[0-3]):([0-5]\d)$", time_str))
 
-def date_exists(date_id):
-    """Check if date with given ID exists"""
-    db_instance = Database.get_instance()
-    dates_collection = db_instance.get_collection("dates")
-    return dates_collection.count_documents({"_id": ObjectId(date_id)}) > 0
+def build_date_range_query(date_from, date_to):
+    """Build a MongoDB range filter for the date field"""
+    date_query = {}
+    if date_from:
+        date_query["$gte"] = date_from
+    if date_to:
+        date_query["$lte"] = date_to
+    return date_query
 
-def is_date_owner(date_id, user_id):
-    """Check if user is the owner of the date"""
-    db_instance = Database.get_instance()
-    dates_collection = db_instance.get_collection("dates")
-    return dates_collection.count_documents({"_id": ObjectId(date_id), "userId": user_id}) > 0
+def csv_safe(value):
+    """Quote a user-supplied string so spreadsheets show it as text"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def time_to_minutes(time_str):
+    """Convert an HH:MM string into minutes since midnight"""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def opening_slots_mask(clinic_hours, slot_minutes):
+    """Build a bitmap with one bit per slot starting inside opening hours
+    
+    ``clinic_hours`` is a comma-separated list of HH:MM-HH:MM ranges. Bit
+    ``i`` stands for the slot starting ``i * slot_minutes`` after midnight.
+    """
+    mask = 0
+    for opening_range in clinic_hours.split(","):
+        start, end = opening_range.strip().split("-")
+        start_slot = -(-time_to_minutes(start) // slot_minutes)
+        end_slot = -(-time_to_minutes(end) // slot_minutes)
+        for slot in range(start_slot, end_slot):
+            mask |= 1 << slot
+    return mask
+
+def validate_import_row(row):
+    """Validate an imported appointment, returning an error message or None"""
+    if not isinstance(row, dict):
+        return "Cada línea debe ser un objeto JSON"
+    
+    required_fields = ["userId", "title", "date", "time", "description"]
+    missing_fields = [field for field in required_fields if not row.get(field)]
+    if missing_fields:
+        return f"Campos requeridos faltantes: {', '.join(missing_fields)}"
+    
+    # Lists or objects would break the slot checks further down
+    invalid_fields = [field for field in required_fields if not isinstance(row[field], str)]
+    if invalid_fields:
+        return f"Los campos deben ser texto: {', '.join(invalid_fields)}"
+    
+    if len(row["title"]) < 5:
+        return "El título debe tener al menos 5 caracteres"
+    
+    if not validate_date_format(row["date"]):
+        return "Formato de fecha inválido. Use YYYY-MM-DD"
+    
+    if not validate_time_format(row["time"]):
+        return "Formato de hora inválido. Use HH:MM (24h)"
+    
+    if row.get("status", "pending") not in DATE_STATUSES:
+        return "Estado inválido. Debe ser 'pending', 'completed' o 'cancelled'"
+    
+    return None
+
+def pending_guard_error(dates_collection, date_id, action):
+    """Explain why a pending-only update matched nothing (miss path only)"""
+    date = dates_collection.find_one({"_id": date_id}, {"status": 1})
+    if not date:
+        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
+    return jsonify({"msg": f"No se puede {action} una cita con estado: {date['status']}"}), HTTPStatus.BAD_REQUEST
 
 # User Routes
 @dates_bp.route('', methods=['POST'])
@@ -64,19 +150,9 @@ def create_date():
     if date_obj < datetime.datetime.now():
         return jsonify({"msg": "La cita debe ser en el futuro"}), HTTPStatus.BAD_REQUEST
     
-    # Check if time slot is available
     db_instance = Database.get_instance()
     dates_collection = db_instance.get_collection("dates")
     
-    existing_date = dates_collection.find_one({
-        "date": data["date"],
-        "time": data["time"],
-        "status": {"$ne": "cancelled"}
-    })
-    
-    if existing_date:
-        return jsonify({"msg": "Este horario ya está ocupado"}), HTTPStatus.CONFLICT
-    
     # Create new date
     new_date = {
         "userId": user_id,
@@ -88,16 +164,92 @@ def create_date():
         "created_at": datetime.datetime.now()
     }
     
-    result = dates_collection.insert_one(new_date)
+    # Reserve the slot atomically: the partial unique index on (date, time)
+    # rejects a second active appointment for the same slot
+    try:
+        result = dates_collection.insert_one(new_date)
+    except DuplicateKeyError:
+        return jsonify({"msg": "Este horario ya está ocupado"}), HTTPStatus.CONFLICT
+    bump_data_version(user_id)
     
     # Log date creation
-    logger.info(f"Nueva cita creada con ID {result.inserted_id} para usuario {user_id}")
+    logger.info("Nueva cita creada con ID %s para usuario %s", result.inserted_id, user_id)
     
     return jsonify({
         "msg": "Cita creada exitosamente",
-        "date": Database.fix_id({**new_date, "_id": result.inserted_id})
+        "date": new_date
     }), HTTPStatus.CREATED
 
+@dates_bp.route('/availability', methods=['GET'])
+@jwt_required()
+def get_availability():
+    """Get free appointment slots for a range of days"""
+    date_from = request.args.get('from')
+    date_to = request.args.get('to', date_from)
+    
+    # Validate date range
+    if not date_from or not validate_date_format(date_from) or not validate_date_format(date_to):
+        return jsonify({"msg": "Formato de fecha inválido. Use YYYY-MM-DD"}), HTTPStatus.BAD_REQUEST
+    
+    start = datetime.datetime.strptime(date_from, "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(date_to, "%Y-%m-%d").date()
+    if end < start or (end - start).days >= MAX_AVAILABILITY_DAYS:
+        return jsonify({"msg": f"El rango debe ser de 1 a {MAX_AVAILABILITY_DAYS} días"}), HTTPStatus.BAD_REQUEST
+    
+    # Validate slot size
+    try:
+        slot_minutes = int(request.args.get('slot_minutes', 30))
+    except ValueError:
+        slot_minutes = 0
+    if slot_minutes < 5 or slot_minutes > 240 or (24 * 60) % slot_minutes:
+        return jsonify({"msg": "slot_minutes debe dividir el día en intervalos de 5 a 240 minutos"}), HTTPStatus.BAD_REQUEST
+    
+    open_mask = opening_slots_mask(get_config()["CLINIC_HOURS"], slot_minutes)
+    
+    # One range query for every active appointment in the range
+    db_instance = Database.get_instance()
+    dates_collection = db_instance.get_collection("dates")
+    
+    occupied = {}
+    for date in dates_collection.find(
+        {"date": {"$gte": date_from, "$lte": date_to}, "status": {"$in": ACTIVE_DATE_STATUSES}},
+        {"_id": 0, "date": 1, "time": 1}
+    ):
+        slot = time_to_minutes(date["time"]) // slot_minutes
+        occupied[date["date"]] = occupied.get(date["date"], 0) | (1 << slot)
+    
+    # Slots that already started are not bookable
+    now = datetime.datetime.now()
+    current_slot = -(-(now.hour * 60 + now.minute) // slot_minutes)
+    
+    days = []
+    day = start
+    while day <= end:
+        day_str = day.strftime("%Y-%m-%d")
+        free_mask = open_mask & ~occupied.get(day_str, 0)
+        if day < now.date():
+            free_mask = 0
+        elif day == now.date():
+            free_mask &= ~((1 << current_slot) - 1)
+        
+        slots = []
+        slot = 0
+        while free_mask >> slot:
+            if (free_mask >> slot) & 1:
+                minutes = slot * slot_minutes
+                slots.append(f"{minutes // 60:02d}:{minutes % 60:02d}")
+            slot += 1
+        
+        days.append({"date": day_str, "slots": slots})
+        day += datetime.timedelta(days=1)
+    
+    return jsonify({
+        "from": date_from,
+        "to": date_to,
+        "slot_minutes": slot_minutes,
+        "days": days
+    }), HTTPStatus.OK
+
 @dates_bp.route('/<id>', methods=['DELETE'])
 @jwt_required()
 def cancel_date(id):
@@ -113,30 +265,34 @@ def cancel_date(id):
     db_instance = Database.get_instance()
     dates_collection = db_instance.get_collection("dates")
     
-    # Check if date exists and belongs to user
-    date = dates_collection.find_one({"_id": date_id})
-    if not date:
-        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
+    update = {"$set": {"status": "cancelled", "cancelled_at": datetime.datetime.now()}}
     
-    # Check if user is the owner of the date or an admin
-    users_collection = db_instance.get_collection("users")
-    user = users_collection.find_one({"userId": user_id})
-    
-    if date["userId"] != user_id and (not user or user.get("rol") != "admin"):
-        return jsonify({"msg": "No tiene permiso para cancelar esta cita"}), HTTPStatus.FORBIDDEN
-    
-    # Check if date is already cancelled or completed
-    if date["status"] != "pending":
-        return jsonify({"msg": f"No se puede cancelar una cita con estado: {date['status']}"}), HTTPStatus.BAD_REQUEST
-    
-    # Update date status
-    result = dates_collection.update_one(
-        {"_id": date_id},
-        {"$set": {"status": "cancelled", "cancelled_at": datetime.datetime.now()}}
+    # Cancel in one write when the date is pending and belongs to the user
+    date = dates_collection.find_one_and_update(
+        {"_id": date_id, "userId": user_id, "status": "pending"},
+        update,
+        projection={"userId": 1}
     )
     
+    if not date:
+        # Miss path: find out why before answering
+        date = dates_collection.find_one({"_id": date_id}, {"userId": 1, "status": 1})
+        if not date:
+            return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
+        
+        # Check if user is the owner of the date or an admin
+        if date["userId"] != user_id and get_current_role() != "admin":
+            return jsonify({"msg": "No tiene permiso para cancelar esta cita"}), HTTPStatus.FORBIDDEN
+        
+        # Admins may cancel someone else's date, still only while pending
+        if date["status"] != "pending" or not dates_collection.find_one_and_update(
+            {"_id": date_id, "status": "pending"}, update, projection={"_id": 1}
+        ):
+            return pending_guard_error(dates_collection, date_id, "cancelar")
+    bump_data_version(date["userId"])
+    
     # Log date cancellation
-    logger.info(f"Cita con ID {id} cancelada por usuario {user_id}")
+    logger.info("Cita con ID %s cancelada por usuario %s", id, user_id)
     
     return jsonify({"msg": "Cita cancelada exitosamente"}), HTTPStatus.OK
 
@@ -148,6 +304,8 @@ def get_all_dates():
     # Get query parameters
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 10))
+    after = request.args.get('after')
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
     status = request.args.get('status')
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
@@ -161,24 +319,308 @@ def get_all_dates():
     
     # Filter by date range if provided
     if date_from or date_to:
-        date_query = {}
-        if date_from:
-            date_query["$gte"] = date_from
-        if date_to:
-            date_query["$lte"] = date_to
-        query["date"] = date_query
+        query["date"] = build_date_range_query(date_from, date_to)
     
     # Get paginated results
-    result = paginate_results(
-        collection="dates", 
-        query=query, 
-        page=page, 
-        page_size=page_size,
-        sort_by=("date", 1)  # Sort by date ascending
-    )
+    try:
+        result = paginate_results(
+            collection="dates", 
+            query=query, 
+            page=page, 
+            page_size=page_size,
+            sort_by=("date", 1),  # Sort by date ascending
+            after=after,
+            with_total=with_total,
+            projection=DATE_FIELDS
+        )
+    except ValueError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.BAD_REQUEST
     
     return jsonify(result), HTTPStatus.OK
 
+@admin_dates_bp.route('/bulk', methods=['POST'])
+@admin_required
+def import_dates():
+    """Import appointments from an NDJSON body (admin only)"""
+    db_instance = Database.get_instance()
+    dates_collection = db_instance.get_collection("dates")
+    users_collection = db_instance.get_collection("users")
+    
+    errors = []
+    inserted = 0
+    seen_slots = set()
+    
+    def write_chunk(chunk):
+        """Check users and slots for a chunk with two queries, then insert it"""
+        nonlocal inserted
+        if not chunk:
+            return
+        
+        user_ids = list({date["userId"] for _, date in chunk})
+        known_users = {
+            user["userId"]
+            for user in users_collection.find({"userId": {"$in": user_ids}}, {"_id": 0, "userId": 1})
+        }
+        
+        days = list({date["date"] for _, date in chunk})
+        taken_slots = {
+            (date["date"], date["time"])
+            for date in dates_collection.find(
+                {"date": {"$in": days}, "status": {"$in": ACTIVE_DATE_STATUSES}},
+                {"_id": 0, "date": 1, "time": 1}
+            )
+        }
+        
+        documents, lines = [], []
+        for line_number, date in chunk:
+            slot = (date["date"], date["time"])
+            if date["userId"] not in known_users:
+                errors.append({"line": line_number, "msg": "Usuario no encontrado"})
+            elif date["status"] in ACTIVE_DATE_STATUSES and (slot in taken_slots or slot in seen_slots):
+                errors.append({"line": line_number, "msg": "Este horario ya está ocupado"})
+            else:
+                if date["status"] in ACTIVE_DATE_STATUSES:
+                    seen_slots.add(slot)
+                documents.append(date)
+                lines.append(line_number)
+        
+        if not documents:
+            return
+        
+        # Unordered so one conflicting row doesn't stop the rest of the chunk
+        try:
+            result = dates_collection.insert_many(documents, ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as err:
+            inserted += err.details.get("nInserted", 0)
+            for write_error in err.details.get("writeErrors", []):
+                message = "Este horario ya está ocupado" if write_error.get("code") == 11000 else write_error.get("errmsg")
+                errors.append({"line": lines[write_error["index"]], "msg": message})
+        bump_data_version(*{date["userId"] for date in documents})
+    
+    chunk = []
+    total_lines = 0
+    for line_number, raw_line in enumerate(request.stream, start=1):
+        if not raw_line.strip():
+            continue
+        total_lines += 1
+        
+        try:
+            row = json.loads(raw_line)
+        except ValueError:
+            errors.append({"line": line_number, "msg": "JSON inválido"})
+            continue
+        
+        error = validate_import_row(row)
+        if error:
+            errors.append({"line": line_number, "msg": error})
+            continue
+        
+        chunk.append((line_number, {
+            "userId": row["userId"],
+            "title": row["title"],
+            "date": row["date"],
+            "time": row["time"],
+            "description": row["description"],
+            "status": row.get("status", "pending"),
+            "created_at": datetime.datetime.now()
+        }))
+        
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            write_chunk(chunk)
+            chunk = []
+    
+    write_chunk(chunk)
+    
+    if total_lines == 0:
+        return jsonify({"msg": "Se requiere un cuerpo NDJSON con al menos una cita"}), HTTPStatus.BAD_REQUEST
+    
+    # Log import
+    user_id = get_jwt_identity()
+    logger.info("Importación masiva: %s citas creadas y %s errores por admin %s", inserted, len(errors), user_id)
+    
+    return jsonify({
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": sorted(errors, key=lambda error: error["line"])
+    }), HTTPStatus.OK
+
+@admin_dates_bp.route('/bulk/status', methods=['PUT'])
+@admin_required
+@validate_request_json(['ids', 'status'])
+def bulk_update_status():
+    """Complete or cancel several pending appointments at once (admin only)"""
+    data = request.json
+    ids = data["ids"]
+    status = data["status"]
+    
+    if status not in ["completed", "cancelled"]:
+        return jsonify({"msg": "Estado inválido. Debe ser 'completed' o 'cancelled'"}), HTTPStatus.BAD_REQUEST
+    
+    if not isinstance(ids, list) or not ids or len(ids) > BULK_STATUS_MAX_IDS:
+        return jsonify({"msg": f"Se requiere una lista de 1 a {BULK_STATUS_MAX_IDS} IDs"}), HTTPStatus.BAD_REQUEST
+    
+    results = {}
+    requested = []
+    for id in ids:
+        date_id = Database.to_object_id(id) if isinstance(id, str) else None
+        if date_id is None:
+            results[str(id)] = {"id": str(id), "result": "invalid_id", "msg": "ID de cita inválido"}
+        else:
+            requested.append((id, date_id))
+    object_ids = [date_id for _, date_id in requested]
+    
+    db_instance = Database.get_instance()
+    dates_collection = db_instance.get_collection("dates")
+    
+    timestamp_field = "completed_at" if status == "completed" else "cancelled_at"
+    
+    # Tag the write with an id of its own: an appointment carries it only if
+    # this request changed it, however close other writes are in time
+    batch_id = ObjectId()
+    
+    # Apply the pending-only guard inside a single write
+    update_result = dates_collection.update_many(
+        {"_id": {"$in": object_ids}, "status": "pending"},
+        {"$set": {"status": status, timestamp_field: datetime.datetime.now(), "status_batch": batch_id}}
+    )
+    
+    # One read to tell updated, missing and non-pending appointments apart
+    found = {
+        date["_id"]: date
+        for date in dates_collection.find({"_id": {"$in": object_ids}}, {"userId": 1, "status": 1, "status_batch": 1})
+    }
+    updated_users = set()
+    for key, date_id in requested:
+        date = found.get(date_id)
+        if date is None:
+            results[key] = {"id": key, "result": "not_found", "msg": "Cita no encontrada"}
+        elif date.get("status_batch") == batch_id:
+            results[key] = {"id": key, "result": "updated"}
+            updated_users.add(date["userId"])
+        else:
+            results[key] = {
+                "id": key,
+                "result": "invalid_status",
+                "msg": f"No se puede cambiar una cita con estado: {date['status']}"
+            }
+    if updated_users:
+        bump_data_version(*updated_users)
+    
+    # Log bulk update
+    user_id = get_jwt_identity()
+    logger.info("%s citas marcadas como %s por admin %s", update_result.modified_count, status, user_id)
+    
+    return jsonify({
+        "updated": update_result.modified_count,
+        "results": [results[str(id)] for id in ids]
+    }), HTTPStatus.OK
+
+@admin_dates_bp.route('/export', methods=['GET'])
+@admin_required
+def export_dates():
+    """Stream all matching appointments as NDJSON or CSV (admin only)"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ["ndjson", "csv"]:
+        return jsonify({"msg": "Formato inválido. Debe ser 'ndjson' o 'csv'"}), HTTPStatus.BAD_REQUEST
+    
+    status = request.args.get('status')
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    
+    # Build query
+    query = {}
+    if status:
+        query["status"] = status
+    if date_from or date_to:
+        query["date"] = build_date_range_query(date_from, date_to)
+    
+    db_instance = Database.get_instance()
+    dates_collection = db_instance.get_collection("dates")
+    cursor = dates_collection.find(query, DATE_FIELDS).sort([("date", 1), ("_id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    
+    json_provider = current_app.json
+    
+    def generate_ndjson():
+        lines = []
+        for date in cursor:
+            lines.append(json_provider.dumps(date))
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for count, date in enumerate(cursor, start=1):
+            writer.writerow({key: csv_safe(value) for key, value in date.items()})
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    # Log export
+    user_id = get_jwt_identity()
+    logger.info("Exportación de citas en formato %s solicitada por admin %s", export_format, user_id)
+    
+    if export_format == "csv":
+        generator, mimetype = generate_csv(), "text/csv"
+    else:
+        generator, mimetype = generate_ndjson(), "application/x-ndjson"
+    
+    return Response(
+        stream_with_context(generator),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=citas.{export_format}"}
+    )
+
+@admin_dates_bp.route('/summary', methods=['GET'])
+@admin_required
+def get_dates_summary():
+    """Get appointment counts for the admin dashboard (admin only)"""
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    
+    # Validate date range formats if provided
+    for value in (date_from, date_to):
+        if value and not validate_date_format(value):
+            return jsonify({"msg": "Formato de fecha inválido. Use YYYY-MM-DD"}), HTTPStatus.BAD_REQUEST
+    
+    # Build query
+    query = {}
+    if date_from or date_to:
+        query["date"] = build_date_range_query(date_from, date_to)
+    
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    
+    # Compute every counter in a single round-trip
+    db_instance = Database.get_instance()
+    dates_collection = db_instance.get_collection("dates")
+    
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "today": [{"$match": {"date": today}}, {"$count": "count"}],
+            "upcoming": [{"$match": {"date": {"$gt": today}, "status": "pending"}}, {"$count": "count"}],
+            "pending": [{"$match": {"status": "pending"}}, {"$count": "count"}],
+            "completed": [{"$match": {"status": "completed"}}, {"$count": "count"}],
+            "cancelled": [{"$match": {"status": "cancelled"}}, {"$count": "count"}]
+        }}
+    ]
+    
+    facets = next(dates_collection.aggregate(pipeline), {})
+    summary = {
+        name: (counts[0]["count"] if counts else 0)
+        for name, counts in facets.items()
+    }
+    
+    return jsonify(summary), HTTPStatus.OK
+
 @admin_dates_bp.route('/<id>', methods=['PUT'])
 @admin_required
 def update_date(id):
@@ -198,10 +640,6 @@ def update_date(id):
     if "title" in data and (not data["title"] or len(data["title"]) < 5):
         return jsonify({"msg": "El título debe tener al menos 5 caracteres"}), HTTPStatus.BAD_REQUEST
     
-    # Check if date exists
-    if not date_exists(id):
-        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
-    
     # Validate date and time formats if provided
     if "date" in data and not validate_date_format(data["date"]):
         return jsonify({"msg": "Formato de fecha inválido. Use YYYY-MM-DD"}), HTTPStatus.BAD_REQUEST
@@ -214,21 +652,32 @@ def update_date(id):
         return jsonify({"msg": "La descripción debe tener al menos 5 caracteres"}), HTTPStatus.BAD_REQUEST
     
     # Check if status is valid if provided
-    if "status" in data and data["status"] not in ["pending", "completed", "cancelled"]:
+    if "status" in data and data["status"] not in DATE_STATUSES:
         return jsonify({"msg": "Estado inválido. Debe ser 'pending', 'completed' o 'cancelled'"}), HTTPStatus.BAD_REQUEST
     
     # Add updated_at timestamp
     data["updated_at"] = datetime.datetime.now()
     
-    # Update date
-    result = dates_collection.update_one(
-        {"_id": date_id},
-        {"$set": data}
-    )
+    # Update date (moving it onto an occupied slot violates the slot index)
+    try:
+        date = dates_collection.find_one_and_update(
+            {"_id": date_id},
+            {"$set": data},
+            projection={"userId": 1}
+        )
+    except DuplicateKeyError:
+        return jsonify({"msg": "Este horario ya está ocupado"}), HTTPStatus.CONFLICT
+    
+    # Check if date exists
+    if not date:
+        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
+    
+    # Both owners see the change when the date is reassigned
+    bump_data_version(date["userId"], data.get("userId", date["userId"]))
     
     # Log date update
     user_id = get_jwt_identity()
-    logger.info(f"Cita con ID {id} actualizada por admin {user_id}")
+    logger.info("Cita con ID %s actualizada por admin %s", id, user_id)
     
     return jsonify({"msg": "Cita actualizada exitosamente"}), HTTPStatus.OK
 
@@ -245,24 +694,19 @@ def complete_date(id):
     db_instance = Database.get_instance()
     dates_collection = db_instance.get_collection("dates")
     
-    # Check if date exists
-    date = dates_collection.find_one({"_id": date_id})
-    if not date:
-        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
-    
-    # Check if date is already completed or cancelled
-    if date["status"] != "pending":
-        return jsonify({"msg": f"No se puede completar una cita con estado: {date['status']}"}), HTTPStatus.BAD_REQUEST
-    
-    # Update date status
-    result = dates_collection.update_one(
-        {"_id": date_id},
-        {"$set": {"status": "completed", "completed_at": datetime.datetime.now()}}
+    # Update date status only while it is still pending
+    date = dates_collection.find_one_and_update(
+        {"_id": date_id, "status": "pending"},
+        {"$set": {"status": "completed", "completed_at": datetime.datetime.now()}},
+        projection={"userId": 1}
     )
+    if not date:
+        return pending_guard_error(dates_collection, date_id, "completar")
+    bump_data_version(date["userId"])
     
     # Log date completion
     user_id = get_jwt_identity()
-    logger.info(f"Cita con ID {id} marcada como completada por admin {user_id}")
+    logger.info("Cita con ID %s marcada como completada por admin %s", id, user_id)
     
     return jsonify({"msg": "Cita marcada como completada exitosamente"}), HTTPStatus.OK
 
@@ -279,23 +723,18 @@ def cancel_date(id):
     db_instance = Database.get_instance()
     dates_collection = db_instance.get_collection("dates")
 
-    # Verificar que la cita exista
-    date = dates_collection.find_one({"_id": date_id})
-    if not date:
-        return jsonify({"msg": "Cita no encontrada"}), HTTPStatus.NOT_FOUND
-
-    # Verificar que aún no esté cancelada o completada
-    if date["status"] != "pending":
-        return jsonify({"msg": f"No se puede cancelar una cita con estado: {date['status']}"}), HTTPStatus.BAD_REQUEST
-
-    # Actualizar estado a cancelada
-    result = dates_collection.update_one(
-        {"_id": date_id},
-        {"$set": {"status": "cancelled", "cancelled_at": datetime.datetime.now()}}
+    # Actualizar estado a cancelada solo si sigue pendiente
+    date = dates_collection.find_one_and_update(
+        {"_id": date_id, "status": "pending"},
+        {"$set": {"status": "cancelled", "cancelled_at": datetime.datetime.now()}},
+        projection={"userId": 1}
     )
+    if not date:
+        return pending_guard_error(dates_collection, date_id, "cancelar")
+    bump_data_version(date["userId"])
 
     # Registrar en logs
     user_id = get_jwt_identity()
-    logger.info(f"Cita con ID {id} cancelada por admin {user_id}")
+    logger.info("Cita con ID %s cancelada por admin %s", id, user_id)
 
     return jsonify({"msg": "Cita cancelada exitosamente"}), HTTPStatus.OK
@@ -2,17 +2,20 @@
 from flask import Blueprint, request, jsonify
 from http import HTTPStatus
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 import logging
 
 from db import Database
-from utils import validate_request_json, get_user_data, admin_required, paginate_results
+from passwords import hash_password, verify_password, HasherBusyError
+from utils import (validate_request_json, get_user_data, admin_required, paginate_results, invalidate_user,
+                   etag_by_data_version, hasher_busy_response, USER_PUBLIC_FIELDS, DATE_FIELDS)
 
 users_bp = Blueprint('users', __name__)
+users_bp.register_error_handler(HasherBusyError, hasher_busy_response)
 logger = logging.getLogger(__name__)
 
 @users_bp.route('/me', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
 def get_current_user():
     """Get current user information"""
     user_id = get_jwt_identity()
@@ -35,7 +38,7 @@ def update_current_user():
         return jsonify({"msg": "No se proporcionaron datos para actualizar"}), HTTPStatus.BAD_REQUEST
     
     # Prevent updating sensitive fields
-    forbidden_fields = ["userId", "password", "rol", "_id"]
+    forbidden_fields = ["userId", "password", "rol", "_id", "data_version", "token_version"]
     for field in forbidden_fields:
         if field in data:
             data.pop(field)
@@ -51,14 +54,15 @@ def update_current_user():
     db_instance = Database.get_instance()
     users_collection = db_instance.get_collection("users")
     
-    # Update user
+    # Update user, moving its change version for ETags
     users_collection.update_one(
         {"userId": user_id},
-        {"$set": data}
+        {"$set": data, "$inc": {"data_version": 1}}
     )
+    invalidate_user(user_id)
     
     # Log user update
-    logger.info(f"Usuario con ID {user_id} ha actualizado su información")
+    logger.info("Usuario con ID %s ha actualizado su información", user_id)
     
     # Return updated user data
     updated_user = get_user_data(user_id)
@@ -86,28 +90,30 @@ def change_password():
     users_collection = db_instance.get_collection("users")
     
     # Get user
-    user = users_collection.find_one({"userId": user_id})
+    user = users_collection.find_one({"userId": user_id}, {"password": 1})
     if not user:
         return jsonify({"msg": "Usuario no encontrado"}), HTTPStatus.NOT_FOUND
     
-    # Check if current password is correct
-    if not check_password_hash(user["password"], current_password):
+    # Check if current password is correct and hash the new one
+    if not verify_password(user["password"], current_password):
         return jsonify({"msg": "Contraseña actual incorrecta"}), HTTPStatus.UNAUTHORIZED
+    hashed_password = hash_password(new_password)
     
-    # Update password
-    hashed_password = generate_password_hash(new_password)
+    # Update password and revoke previously issued role tokens
     users_collection.update_one(
         {"userId": user_id},
-        {"$set": {"password": hashed_password}}
+        {"$set": {"password": hashed_password}, "$inc": {"token_version": 1}}
     )
+    invalidate_user(user_id)
     
     # Log password change
-    logger.info(f"Usuario con ID {user_id} ha cambiado su contraseña")
+    logger.info("Usuario con ID %s ha cambiado su contraseña", user_id)
     
     return jsonify({"msg": "Contraseña actualizada exitosamente"}), HTTPStatus.OK
 
 @users_bp.route('/me/dates', methods=['GET'])
 @jwt_required()
+@etag_by_data_version
 def get_user_dates():
     """Get current user appointments"""
     user_id = get_jwt_identity()
@@ -115,6 +121,8 @@ def get_user_dates():
     # Get query parameters
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 10))
+    after = request.args.get('after')
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
     status = request.args.get('status')
     
     # Build query
@@ -125,13 +133,19 @@ def get_user_dates():
         query["status"] = status
     
     # Get paginated results
-    result = paginate_results(
-        collection="dates", 
-        query=query, 
-        page=page, 
-        page_size=page_size,
-        sort_by=("date", 1)  # Sort by date ascending
-    )
+    try:
+        result = paginate_results(
+            collection="dates", 
+            query=query, 
+            page=page, 
+            page_size=page_size,
+            sort_by=("date", 1),  # Sort by date ascending
+            after=after,
+            with_total=with_total,
+            projection=DATE_FIELDS
+        )
+    except ValueError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.BAD_REQUEST
     
     return jsonify(result), HTTPStatus.OK
 
@@ -143,6 +157,8 @@ def get_all_users():
     # Get query parameters
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 10))
+    after = request.args.get('after')
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
     rol = request.args.get('rol')
     
     # Build query
@@ -153,18 +169,19 @@ def get_all_users():
         query["rol"] = rol
     
     # Get paginated results
-    result = paginate_results(
-        collection="users", 
-        query=query, 
-        page=page, 
-        page_size=page_size,
-        sort_by=("name", 1)  # Sort by name ascending
-    )
-    
-    # Remove sensitive information
-    for user in result["data"]:
-        if "password" in user:
-            del user["password"]
+    try:
+        result = paginate_results(
+            collection="users", 
+            query=query, 
+            page=page, 
+            page_size=page_size,
+            sort_by=("name", 1),  # Sort by name ascending
+            after=after,
+            with_total=with_total,
+            projection=USER_PUBLIC_FIELDS
+        )
+    except ValueError as err:
+        return jsonify({"msg": str(err)}), HTTPStatus.BAD_REQUEST
     
     return jsonify(result), HTTPStatus.OK
 
@@ -175,16 +192,12 @@ def get_user_by_id(user_id):
     db_instance = Database.get_instance()
     users_collection = db_instance.get_collection("users")
     
-    # Find user
-    user = users_collection.find_one({"userId": user_id})
+    # Find user (never loading the password hash)
+    user = users_collection.find_one({"userId": user_id}, USER_PUBLIC_FIELDS)
     if not user:
         return jsonify({"msg": "Usuario no encontrado"}), HTTPStatus.NOT_FOUND
     
-    # Remove sensitive information
-    if "password" in user:
-        del user["password"]
-    
-    return jsonify(Database.fix_id(user)), HTTPStatus.OK
+    return jsonify(user), HTTPStatus.OK
 
 @users_bp.route('/<user_id>', methods=['PUT'])
 @admin_required
@@ -197,7 +210,7 @@ def update_user(user_id):
         return jsonify({"msg": "No se proporcionaron datos para actualizar"}), HTTPStatus.BAD_REQUEST
     
     # Prevent updating sensitive fields
-    forbidden_fields = ["userId", "password", "_id"]
+    forbidden_fields = ["userId", "password", "_id", "data_version", "token_version"]
     for field in forbidden_fields:
         if field in data:
             data.pop(field)
@@ -214,18 +227,20 @@ def update_user(user_id):
     users_collection = db_instance.get_collection("users")
     
     # Check if user exists
-    if not users_collection.find_one({"userId": user_id}):
+    user = users_collection.find_one({"userId": user_id}, {"rol": 1})
+    if not user:
         return jsonify({"msg": "Usuario no encontrado"}), HTTPStatus.NOT_FOUND
     
-    # Update user
-    users_collection.update_one(
-        {"userId": user_id},
-        {"$set": data}
-    )
+    # Update user, revoking role tokens when the role changes
+    update = {"$set": data, "$inc": {"data_version": 1}}
+    if "rol" in data and data["rol"] != user.get("rol"):
+        update["$inc"]["token_version"] = 1
+    users_collection.update_one({"userId": user_id}, update)
+    invalidate_user(user_id)
     
     # Log user update
     admin_id = get_jwt_identity()
-    logger.info(f"Usuario con ID {user_id} actualizado por admin {admin_id}")
+    logger.info("Usuario con ID %s actualizado por admin %s", user_id, admin_id)
     
     # Return updated user data
     updated_user = get_user_data(user_id)
@@ -250,18 +265,20 @@ def reset_user_password(user_id):
     users_collection = db_instance.get_collection("users")
     
     # Check if user exists
-    if not users_collection.find_one({"userId": user_id}):
+    if not users_collection.find_one({"userId": user_id}, {"_id": 1}):
         return jsonify({"msg": "Usuario no encontrado"}), HTTPStatus.NOT_FOUND
     
-    # Update password
-    hashed_password = generate_password_hash(new_password)
+    hashed_password = hash_password(new_password)
+    
+    # Update password and revoke previously issued role tokens
     users_collection.update_one(
         {"userId": user_id},
-        {"$set": {"password": hashed_password}}
+        {"$set": {"password": hashed_password}, "$inc": {"token_version": 1}}
     )
+    invalidate_user(user_id)
     
     # Log password reset
     admin_id = get_jwt_identity()
-    logger.info(f"Contraseña de usuario con ID {user_id} reseteada por admin {admin_id}")
+    logger.info("Contraseña de usuario con ID %s reseteada por admin %s", user_id, admin_id)
     
     return jsonify({"msg": "Contraseña reseteada exitosamente"}), HTTPStatus.OK
\ No newline at end of file
@@ -1,6 +1,7 @@
 # run.py - Application entry point
 from app import create_app
 from config import configure_logging, get_config
+from db import Database
 
 # Configure logging
 logger = configure_logging()
@@ -13,8 +14,11 @@ if __name__ == "__main__":
     config = get_config()
     
     # Log startup information
-    logger.info(f"Starting DentixPro API on {config['HOST']}:{config['PORT']}")
-    logger.info(f"Debug mode: {config['DEBUG']}")
+    logger.info("Starting DentixPro API on %s:%s", config['HOST'], config['PORT'])
+    logger.info("Debug mode: %s", config['DEBUG'])
+    
+    # Connect and warm up the pool before serving (gunicorn does it per worker)
+    Database.get_instance()
     
     # Run application
     app.run(
@@ -12,6 +12,8 @@ from routes.auth import auth_bp
 from routes.dates import dates_bp, admin_dates_bp
 from routes.users import users_bp  # Asegúrate de que existe
 from db import Database
+from json_provider import MongoJSONProvider
+from utils import user_cache, register_jwt_callbacks
 
 @pytest.fixture
 def mock_db():
@@ -25,6 +27,9 @@ def mock_db():
         mock_db_instance = mock_instance.return_value
         mock_db_instance.get_collection.side_effect = lambda name: mock_database[name]
         
+        # Vaciar la caché de usuarios entre pruebas
+        user_cache.clear()
+        
         yield mock_db_instance
 
 @pytest.fixture
@@ -32,6 +37,7 @@ def app(mock_db):
     """Crear aplicación Flask para testing"""
     # Crear nueva instancia de Flask para testing
     test_app = Flask(__name__)
+    test_app.json = MongoJSONProvider(test_app)
     test_app.config.update({
         "TESTING": True,
         "JWT_SECRET_KEY": "test-secret-key",
@@ -41,6 +47,7 @@ def app(mock_db):
     
     # Configurar JWT
     jwt = JWTManager(test_app)
+    register_jwt_callbacks(jwt)
     
     # Registrar blueprints
     test_app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -88,6 +95,7 @@ def test_user(mock_db, sample_user_data):
     user_data = sample_user_data.copy()
     user_data['password'] = generate_password_hash(user_data['password'])
     user_data['_id'] = '507f1f77bcf86cd799439011'  # ObjectId mock
+    user_data['userId'] = user_data['_id']
     
     # Insertar en la colección mock
     users_collection = mock_db.get_collection('users')
@@ -117,6 +125,7 @@ def admin_token(app, mock_db, sample_admin_data):
     admin_data = sample_admin_data.copy()
     admin_data['password'] = generate_password_hash(admin_data['password'])
     admin_data['_id'] = '507f1f77bcf86cd799439012'
+    admin_data['userId'] = admin_data['_id']
     
     # Insertar admin en la colección mock
     users_collection = mock_db.get_collection('users')
@@ -0,0 +1,268 @@
+# test_asgi.py - Pruebas para el modo asíncrono (ASGI)
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+pytest.importorskip("quart")
+pytest.importorskip("hypercorn")
+
+import asgi
+from db import AsyncDatabase
+from passwords import HasherBusyError
+
+class FakeAsyncCursor:
+    """Cursor asíncrono sobre un cursor de mongomock"""
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+    
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+    
+    def skip(self, count):
+        self.cursor = self.cursor.skip(count)
+        return self
+    
+    def limit(self, count):
+        self.cursor = self.cursor.limit(count)
+        return self
+    
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+class FakeAsyncCollection:
+    """Colección asíncrona sobre una colección de mongomock"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def find(self, *args, **kwargs):
+        return FakeAsyncCursor(self.collection.find(*args, **kwargs))
+    
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+        
+        async def wrapper(*args, **kwargs):
+            return method(*args, **kwargs)
+        return wrapper
+
+@pytest.fixture
+def async_db(mock_db):
+    """Mock de AsyncDatabase que comparte las colecciones de mock_db"""
+    with patch.object(AsyncDatabase, 'get_instance') as mock_instance:
+        mock_async_instance = mock_instance.return_value
+        mock_async_instance.get_collection.side_effect = lambda name: FakeAsyncCollection(mock_db.get_collection(name))
+        yield mock_async_instance
+
+@pytest.fixture
+def async_app(app, async_db):
+    """Aplicación Quart con las rutas asíncronas"""
+    return asgi.create_async_app(app)
+
+def request(async_app, method, path, **kwargs):
+    """Ejecutar una petición contra la aplicación Quart"""
+    async def run():
+        client = async_app.test_client()
+        response = await client.open(path, method=method, **kwargs)
+        return response.status_code, await response.get_json()
+    return asyncio.run(run())
+
+class TestAsyncAuth:
+    """Pruebas para las rutas de autenticación asíncronas"""
+    
+    def test_login_success(self, async_app, test_user):
+        """Test login exitoso en modo asíncrono"""
+        status, data = request(async_app, 'POST', '/api/auth/login', json={
+            "email": "test@example.com",
+            "password": "testpassword123"
+        })
+        
+        assert status == 200
+        assert "access_token" in data
+        assert data["user"]["userId"] == test_user["userId"]
+    
+    def test_login_invalid_credentials(self, async_app, test_user):
+        """Test login con contraseña incorrecta"""
+        status, data = request(async_app, 'POST', '/api/auth/login', json={
+            "email": "test@example.com",
+            "password": "wrongpassword"
+        })
+        
+        assert status == 401
+        assert data["msg"] == "Credenciales inválidas"
+    
+    def test_login_busy(self, async_app, test_user):
+        """Test 503 cuando el pool de contraseñas está saturado"""
+        with patch('routes.async_auth.verify_password_async', side_effect=HasherBusyError):
+            status, data = request(async_app, 'POST', '/api/auth/login', json={
+                "email": "test@example.com",
+                "password": "testpassword123"
+            })
+        
+        assert status == 503
+        assert data["msg"] == "Servidor ocupado, intente de nuevo en unos segundos"
+    
+    def test_signup_token_accepted_by_wsgi_app(self, async_app, client, mock_db):
+        """Test que el token emitido por Quart es válido en la aplicación Flask"""
+        status, data = request(async_app, 'POST', '/api/auth/signup', json={
+            "name": "Async User",
+            "email": "async@example.com",
+            "password": "asyncpassword123"
+        })
+        
+        assert status == 201
+        assert mock_db.get_collection('users').count_documents({"email": "async@example.com"}) == 1
+        
+        response = client.get('/users/me', headers={'Authorization': f'Bearer {data["access_token"]}'})
+        
+        assert response.status_code == 200
+        assert response.get_json()["email"] == "async@example.com"
+
+class TestAsyncDates:
+    """Pruebas para las rutas de citas asíncronas"""
+    
+    def test_create_date_with_wsgi_token(self, async_app, auth_headers, mock_db):
+        """Test crear cita con un token emitido por Flask-JWT-Extended"""
+        future_date = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+        status, data = request(async_app, 'POST', '/api/dates', headers=auth_headers, json={
+            "title": "Limpieza dental",
+            "date": future_date,
+            "time": "10:00",
+            "description": "Limpieza semestral"
+        })
+        
+        assert status == 201
+        assert data["date"]["status"] == "pending"
+        assert mock_db.get_collection('dates').count_documents({"date": future_date}) == 1
+    
+    def test_create_date_requires_token(self, async_app):
+        """Test crear cita sin token"""
+        status, data = request(async_app, 'POST', '/api/dates', json={
+            "title": "Limpieza dental",
+            "date": "2030-01-01",
+            "time": "10:00",
+            "description": "Limpieza semestral"
+        })
+        
+        assert status == 401
+    
+    def test_cancel_date_not_owner(self, async_app, auth_headers, mock_db):
+        """Test cancelar una cita de otro usuario"""
+        date_id = mock_db.get_collection('dates').insert_one({
+            "userId": "otro-usuario",
+            "date": "2030-01-01",
+            "time": "10:00",
+            "status": "pending"
+        }).inserted_id
+        
+        status, data = request(async_app, 'DELETE', f'/api/dates/{date_id}', headers=auth_headers)
+        
+        assert status == 403
+        assert mock_db.get_collection('dates').find_one({"_id": date_id})["status"] == "pending"
+    
+    def test_get_all_dates_admin(self, async_app, admin_headers, auth_headers, mock_db):
+        """Test listado paginado de citas para administradores"""
+        mock_db.get_collection('dates').insert_many([
+            {"userId": "u1", "title": f"Cita {i}", "date": f"2030-01-0{i}", "time": "10:00", "status": "pending"}
+            for i in range(1, 4)
+        ])
+        
+        status, data = request(async_app, 'GET', '/api/admin/dates?page_size=2', headers=admin_headers)
+        
+        assert status == 200
+        assert [date["date"] for date in data["data"]] == ["2030-01-01", "2030-01-02"]
+        assert data["pagination"]["has_more"] is True
+        assert data["pagination"]["total_items"] == 3
+        
+        status, data = request(async_app, 'GET', '/api/admin/dates', headers=auth_headers)
+        
+        assert status == 403
+
+class TestAsyncStartup:
+    """Pruebas para el arranque de la aplicación Quart"""
+    
+    def test_indexes_ensured_before_serving(self, async_app, mock_db):
+        """Test que el modo asíncrono conecta la base síncrona (que crea los índices) al arrancar"""
+        from db import Database
+        
+        async def start():
+            async with async_app.test_app():
+                pass
+        
+        Database.get_instance.reset_mock()
+        asyncio.run(start())
+        
+        Database.get_instance.assert_called_once_with()
+
+class TestAsyncUsers:
+    """Pruebas para las rutas de usuario asíncronas"""
+    
+    def test_me_dates_not_modified(self, async_app, auth_headers, mock_db):
+        """Test 304 con ETag hasta que una cita del usuario cambia"""
+        async def get(headers):
+            response = await async_app.test_client().get('/api/users/me/dates', headers=headers)
+            return response.status_code, response.headers.get('ETag')
+        
+        status, etag = asyncio.run(get(auth_headers))
+        assert status == 200
+        
+        status, _ = asyncio.run(get({**auth_headers, 'If-None-Match': etag}))
+        assert status == 304
+        
+        future_date = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+        status, _ = request(async_app, 'POST', '/api/dates', headers=auth_headers, json={
+            "title": "Limpieza dental",
+            "date": future_date,
+            "time": "10:00",
+            "description": "Limpieza semestral"
+        })
+        assert status == 201
+        
+        status, new_etag = asyncio.run(get({**auth_headers, 'If-None-Match': etag}))
+        assert status == 200
+        assert new_etag != etag
+
+class TestDispatcher:
+    """Pruebas para el despachador entre Quart y Flask"""
+    
+    def call(self, dispatcher, method, path):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "headers": [],
+            "client": ("127.0.0.1", 12345), "server": ("localhost", 80)
+        }
+        messages = []
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+        
+        async def receive():
+            # Una vez enviado el cuerpo, el cliente sigue conectado
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()
+        
+        async def send(message):
+            messages.append(message)
+        
+        asyncio.run(dispatcher(scope, receive, send))
+        return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+    
+    def test_routes_requests(self, async_db, monkeypatch):
+        """Test que las rutas portadas van a Quart y el resto a Flask"""
+        monkeypatch.setenv("JWT_SECRET_KEY", "test-secret-key")
+        dispatcher = asgi.create_asgi_app()
+        
+        with patch.object(dispatcher.async_app, 'handle_request', wraps=dispatcher.async_app.handle_request) as handle:
+            status, body = self.call(dispatcher, 'GET', '/api/users/me')
+            assert status == 401
+            assert handle.call_count == 1
+            
+            status, body = self.call(dispatcher, 'GET', '/')
+            assert status == 200
+            assert b"DentixPro API" in body
+            
+            status, body = self.call(dispatcher, 'OPTIONS', '/api/users/me')
+            assert status == 200
+            assert handle.call_count == 1
@@ -305,4 +305,87 @@ class TestAuthIntegration:
             assert login_response.status_code == HTTPStatus.OK
             login_data = json.loads(login_response.data)
             assert "access_token" in login_data
-            assert login_data["user"]["email"] == sample_user_data["email"]
\ No newline at end of file
+            assert login_data["user"]["email"] == sample_user_data["email"]
+
+
+class TestRoleClaims:
+    """Pruebas para tokens con el rol embebido (JWT_ROLE_CLAIMS)"""
+    
+    @pytest.fixture(autouse=True)
+    def enable_role_claims(self, app):
+        app.config["JWT_ROLE_CLAIMS"] = True
+    
+    def _login(self, client, mock_db, rol):
+        users_collection = mock_db.get_collection("users")
+        user_id = str(ObjectId())
+        users_collection.insert_one({
+            "userId": user_id,
+            "name": "Role User",
+            "email": f"{rol}@example.com",
+            "password": generate_password_hash("password123"),
+            "rol": rol,
+            "token_version": 0
+        })
+        response = client.post('/auth/login', json={
+            "email": f"{rol}@example.com",
+            "password": "password123"
+        })
+        assert response.status_code == HTTPStatus.OK
+        return user_id, json.loads(response.data)["access_token"]
+    
+    def test_login_embeds_role_claims(self, app, client, mock_db):
+        """Test que el token incluye el rol y la versión"""
+        from flask_jwt_extended import decode_token
+        
+        _, token = self._login(client, mock_db, "admin")
+        
+        with app.app_context():
+            claims = decode_token(token)
+        assert claims["rol"] == "admin"
+        assert claims["ver"] == 0
+    
+    def test_admin_check_uses_claim(self, client, mock_db):
+        """Test que el rol se lee del token sin consultar usuarios"""
+        _, token = self._login(client, mock_db, "admin")
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        with patch('utils.get_cached_user', return_value={"token_version": 0}) as cached_user:
+            response = client.get('/admin/dates', headers=headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        # Solo la verificación de versión, nunca la del rol
+        assert cached_user.call_count == 1
+    
+    def test_token_revoked_after_version_bump(self, client, mock_db):
+        """Test que incrementar token_version revoca los tokens emitidos"""
+        from utils import invalidate_user
+        
+        user_id, token = self._login(client, mock_db, "admin")
+        headers = {'Authorization': f'Bearer {token}'}
+        assert client.get('/admin/dates', headers=headers).status_code == HTTPStatus.OK
+        
+        mock_db.get_collection("users").update_one(
+            {"userId": user_id}, {"$inc": {"token_version": 1}}
+        )
+        invalidate_user(user_id)
+        
+        response = client.get('/admin/dates', headers=headers)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+    
+    def test_self_update_cannot_restore_token_version(self, client, mock_db):
+        """Test que un admin degradado no puede reactivar su token anterior"""
+        from utils import invalidate_user
+        
+        user_id, old_token = self._login(client, mock_db, "admin")
+        users_collection = mock_db.get_collection("users")
+        users_collection.update_one({"userId": user_id}, {"$set": {"rol": "user"}, "$inc": {"token_version": 1}})
+        invalidate_user(user_id)
+        
+        response = client.post('/auth/login', json={"email": "admin@example.com", "password": "password123"})
+        new_headers = {'Authorization': f'Bearer {json.loads(response.data)["access_token"]}'}
+        response = client.put('/users/me', headers=new_headers, json={"name": "Role User", "token_version": 0})
+        
+        assert response.status_code == HTTPStatus.OK
+        assert users_collection.find_one({"userId": user_id})["token_version"] == 1
+        response = client.get('/admin/dates', headers={'Authorization': f'Bearer {old_token}'})
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,65 @@
+# test_benchmarks.py - Pruebas para la suite de benchmarks
+import pytest
+
+from benchmarks.run import SCENARIOS, compare, copied_projections, percentile, run_suite
+from db import Database
+
+class TestBenchmarkSuite:
+    """Pruebas para benchmarks/run.py"""
+    
+    def test_percentile(self):
+        """Test percentil por rango más cercano"""
+        values = list(range(1, 101))
+        
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.95) == 95
+        assert percentile(values, 0.99) == 99
+        assert percentile([], 0.95) == 0.0
+    
+    def test_compare_flags_regressions(self):
+        """Test detección de regresiones frente a la referencia"""
+        baseline = {"users.get_current_user": {"p95_ms": 10.0, "rps": 100.0, "errors": 0}}
+        
+        assert compare({"users.get_current_user": {"p95_ms": 11.0, "rps": 90.0, "errors": 0}}, baseline, 0.25) == []
+        regressions = compare({"users.get_current_user": {"p95_ms": 20.0, "rps": 50.0, "errors": 1}}, baseline, 0.25)
+        assert len(regressions) == 3
+    
+    def test_every_blueprint_is_covered(self):
+        """Test que hay escenarios para todos los blueprints"""
+        blueprints = {scenario.name.split(".")[0] for scenario in SCENARIOS}
+        
+        assert blueprints == {"auth", "dates", "admin_dates", "users"}
+    
+    def test_every_route_is_covered(self, app):
+        """Test que cada ruta de los blueprints tiene su escenario"""
+        endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split(".")[0] in
+                     {"auth", "dates", "admin_dates", "users"}}
+        
+        assert endpoints - {scenario.name for scenario in SCENARIOS} == set()
+    
+    def test_copied_projections(self):
+        """Test que mongomock recibe una copia de la proyección y se restaura find"""
+        mongomock = pytest.importorskip("mongomock")
+        original = mongomock.collection.Collection.find
+        collection = mongomock.MongoClient().db.users
+        collection.insert_one({"userId": "u1", "name": "Ana", "password": "hash"})
+        projection = {"_id": 0, "userId": 1, "name": 1}
+        
+        with copied_projections():
+            assert collection.find_one({"userId": "u1"}, projection) == {"userId": "u1", "name": "Ana"}
+        
+        assert projection == {"_id": 0, "userId": 1, "name": 1}
+        assert mongomock.collection.Collection.find is original
+    
+    def test_smoke_run(self, monkeypatch):
+        """Test ejecución mínima contra mongomock sin respuestas inesperadas"""
+        pytest.importorskip("mongomock")
+        monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+        
+        results = run_suite(users=5, dates=50, requests=4, concurrency=2, warmup=1,
+                            routes=["dates.", "users.get_current_user", "admin_dates.complete_date", "admin_dates.cancel_date",
+                                    "users.change_password", "users.update_user", "users.reset_user_password"])
+        
+        assert "dates.cancel_date" in results
+        assert all(result["errors"] == 0 for result in results.values())
+        assert Database._instance is None
@@ -1,5 +1,7 @@
 # test_dates.py - Pruebas unitarias para endpoints de citas
 import pytest
+import csv
+import io
 import json
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
@@ -250,6 +252,197 @@ class TestDatesEndpoints:
     #     data = json.loads(response.data)
     #     assert "ID de cita inválido" in data['msg']
 
+class TestSlotReservation:
+    """Pruebas para la reserva atómica de horarios"""
+    
+    @pytest.fixture
+    def slot_index(self, mock_db):
+        """Índice único de horario (mongomock ignora el filtro parcial)"""
+        mock_db.get_collection('dates').create_index(
+            [("date", 1), ("time", 1)], name="active_slot_unique", unique=True
+        )
+    
+    def _date_data(self):
+        future_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        return {
+            "title": "Cita médica",
+            "date": future_date,
+            "time": "14:30",
+            "description": "Consulta general con el doctor"
+        }
+    
+    def test_create_date_success(self, client, auth_headers, mock_db, slot_index):
+        """Test crear cita exitosamente con una sola escritura"""
+        dates_collection = mock_db.get_collection('dates')
+        
+        with patch.object(dates_collection, 'find_one', wraps=dates_collection.find_one) as find_one:
+            response = client.post('/dates', json=self._date_data(), headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.CREATED
+        data = json.loads(response.data)
+        assert data['msg'] == "Cita creada exitosamente"
+        assert data['date']['status'] == "pending"
+        find_one.assert_not_called()
+    
+    def test_create_date_slot_taken(self, client, auth_headers, mock_db, slot_index):
+        """Test crear cita en un horario ocupado"""
+        first = client.post('/dates', json=self._date_data(), headers=auth_headers)
+        second = client.post('/dates', json=self._date_data(), headers=auth_headers)
+        
+        assert first.status_code == HTTPStatus.CREATED
+        assert second.status_code == HTTPStatus.CONFLICT
+        data = json.loads(second.data)
+        assert data['msg'] == "Este horario ya está ocupado"
+        assert mock_db.get_collection('dates').count_documents({}) == 1
+    
+    def test_update_date_onto_taken_slot(self, client, admin_headers, mock_db, slot_index):
+        """Test mover una cita a un horario ocupado"""
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_one({"date": "2030-01-01", "time": "10:00", "status": "pending"})
+        other = dates_collection.insert_one({"date": "2030-01-01", "time": "11:00", "status": "pending"})
+        
+        response = client.put(f'/admin/dates/{other.inserted_id}',
+                            json={"time": "10:00"},
+                            headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.CONFLICT
+
+class TestAvailability:
+    """Pruebas para el endpoint de disponibilidad"""
+    
+    def test_get_availability(self, client, auth_headers, mock_db):
+        """Test horarios libres excluyendo citas activas"""
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_many([
+            {"date": "2099-01-05", "time": "09:00", "status": "pending"},
+            {"date": "2099-01-05", "time": "10:00", "status": "cancelled"},
+            {"date": "2099-01-06", "time": "15:30", "status": "completed"}
+        ])
+        
+        response = client.get('/dates/availability?from=2099-01-05&to=2099-01-06',
+                            headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['slot_minutes'] == 30
+        first_day, second_day = data['days']
+        assert first_day['date'] == "2099-01-05"
+        assert "09:00" not in first_day['slots']
+        assert "10:00" in first_day['slots']
+        assert "14:00" not in first_day['slots']
+        assert first_day['slots'][-1] == "18:00"
+        assert "15:30" not in second_day['slots']
+        assert len(second_day['slots']) == 15
+    
+    def test_get_availability_past_day(self, client, auth_headers):
+        """Test que los días pasados no tienen horarios libres"""
+        response = client.get('/dates/availability?from=2000-01-01', headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['days'] == [{"date": "2000-01-01", "slots": []}]
+    
+    def test_get_availability_invalid_params(self, client, auth_headers):
+        """Test parámetros inválidos de disponibilidad"""
+        invalid_urls = [
+            '/dates/availability',
+            '/dates/availability?from=2099/01/01',
+            '/dates/availability?from=2099-01-10&to=2099-01-01',
+            '/dates/availability?from=2099-01-01&to=2099-06-01',
+            '/dates/availability?from=2099-01-01&slot_minutes=7'
+        ]
+        
+        for url in invalid_urls:
+            response = client.get(url, headers=auth_headers)
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+
+class TestConditionalStatusUpdates:
+    """Pruebas para los cambios de estado con una sola escritura condicional"""
+    
+    def _insert_date(self, mock_db, user_id, status="pending"):
+        return mock_db.get_collection('dates').insert_one({
+            "userId": user_id, "title": "Limpieza dental", "date": "2099-01-01",
+            "time": "10:00", "description": "Cita de prueba", "status": status
+        }).inserted_id
+    
+    def test_cancel_own_date_single_write(self, client, auth_headers, test_user, mock_db):
+        """Test cancelar una cita propia sin lecturas previas"""
+        date_id = self._insert_date(mock_db, test_user['userId'])
+        dates_collection = mock_db.get_collection('dates')
+        
+        with patch.object(dates_collection, 'find_one_and_update',
+                          wraps=dates_collection.find_one_and_update) as find_one_and_update, \
+             patch('routes.dates.get_current_role') as get_current_role:
+            response = client.delete(f'/dates/{date_id}', headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        find_one_and_update.assert_called_once()
+        get_current_role.assert_not_called()
+        assert dates_collection.find_one({"_id": date_id})['status'] == "cancelled"
+    
+    def test_cancel_other_user_date(self, client, auth_headers, mock_db):
+        """Test cancelar la cita de otro usuario"""
+        date_id = self._insert_date(mock_db, "otro-usuario")
+        
+        response = client.delete(f'/dates/{date_id}', headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert mock_db.get_collection('dates').find_one({"_id": date_id})['status'] == "pending"
+    
+    def test_admin_cancels_other_user_date(self, client, admin_headers, mock_db):
+        """Test que un admin cancela la cita de otro usuario"""
+        date_id = self._insert_date(mock_db, "otro-usuario")
+        
+        response = client.delete(f'/dates/{date_id}', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        assert mock_db.get_collection('dates').find_one({"_id": date_id})['status'] == "cancelled"
+    
+    def test_cancel_completed_date(self, client, auth_headers, test_user, mock_db):
+        """Test cancelar una cita ya completada"""
+        date_id = self._insert_date(mock_db, test_user['userId'], status="completed")
+        
+        response = client.delete(f'/dates/{date_id}', headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        data = json.loads(response.data)
+        assert data['msg'] == "No se puede cancelar una cita con estado: completed"
+    
+    def test_complete_date(self, client, admin_headers, mock_db):
+        """Test completar una cita pendiente"""
+        date_id = self._insert_date(mock_db, "u1")
+        
+        response = client.put(f'/admin/dates/{date_id}/complete', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        date = mock_db.get_collection('dates').find_one({"_id": date_id})
+        assert date['status'] == "completed"
+        assert 'completed_at' in date
+    
+    def test_complete_cancelled_date(self, client, admin_headers, mock_db):
+        """Test completar una cita cancelada"""
+        date_id = self._insert_date(mock_db, "u1", status="cancelled")
+        
+        response = client.put(f'/admin/dates/{date_id}/complete', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        data = json.loads(response.data)
+        assert data['msg'] == "No se puede completar una cita con estado: cancelled"
+    
+    def test_admin_cancel_missing_date(self, client, admin_headers):
+        """Test cancelar (admin) una cita inexistente"""
+        response = client.put(f'/admin/dates/{ObjectId()}/cancel', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.NOT_FOUND
+    
+    def test_update_missing_date(self, client, admin_headers):
+        """Test actualizar una cita inexistente"""
+        response = client.put(f'/admin/dates/{ObjectId()}',
+                            json={"title": "Nueva revisión"},
+                            headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
 class TestAdminDatesEndpoints:
     """Pruebas para endpoints de administrador de citas"""
     
@@ -460,6 +653,242 @@ class TestAdminDatesEndpoints:
             
             assert response.status_code == HTTPStatus.UNAUTHORIZED
 
+    def test_get_dates_summary(self, client, admin_headers, mock_db):
+        """Test resumen de citas para el panel de administración"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_many([
+            {"userId": "u1", "date": today, "time": "10:00", "status": "pending"},
+            {"userId": "u1", "date": tomorrow, "time": "10:00", "status": "pending"},
+            {"userId": "u2", "date": tomorrow, "time": "11:00", "status": "cancelled"},
+            {"userId": "u2", "date": yesterday, "time": "09:00", "status": "completed"}
+        ])
+        
+        response = client.get('/admin/dates/summary', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['total'] == 4
+        assert data['today'] == 1
+        assert data['upcoming'] == 1
+        assert data['pending'] == 2
+        assert data['completed'] == 1
+        assert data['cancelled'] == 1
+    
+    def test_get_dates_summary_with_range(self, client, admin_headers, mock_db):
+        """Test resumen de citas filtrado por rango de fechas"""
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_many([
+            {"userId": "u1", "date": "2024-01-10", "time": "10:00", "status": "completed"},
+            {"userId": "u1", "date": "2024-02-10", "time": "10:00", "status": "cancelled"}
+        ])
+        
+        response = client.get('/admin/dates/summary?date_from=2024-01-01&date_to=2024-01-31',
+                            headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['total'] == 1
+        assert data['completed'] == 1
+        assert data['cancelled'] == 0
+    
+    def test_get_dates_summary_invalid_range(self, client, admin_headers):
+        """Test resumen de citas con fecha inválida"""
+        response = client.get('/admin/dates/summary?date_from=2024/01/01', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+    
+    def test_get_dates_summary_no_admin(self, client, auth_headers):
+        """Test resumen de citas sin permisos de admin"""
+        response = client.get('/admin/dates/summary', headers=auth_headers)
+        
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+    def test_export_dates_ndjson(self, client, admin_headers, mock_db):
+        """Test exportación de citas en NDJSON"""
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_many([
+            {"userId": "u1", "title": "Limpieza dental", "date": "2024-01-02", "time": "10:00", "status": "pending"},
+            {"userId": "u2", "title": "Revisión general", "date": "2024-01-01", "time": "09:00", "status": "completed"}
+        ])
+        
+        response = client.get('/admin/dates/export?format=ndjson', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        assert response.mimetype == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert [row['date'] for row in rows] == ["2024-01-01", "2024-01-02"]
+        assert isinstance(rows[0]['_id'], str)
+    
+    def test_export_dates_csv(self, client, admin_headers, mock_db):
+        """Test exportación de citas en CSV con filtro de estado"""
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_many([
+            {"userId": "u1", "title": "Limpieza dental", "date": "2024-01-02", "time": "10:00", "status": "pending"},
+            {"userId": "u2", "title": "Revisión general", "date": "2024-01-01", "time": "09:00", "status": "completed"}
+        ])
+        
+        response = client.get('/admin/dates/export?format=csv&status=pending', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        assert response.mimetype == "text/csv"
+        lines = response.data.decode().splitlines()
+        assert lines[0].startswith("_id,userId,title,date,time")
+        assert len(lines) == 2
+        assert "Limpieza dental" in lines[1]
+    
+    def test_export_dates_csv_escapes_formulas(self, client, admin_headers, mock_db):
+        """Test que el CSV no deja fórmulas ejecutables en las celdas"""
+        mock_db.get_collection('dates').insert_one({
+            "userId": "u1", "title": "=HYPERLINK(\"http://x\")", "date": "2024-01-02", "time": "10:00",
+            "description": "@SUM(1)", "status": "pending"
+        })
+        
+        response = client.get('/admin/dates/export?format=csv', headers=admin_headers)
+        rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+        
+        assert rows[0]['title'] == "'=HYPERLINK(\"http://x\")"
+        assert rows[0]['description'] == "'@SUM(1)"
+        assert rows[0]['date'] == "2024-01-02"
+    
+    def test_export_dates_invalid_format(self, client, admin_headers):
+        """Test exportación con formato inválido"""
+        response = client.get('/admin/dates/export?format=xml', headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_import_dates_bulk(self, client, admin_headers, test_user, mock_db):
+        """Test importación masiva con reporte de errores por línea"""
+        dates_collection = mock_db.get_collection('dates')
+        dates_collection.insert_one({"date": "2023-05-01", "time": "09:00", "status": "completed"})
+        
+        user_id = test_user['userId']
+        rows = [
+            {"userId": user_id, "title": "Limpieza dental", "date": "2023-05-02", "time": "10:00",
+             "description": "Importada", "status": "completed"},
+            {"userId": user_id, "title": "Revisión general", "date": "2023-05-01", "time": "09:00",
+             "description": "Horario ocupado en la base", "status": "completed"},
+            {"userId": user_id, "title": "Extracción dental", "date": "2023-05-02", "time": "10:00",
+             "description": "Horario repetido en el lote", "status": "pending"},
+            {"userId": user_id, "title": "Revisión cancelada", "date": "2023-05-02", "time": "10:00",
+             "description": "Las canceladas no ocupan horario", "status": "cancelled"},
+            {"userId": "desconocido", "title": "Radiografía dental", "date": "2023-05-03", "time": "11:00",
+             "description": "Usuario inexistente"},
+            {"userId": user_id, "title": "Fecha mala", "date": "03/05/2023", "time": "11:00",
+             "description": "Formato inválido"}
+        ]
+        body = "\n".join(json.dumps(row) for row in rows) + "\n{no es json\n"
+        
+        response = client.post('/admin/dates/bulk', data=body,
+                             content_type='application/x-ndjson',
+                             headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['inserted'] == 2
+        assert data['failed'] == 5
+        assert [error['line'] for error in data['errors']] == [2, 3, 5, 6, 7]
+        assert data['errors'][0]['msg'] == "Este horario ya está ocupado"
+        assert data['errors'][2]['msg'] == "Usuario no encontrado"
+        assert dates_collection.count_documents({}) == 3
+    
+    def test_import_dates_bulk_rejects_non_string_fields(self, client, admin_headers, test_user, mock_db):
+        """Test que campos que no son texto se reportan por línea sin error 500"""
+        user_id = test_user['userId']
+        rows = [
+            {"userId": ["x"], "title": "Limpieza dental", "date": "2023-05-02", "time": "10:00", "description": "Lista"},
+            {"userId": user_id, "title": {"a": 1}, "date": "2023-05-02", "time": "10:00", "description": "Objeto"},
+            {"userId": user_id, "title": "Limpieza dental", "date": "2023-05-02", "time": "10:00", "description": "Válida"}
+        ]
+        body = "\n".join(json.dumps(row) for row in rows)
+        
+        response = client.post('/admin/dates/bulk', data=body,
+                             content_type='application/x-ndjson',
+                             headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['inserted'] == 1
+        assert data['errors'] == [
+            {"line": 1, "msg": "Los campos deben ser texto: userId"},
+            {"line": 2, "msg": "Los campos deben ser texto: title"}
+        ]
+    
+    def test_import_dates_bulk_empty(self, client, admin_headers):
+        """Test importación masiva sin contenido"""
+        response = client.post('/admin/dates/bulk', data="",
+                             content_type='application/x-ndjson',
+                             headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_bulk_update_status(self, client, admin_headers, mock_db):
+        """Test completar varias citas en una sola petición"""
+        dates_collection = mock_db.get_collection('dates')
+        pending_ids = dates_collection.insert_many([
+            {"userId": "u1", "date": "2024-01-01", "time": "09:00", "status": "pending"},
+            {"userId": "u1", "date": "2024-01-01", "time": "09:30", "status": "pending"}
+        ]).inserted_ids
+        cancelled_id = dates_collection.insert_one(
+            {"userId": "u1", "date": "2024-01-01", "time": "10:00", "status": "cancelled"}
+        ).inserted_id
+        missing_id = ObjectId()
+        
+        ids = [str(pending_ids[0]), str(pending_ids[1]), str(cancelled_id), str(missing_id), "no-es-un-id"]
+        response = client.put('/admin/dates/bulk/status',
+                            json={"ids": ids, "status": "completed"},
+                            headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        assert data['updated'] == 2
+        assert [r['result'] for r in data['results']] == [
+            "updated", "updated", "invalid_status", "not_found", "invalid_id"
+        ]
+        assert dates_collection.count_documents({"status": "completed"}) == 2
+        assert dates_collection.find_one({"_id": cancelled_id})['status'] == "cancelled"
+    
+    def test_bulk_update_status_same_instant(self, client, admin_headers, mock_db):
+        """Test que una cita completada por otra petición en el mismo instante no se cuenta"""
+        now = datetime(2024, 1, 1, 18, 0)
+        dates_collection = mock_db.get_collection('dates')
+        pending_id = dates_collection.insert_one(
+            {"userId": "u1", "date": "2024-01-01", "time": "09:00", "status": "pending"}
+        ).inserted_id
+        completed_id = dates_collection.insert_one(
+            {"userId": "u1", "date": "2024-01-01", "time": "09:30", "status": "completed",
+             "completed_at": now, "status_batch": ObjectId()}
+        ).inserted_id
+        
+        with patch('routes.dates.datetime') as mock_datetime:
+            mock_datetime.datetime.now.return_value = now
+            response = client.put('/admin/dates/bulk/status',
+                                json={"ids": [str(pending_id), str(completed_id)], "status": "completed"},
+                                headers=admin_headers)
+        
+        data = json.loads(response.data)
+        assert data['updated'] == 1
+        assert [r['result'] for r in data['results']] == ["updated", "invalid_status"]
+    
+    def test_bulk_update_status_invalid_status(self, client, admin_headers):
+        """Test cambio masivo con estado inválido"""
+        response = client.put('/admin/dates/bulk/status',
+                            json={"ids": [str(ObjectId())], "status": "pending"},
+                            headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+    
+    def test_bulk_update_status_empty_ids(self, client, admin_headers):
+        """Test cambio masivo sin IDs"""
+        response = client.put('/admin/dates/bulk/status',
+                            json={"ids": [], "status": "cancelled"},
+                            headers=admin_headers)
+        
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
 
 class TestHelperFunctions:
     """Pruebas para funciones auxiliares"""
@@ -495,35 +924,3 @@ class TestHelperFunctions:
         assert validate_time_format("24:00") == False
         assert validate_time_format("14:60") == False
         assert validate_time_format("invalid") == False
-    
-    # def test_date_exists(self, mock_db):
-    #     """Test función date_exists"""
-    #     from routes.dates import date_exists
-        
-    #     date_id = str(ObjectId())
-    #     dates_collection = mock_db.get_collection('dates')
-    #     dates_collection.count_documents.return_value = 1
-        
-    #     result = date_exists(date_id)
-    #     assert result == True
-        
-    #     dates_collection.count_documents.return_value = 0
-    #     result = date_exists(date_id)
-    #     assert result == False
-    
-    # def test_is_date_owner(self, mock_db):
-    #     """Test función is_date_owner"""
-    #     from routes.dates import is_date_owner
-        
-    #     date_id = str(ObjectId())
-    #     user_id = "test_user_id"
-        
-    #     dates_collection = mock_db.get_collection('dates')
-    #     dates_collection.count_documents.return_value = 1
-        
-    #     result = is_date_owner(date_id, user_id)
-    #     assert result == True
-        
-    #     dates_collection.count_documents.return_value = 0
-    #     result = is_date_owner(date_id, user_id)
-    #     assert result == False
\ No newline at end of file
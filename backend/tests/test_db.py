@@ -0,0 +1,168 @@
+# test_db.py - Pruebas unitarias para la capa de base de datos
+import pytest
+import mongomock
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+from db import Database
+from config import get_config
+
+@pytest.fixture
+def database():
+    """Instancia de Database sobre mongomock sin conexión real"""
+    db_instance = Database.__new__(Database)
+    db_instance.client = mongomock.MongoClient()
+    db_instance.db = db_instance.client.test_database
+    return db_instance
+
+class TestIndexes:
+    """Pruebas para la gestión de índices"""
+    
+    def test_diff_indexes_reports_missing(self, database):
+        """Test reporte de índices faltantes en una base vacía"""
+        report = database.diff_indexes()
+        
+        assert "userId_unique" in report["users"]["missing"]
+        assert "active_slot_unique" in report["dates"]["missing"]
+        assert report["users"]["extra"] == []
+    
+    def test_ensure_indexes_creates_declared(self, database):
+        """Test creación de todos los índices declarados"""
+        database.ensure_indexes()
+        report = database.diff_indexes()
+        
+        for collection_name in Database.INDEXES:
+            assert report[collection_name]["missing"] == []
+    
+    def test_diff_indexes_reports_extra(self, database):
+        """Test reporte de índices no declarados"""
+        database.get_collection("users").create_index("created_at", name="created_at")
+        report = database.diff_indexes()
+        
+        assert report["users"]["extra"] == ["created_at"]
+    
+    def test_unique_email_index(self, database):
+        """Test que el índice único de email rechaza duplicados"""
+        import pymongo
+        
+        database.ensure_indexes()
+        users_collection = database.get_collection("users")
+        users_collection.insert_one({"userId": "1", "email": "a@example.com"})
+        
+        with pytest.raises(pymongo.errors.DuplicateKeyError):
+            users_collection.insert_one({"userId": "2", "email": "a@example.com"})
+
+    def test_ensure_indexes_fails_without_slot_index(self, database):
+        """Test que no poder crear el índice de horarios es un error fatal"""
+        from db import MissingIndexError
+        
+        dates_collection = database.get_collection("dates")
+        dates_collection.insert_many([
+            {"date": "2030-01-01", "time": "10:00", "status": "pending"},
+            {"date": "2030-01-01", "time": "10:00", "status": "pending"}
+        ])
+        
+        with pytest.raises(MissingIndexError, match="dates.active_slot_unique"):
+            database.ensure_indexes()
+    
+    def test_ensure_indexes_tolerates_optional_failures(self, database, caplog):
+        """Test que un índice no requerido que falla solo se registra como error"""
+        users_collection = database.get_collection("users")
+        users_collection.insert_many([
+            {"userId": "1", "email": "a@example.com"},
+            {"userId": "2", "email": "a@example.com"}
+        ])
+        
+        database.ensure_indexes()
+        
+        assert "email_unique" in database.diff_indexes()["users"]["missing"]
+        assert any(record.levelname == "ERROR" and "email_unique" in record.getMessage() for record in caplog.records)
+
+class TestClientOptions:
+    """Pruebas para la configuración del cliente de MongoDB"""
+    
+    def test_client_options_defaults(self, monkeypatch):
+        """Test opciones por defecto del pool"""
+        monkeypatch.delenv("MONGO_MAX_POOL_SIZE", raising=False)
+        monkeypatch.delenv("MONGO_SOCKET_TIMEOUT_MS", raising=False)
+        options = Database.client_options(get_config())
+        
+        assert options["maxPoolSize"] == 100
+        assert options["serverSelectionTimeoutMS"] == 5000
+        assert options["connect"] is False
+        assert "socketTimeoutMS" not in options
+    
+    def test_client_options_from_env(self, monkeypatch):
+        """Test opciones del pool leídas del entorno"""
+        monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "20")
+        monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "4")
+        monkeypatch.setenv("MONGO_SOCKET_TIMEOUT_MS", "2000")
+        monkeypatch.setenv("MONGO_COMPRESSORS", "zlib")
+        monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+        options = Database.client_options(get_config())
+        
+        assert options["maxPoolSize"] == 20
+        assert options["minPoolSize"] == 4
+        assert options["socketTimeoutMS"] == 2000
+        assert options["compressors"] == "zlib"
+        assert options["readPreference"] == "secondaryPreferred"
+    
+    def test_client_options_accepted_by_driver(self, monkeypatch):
+        """Test que pymongo acepta las opciones generadas"""
+        import pymongo
+        
+        monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "1000")
+        monkeypatch.setenv("MONGO_MAX_IDLE_TIME_MS", "60000")
+        client = pymongo.MongoClient("mongodb://localhost:27017", **Database.client_options(get_config()))
+        
+        assert client.options.pool_options.max_pool_size == 100
+        client.close()
+
+class TestSingleton:
+    """Pruebas para la instancia compartida de Database"""
+    
+    @pytest.fixture(autouse=True)
+    def clean_singleton(self):
+        Database._instance = None
+        Database._instance_pid = None
+        yield
+        Database._instance = None
+        Database._instance_pid = None
+    
+    def test_concurrent_first_access_creates_one_instance(self):
+        """Test que accesos concurrentes crean un solo cliente"""
+        created = []
+        
+        def slow_init(self, config=None):
+            time.sleep(0.05)
+            created.append(self)
+        
+        with patch.object(Database, "__init__", slow_init):
+            threads = [threading.Thread(target=Database.get_instance) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        assert len(created) == 1
+    
+    def test_instance_recreated_after_fork(self):
+        """Test que un proceso hijo crea su propia instancia"""
+        with patch.object(Database, "__init__", lambda self, config=None: None):
+            parent = Database.get_instance()
+            with patch("db.os.getpid", return_value=-1):
+                child = Database.get_instance()
+        
+        assert child is not parent
+    
+    def test_reset_closes_client(self):
+        """Test que reset cierra el cliente y descarta la instancia"""
+        with patch.object(Database, "__init__", lambda self, config=None: None):
+            instance = Database.get_instance()
+            instance.client = MagicMock()
+            
+            Database.reset()
+            
+            instance.client.close.assert_called_once()
+            assert Database.get_instance() is not instance
@@ -0,0 +1,116 @@
+# test_gunicorn_conf.py - Pruebas para la configuración de gunicorn
+import pytest
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONF_PATH = os.path.join(BACKEND_DIR, "gunicorn.conf.py")
+
+def load_conf(monkeypatch, cpus, **env):
+    """Cargar gunicorn.conf.py con un número de CPUs y variables dadas"""
+    for name in ("GUNICORN_WORKERS", "GUNICORN_THREADS", "GUNICORN_MAX_REQUESTS"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    
+    with patch("os.sched_getaffinity", return_value=set(range(cpus)), create=True):
+        return runpy.run_path(CONF_PATH)
+
+class TestGunicornConf:
+    """Pruebas para gunicorn.conf.py"""
+    
+    def test_autotunes_from_cpu_count(self, monkeypatch):
+        """Test workers e hilos derivados del número de CPUs"""
+        conf = load_conf(monkeypatch, 4)
+        
+        assert conf["workers"] == 9
+        assert conf["threads"] == 4
+        assert conf["worker_class"] == "gthread"
+        assert conf["preload_app"] is True
+        assert conf["keepalive"] == 5
+        assert conf["backlog"] == 2048
+    
+    def test_reads_dotenv(self, tmp_path):
+        """Test que los valores del .env junto a config.py se aplican al lanzador"""
+        # Un proceso nuevo, con una copia de config.py que lee el .env de tmp_path
+        shutil.copy(os.path.join(BACKEND_DIR, "config.py"), tmp_path / "config.py")
+        (tmp_path / ".env").write_text("GUNICORN_WORKERS=5\nGUNICORN_THREADS=3\n")
+        env = {name: value for name, value in os.environ.items() if not name.startswith("GUNICORN_")}
+        env["PYTHONPATH"] = os.pathsep.join([str(tmp_path), BACKEND_DIR])
+        
+        script = f"import runpy; conf = runpy.run_path({CONF_PATH!r}); print(conf['workers'], conf['threads'])"
+        result = subprocess.run([sys.executable, "-c", script], env=env, cwd=str(tmp_path),
+                                capture_output=True, text=True, check=True)
+        
+        assert result.stdout.split()[-2:] == ["5", "3"]
+    
+    def test_env_overrides(self, monkeypatch):
+        """Test valores explícitos en las variables de entorno"""
+        conf = load_conf(monkeypatch, 4, GUNICORN_WORKERS="2", GUNICORN_THREADS="1",
+                         GUNICORN_MAX_REQUESTS="1000")
+        
+        assert conf["workers"] == 2
+        assert conf["threads"] == 1
+        assert conf["worker_class"] == "sync"
+        assert conf["max_requests"] == 1000
+        assert conf["max_requests_jitter"] == 100
+    
+    def test_post_fork_resets_database(self, monkeypatch):
+        """Test que cada worker crea su propio cliente de MongoDB"""
+        conf = load_conf(monkeypatch, 1)
+        
+        with patch("db.Database.reset") as mock_reset:
+            conf["post_fork"](None, None)
+        
+        mock_reset.assert_called_once()
+    
+    def test_post_worker_init_connects(self, monkeypatch):
+        """Test que el worker se conecta antes de la primera petición"""
+        conf = load_conf(monkeypatch, 1)
+        
+        with patch("db.Database.get_instance") as mock_get_instance:
+            conf["post_worker_init"](SimpleNamespace(log=MagicMock()))
+        mock_get_instance.assert_called_once()
+    
+    def test_post_worker_init_tolerates_mongo_down(self, monkeypatch):
+        """Test que el worker arranca aunque MongoDB no responda"""
+        from pymongo.errors import ServerSelectionTimeoutError
+        conf = load_conf(monkeypatch, 1)
+        worker = SimpleNamespace(log=MagicMock())
+        
+        with patch("db.Database.get_instance", side_effect=ServerSelectionTimeoutError("sin servidor")):
+            conf["post_worker_init"](worker)
+        worker.log.warning.assert_called_once()
+    
+    def test_post_worker_init_fails_without_slot_index(self, monkeypatch):
+        """Test que el worker no arranca si falta el índice de horarios"""
+        from db import MissingIndexError
+        conf = load_conf(monkeypatch, 1)
+        
+        with patch("db.Database.get_instance", side_effect=MissingIndexError("active_slot_unique")):
+            with pytest.raises(MissingIndexError):
+                conf["post_worker_init"](SimpleNamespace(log=MagicMock()))
+    
+    def test_metrics_shared_between_workers(self, monkeypatch, tmp_path):
+        """Test directorio de métricas vaciado al arrancar y salida de workers"""
+        import metrics
+        monkeypatch.setattr(metrics, "_store", None)
+        (tmp_path / "99.json").write_text('{"histograms": {}, "callbacks": {}}')
+        conf = load_conf(monkeypatch, 1, METRICS_MULTIPROC_DIR=str(tmp_path))
+        store = conf["metrics_store"]
+        
+        conf["on_starting"](None)
+        assert not (tmp_path / "99.json").exists()
+        
+        with patch.object(store, "start") as mock_start:
+            conf["post_fork"](None, None)
+        mock_start.assert_called_once()
+        
+        with patch.object(store, "retire") as mock_retire:
+            conf["child_exit"](None, SimpleNamespace(pid=1234))
+        mock_retire.assert_called_once_with(1234)
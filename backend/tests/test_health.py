@@ -0,0 +1,122 @@
+# test_health.py - Pruebas para las sondas de salud y disponibilidad
+import pytest
+from unittest.mock import patch
+
+import health
+from config import get_config
+from db import PoolUsageListener
+
+@pytest.fixture
+def health_app(app, mock_db, monkeypatch):
+    """Aplicación de pruebas con /healthz y /readyz"""
+    monkeypatch.setenv("HEALTH_CACHE_SECONDS", "60")
+    mock_db.pool_usage.return_value = {"in_use": 3, "max_size": 100}
+    mock_db.diff_indexes.return_value = {
+        "users": {"missing": [], "mismatched": [], "extra": []},
+        "dates": {"missing": [], "mismatched": [], "extra": []}
+    }
+    app.probe = health.init_app(app)
+    return app
+
+class TestHealthEndpoints:
+    """Pruebas para /healthz y /readyz"""
+    
+    def test_healthz_does_not_touch_database(self, health_app, mock_db):
+        """Test que /healthz responde sin consultar MongoDB"""
+        response = health_app.test_client().get('/healthz')
+        
+        assert response.status_code == 200
+        assert response.get_json() == {"status": "ok"}
+        mock_db.client.admin.command.assert_not_called()
+    
+    def test_readyz_ready(self, health_app, mock_db):
+        """Test sonda lista con MongoDB, pool e índices correctos"""
+        response = health_app.test_client().get('/readyz')
+        data = response.get_json()
+        
+        assert response.status_code == 200
+        assert data["status"] == "ready"
+        assert data["checks"]["mongo"] == {"ok": True}
+        assert data["checks"]["mongo_pool"] == {"in_use": 3, "max_size": 100, "ok": True}
+        mock_db.client.admin.command.assert_called_once_with("ping")
+    
+    def test_readyz_result_is_cached(self, health_app, mock_db):
+        """Test que sondas seguidas reutilizan el resultado"""
+        client = health_app.test_client()
+        for _ in range(5):
+            assert client.get('/readyz').status_code == 200
+        
+        assert mock_db.client.admin.command.call_count == 1
+    
+    def test_readyz_mongo_down(self, health_app, mock_db):
+        """Test sonda no disponible cuando MongoDB no responde"""
+        from pymongo.errors import ServerSelectionTimeoutError
+        mock_db.client.admin.command.side_effect = ServerSelectionTimeoutError("sin servidor")
+        
+        response = health_app.test_client().get('/readyz')
+        data = response.get_json()
+        
+        assert response.status_code == 503
+        assert data["checks"]["mongo"] == {"ok": False, "error": "ServerSelectionTimeoutError"}
+    
+    def test_readyz_saturated_pool(self, health_app, mock_db):
+        """Test sonda no disponible con el pool de conexiones agotado"""
+        mock_db.pool_usage.return_value = {"in_use": 100, "max_size": 100}
+        
+        response = health_app.test_client().get('/readyz')
+        
+        assert response.status_code == 503
+        assert response.get_json()["checks"]["mongo_pool"]["ok"] is False
+    
+    def test_readyz_saturated_password_pool(self, health_app):
+        """Test sonda no disponible con la cola de contraseñas llena"""
+        with patch("health.pool_stats", return_value={"pending": 16, "max_pending": 16}):
+            response = health_app.test_client().get('/readyz')
+        
+        assert response.status_code == 503
+        assert response.get_json()["checks"]["password_pool"] == {"pending": 16, "max_pending": 16, "ok": False}
+    
+    def test_missing_indexes_until_created(self, health_app, mock_db):
+        """Test índices faltantes y que una vez creados no se vuelven a listar"""
+        mock_db.diff_indexes.return_value = {"dates": {"missing": ["active_slot_unique"], "mismatched": [], "extra": []}}
+        probe = health_app.probe
+        
+        ready, checks = probe._run_checks()
+        assert ready is False
+        assert checks["indexes"] == {"ok": False, "missing": {"dates": ["active_slot_unique"]}}
+        
+        mock_db.diff_indexes.return_value = {"dates": {"missing": [], "mismatched": [], "extra": []}}
+        assert probe._run_checks()[0] is True
+        assert probe._run_checks()[0] is True
+        assert mock_db.diff_indexes.call_count == 2
+
+    def test_mismatched_slot_index(self, health_app, mock_db):
+        """Test sonda no disponible si el índice de horarios tiene otra definición"""
+        mock_db.diff_indexes.return_value = {"dates": {"missing": [], "mismatched": ["active_slot_unique"], "extra": []}}
+        
+        ready, checks = health_app.probe._run_checks()
+        
+        assert ready is False
+        assert checks["indexes"]["mismatched"] == {"dates": ["active_slot_unique"]}
+
+class TestPoolUsageListener:
+    """Pruebas para PoolUsageListener"""
+    
+    def test_counts_checked_out_connections(self):
+        """Test conteo de conexiones en uso"""
+        listener = PoolUsageListener()
+        
+        listener.connection_checked_out(None)
+        listener.connection_checked_out(None)
+        listener.connection_checked_in(None)
+        
+        assert listener.checked_out == 1
+    
+    def test_health_config_defaults(self, monkeypatch):
+        """Test valores por defecto de la sonda"""
+        monkeypatch.delenv("HEALTH_CACHE_SECONDS", raising=False)
+        monkeypatch.delenv("HEALTH_PING_TIMEOUT_MS", raising=False)
+        config = get_config()
+        
+        assert config["HEALTH_CACHE_SECONDS"] == 2.0
+        assert config["HEALTH_PING_TIMEOUT_MS"] == 1000
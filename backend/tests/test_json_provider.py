@@ -0,0 +1,56 @@
+# test_json_provider.py - Pruebas para la serialización JSON
+import pytest
+import json
+from datetime import datetime
+from bson.objectid import ObjectId
+from flask import Flask, jsonify
+from unittest.mock import patch
+
+import json_provider
+from json_provider import MongoJSONProvider
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def json_app(request):
+    """Aplicación con el proveedor JSON, con y sin orjson"""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        backend = json_provider.orjson
+    else:
+        backend = None
+    
+    with patch.object(json_provider, "orjson", backend):
+        app = Flask(__name__)
+        app.json = MongoJSONProvider(app)
+        yield app
+
+class TestMongoJSONProvider:
+    """Pruebas para MongoJSONProvider"""
+    
+    def test_serializes_mongo_types(self, json_app):
+        """Test serialización de ObjectId y datetime"""
+        object_id = ObjectId()
+        created_at = datetime(2024, 12, 25, 14, 30)
+        
+        with json_app.app_context():
+            response = jsonify({"_id": object_id, "created_at": created_at, "title": "Revisión"})
+        
+        data = json.loads(response.data)
+        assert response.mimetype == "application/json"
+        assert data == {
+            "_id": str(object_id),
+            "created_at": "2024-12-25T14:30:00",
+            "title": "Revisión"
+        }
+    
+    def test_dumps_and_loads_round_trip(self, json_app):
+        """Test ida y vuelta con dumps/loads"""
+        payload = {"ids": [ObjectId("507f1f77bcf86cd799439011")], "n": 1}
+        
+        text = json_app.json.dumps(payload)
+        
+        assert json_app.json.loads(text) == {"ids": ["507f1f77bcf86cd799439011"], "n": 1}
+    
+    def test_unknown_type_raises(self, json_app):
+        """Test que los tipos desconocidos siguen fallando"""
+        with pytest.raises(TypeError):
+            json_app.json.dumps({"value": object()})
@@ -0,0 +1,78 @@
+# test_logging.py - Pruebas para el registro estructurado
+import pytest
+import json
+import logging
+import queue
+
+from config import JsonFormatter, RequestIdFilter, SamplingFilter, DeferredQueueHandler, request_id_var
+from utils import register_request_id
+
+def make_record(level=logging.INFO, msg="Cita con ID %s cancelada", args=("abc",)):
+    """Crear un registro de log de prueba"""
+    return logging.LogRecord("routes.dates", level, __file__, 1, msg, args, None)
+
+class TestLoggingPipeline:
+    """Pruebas para los componentes del registro"""
+    
+    def test_json_formatter(self):
+        """Test una línea JSON con el id de la petición"""
+        record = make_record()
+        token = request_id_var.set("req-123")
+        try:
+            RequestIdFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+        
+        entry = json.loads(JsonFormatter().format(record))
+        
+        assert entry["message"] == "Cita con ID abc cancelada"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "routes.dates"
+        assert entry["request_id"] == "req-123"
+    
+    def test_sampling_keeps_warnings(self):
+        """Test que el muestreo descarta INFO pero nunca advertencias"""
+        sampling = SamplingFilter(0)
+        
+        assert sampling.filter(make_record(logging.INFO)) is False
+        assert sampling.filter(make_record(logging.WARNING)) is True
+    
+    def test_queue_handler_defers_formatting(self):
+        """Test que el mensaje no se formatea en el hilo de la petición"""
+        log_queue = queue.SimpleQueue()
+        handler = DeferredQueueHandler(log_queue)
+        record = make_record()
+        
+        handler.handle(record)
+        
+        queued = log_queue.get_nowait()
+        assert queued is record
+        assert queued.msg == "Cita con ID %s cancelada"
+        assert queued.args == ("abc",)
+
+class TestRequestId:
+    """Pruebas para el encabezado X-Request-ID"""
+    
+    @pytest.fixture
+    def request_id_client(self, app):
+        register_request_id(app)
+        return app.test_client()
+    
+    def test_generates_request_id(self, request_id_client, auth_headers):
+        """Test id generado cuando el cliente no envía uno"""
+        response = request_id_client.get('/users/me', headers=auth_headers)
+        
+        assert len(response.headers["X-Request-ID"]) == 32
+        assert request_id_var.get() == "-"
+    
+    def test_keeps_valid_request_id(self, request_id_client, auth_headers):
+        """Test id del cliente conservado si es válido"""
+        response = request_id_client.get('/users/me', headers={**auth_headers, "X-Request-ID": "abc-123"})
+        
+        assert response.headers["X-Request-ID"] == "abc-123"
+    
+    def test_replaces_unsafe_request_id(self, request_id_client, auth_headers):
+        """Test id del cliente reemplazado si contiene caracteres no válidos"""
+        response = request_id_client.get('/users/me', headers={**auth_headers, "X-Request-ID": "a b\\nc"})
+        
+        assert response.headers["X-Request-ID"] != "a b\\nc"
@@ -0,0 +1,157 @@
+# test_metrics.py - Pruebas para las métricas de latencia
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import metrics
+from metrics import CallbackMetric, Histogram, MongoCommandListener, MultiprocessStore, REQUEST_LATENCY, MONGO_COMMAND_LATENCY
+
+@pytest.fixture
+def metrics_app(app):
+    """Aplicación de pruebas con las métricas activadas"""
+    REQUEST_LATENCY.clear()
+    MONGO_COMMAND_LATENCY.clear()
+    metrics.init_app(app)
+    return app
+
+def command_event(request_id, command_name, command=None, duration_micros=None):
+    """Evento de comando de pymongo simulado"""
+    return SimpleNamespace(
+        request_id=request_id,
+        connection_id=("localhost", 27017),
+        command_name=command_name,
+        command=command or {},
+        database_name="dentixpro",
+        duration_micros=duration_micros
+    )
+
+class TestHistogram:
+    """Pruebas para Histogram"""
+    
+    def test_collect_cumulative_buckets(self):
+        """Test buckets acumulados, suma y cuenta"""
+        histogram = Histogram("test_latency_seconds", "Latencia de prueba", ["route"], buckets=(0.1, 1.0))
+        metrics.REGISTRY.remove(histogram)
+        
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(3.0, "/a")
+        
+        lines = histogram.collect()
+        
+        assert lines[:2] == ["# HELP test_latency_seconds Latencia de prueba", "# TYPE test_latency_seconds histogram"]
+        assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'test_latency_seconds_sum{route="/a"} 3.55' in lines
+        assert 'test_latency_seconds_count{route="/a"} 3' in lines
+    
+    def test_escapes_label_values(self):
+        """Test escape de comillas en las etiquetas"""
+        histogram = Histogram("test_escape_seconds", "Escape", ["route"], buckets=(1.0,))
+        metrics.REGISTRY.remove(histogram)
+        
+        histogram.observe(0.5, 'a"b')
+        
+        assert 'test_escape_seconds_count{route="a\\"b"} 1' in histogram.collect()
+
+class TestMongoCommandListener:
+    """Pruebas para MongoCommandListener"""
+    
+    def test_records_command_by_collection(self):
+        """Test duración registrada por colección y comando"""
+        MONGO_COMMAND_LATENCY.clear()
+        listener = MongoCommandListener()
+        
+        listener.started(command_event(1, "find", {"find": "dates", "filter": {}}))
+        listener.succeeded(command_event(1, "find", duration_micros=2500))
+        listener.started(command_event(2, "ping", {"ping": 1}))
+        listener.failed(command_event(2, "ping", duration_micros=100))
+        
+        text = metrics.render()
+        
+        assert 'dentixpro_mongo_command_duration_seconds_count{collection="dates",command="find",outcome="success"} 1' in text
+        assert 'dentixpro_mongo_command_duration_seconds_sum{collection="dates",command="find",outcome="success"} 0.0025' in text
+        assert 'dentixpro_mongo_command_duration_seconds_count{collection="dentixpro",command="ping",outcome="failure"} 1' in text
+        assert listener._inflight == {}
+
+class TestMultiprocessStore:
+    """Pruebas para MultiprocessStore"""
+    
+    def test_merges_workers_and_keeps_retired_totals(self, tmp_path):
+        """Test suma de histogramas entre workers, también tras la salida de uno"""
+        store = MultiprocessStore(str(tmp_path), 5)
+        store.clear()
+        REQUEST_LATENCY.clear()
+        gauge = CallbackMetric("test_workers", "Workers de prueba", "gauge", ["state"], lambda: {("up",): 1})
+        
+        # Otro worker guarda sus métricas
+        REQUEST_LATENCY.observe(0.01, "GET", "/api/dates", "200")
+        with patch("metrics.os.getpid", return_value=111):
+            store.flush()
+        REQUEST_LATENCY.clear()
+        
+        REQUEST_LATENCY.observe(0.02, "GET", "/api/dates", "200")
+        text = store.render()
+        
+        assert 'dentixpro_http_request_duration_seconds_count{method="GET",endpoint="/api/dates",status="200"} 2' in text
+        assert 'test_workers{state="up",pid="111"} 1' in text
+        
+        store.retire(111)
+        text = store.render()
+        metrics.REGISTRY.remove(gauge)
+        REQUEST_LATENCY.clear()
+        
+        assert not (tmp_path / "111.json").exists()
+        assert 'dentixpro_http_request_duration_seconds_count{method="GET",endpoint="/api/dates",status="200"} 2' in text
+        assert 'pid="111"' not in text
+
+class TestMetricsEndpoint:
+    """Pruebas para el endpoint /metrics"""
+    
+    def test_records_request_latency_by_route(self, metrics_app, auth_headers):
+        """Test latencia registrada con la plantilla de la ruta"""
+        client = metrics_app.test_client()
+        client.get('/users/me', headers=auth_headers)
+        client.delete('/dates/invalid-id', headers=auth_headers)
+        
+        response = client.get('/metrics')
+        text = response.get_data(as_text=True)
+        
+        assert response.status_code == 200
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        assert 'dentixpro_http_request_duration_seconds_count{method="GET",endpoint="/users/me",status="200"} 1' in text
+        assert 'dentixpro_http_request_duration_seconds_count{method="DELETE",endpoint="/dates/<id>",status="400"} 1' in text
+        assert "# TYPE dentixpro_password_hash_queue gauge" in text
+    
+    def test_client_options_register_listener(self, monkeypatch):
+        """Test que el cliente de MongoDB registra el listener según la configuración"""
+        from db import Database
+        from config import get_config
+        
+        monkeypatch.setenv("METRICS_ENABLED", "True")
+        listeners = Database.client_options(get_config())["event_listeners"]
+        assert isinstance(listeners[0], MongoCommandListener)
+        
+        monkeypatch.setenv("METRICS_ENABLED", "False")
+        assert "event_listeners" not in Database.client_options(get_config())
+    
+    def test_token_required_when_configured(self, app, monkeypatch):
+        """Test /metrics protegido con token"""
+        monkeypatch.setenv("METRICS_TOKEN", "secreto")
+        metrics.init_app(app)
+        client = app.test_client()
+        
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={"Authorization": "Bearer otro"}).status_code == 401
+        assert client.get('/metrics', headers={"Authorization": "Bearer secreto"}).status_code == 200
+    
+    def test_allowed_ips(self, app, monkeypatch):
+        """Test /metrics limitado a direcciones permitidas"""
+        monkeypatch.setenv("METRICS_ALLOWED_IPS", "10.0.0.0/8, 127.0.0.1")
+        metrics.init_app(app)
+        client = app.test_client()
+        
+        assert client.get('/metrics').status_code == 200
+        assert client.get('/metrics', environ_base={"REMOTE_ADDR": "10.1.2.3"}).status_code == 200
+        assert client.get('/metrics', environ_base={"REMOTE_ADDR": "192.168.1.5"}).status_code == 403
@@ -0,0 +1,149 @@
+# test_passwords.py - Pruebas para el pool de hash de contraseñas
+import pytest
+import asyncio
+import os
+from unittest.mock import patch
+
+from config import get_config
+from passwords import PasswordHasher, HasherBusyError, normalize_method
+from werkzeug.security import generate_password_hash, check_password_hash
+
+def make_hasher(**overrides):
+    """Crear un PasswordHasher con la configuración indicada"""
+    config = {**get_config(), "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000", **overrides}
+    return PasswordHasher(config)
+
+class TestPasswordHasher:
+    """Pruebas para PasswordHasher"""
+    
+    def test_inline_hash_and_check(self):
+        """Test hash en el hilo de la petición con tamaño de pool 0"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=0)
+        
+        pwhash = hasher.hash("password123")
+        
+        assert hasher.executor is None
+        assert pwhash.startswith("pbkdf2:sha256:1000$")
+        assert hasher.check(pwhash, "password123") is True
+        assert hasher.check(pwhash, "wrongpassword") is False
+    
+    def test_pool_hash_and_check(self):
+        """Test hash en el pool de procesos, síncrono y asíncrono"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=1)
+        try:
+            pwhash = hasher.hash("password123")
+            
+            assert hasher.check(pwhash, "password123") is True
+            assert asyncio.run(hasher.check_async(pwhash, "wrongpassword")) is False
+            assert hasher.stats()["completed"] == 3
+            assert hasher.stats()["pending"] == 0
+        finally:
+            hasher.close()
+    
+    def test_rejects_when_queue_is_full(self):
+        """Test backpressure cuando la cola está llena"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=1, PASSWORD_POOL_MAX_PENDING=1)
+        try:
+            hasher.pending = 1
+            
+            with pytest.raises(HasherBusyError):
+                hasher.hash("password123")
+            
+            assert hasher.stats()["rejected"] == 1
+        finally:
+            hasher.close()
+    
+    def test_timeout_raises_busy(self):
+        """Test que un resultado que no llega a tiempo se trata como saturación"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=1)
+        try:
+            with patch.object(hasher, "submit") as submit:
+                submit.return_value.result.side_effect = TimeoutError
+                
+                with pytest.raises(HasherBusyError):
+                    hasher.check("hash", "password123")
+        finally:
+            hasher.close()
+    
+    def test_recovers_from_dead_worker(self):
+        """Test que el pool se recrea cuando muere un proceso hijo"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=1)
+        try:
+            broken = hasher.executor
+            with pytest.raises(HasherBusyError):
+                hasher.run(os._exit, 1)
+            
+            assert hasher.executor is not broken
+            assert hasher.check(hasher.hash("password123"), "password123") is True
+            assert hasher.stats()["pending"] == 0
+        finally:
+            hasher.close()
+
+class TestHashUpgrade:
+    """Pruebas para la actualización transparente de hashes"""
+    
+    def test_normalize_method(self):
+        """Test métodos completados con los valores por defecto de werkzeug"""
+        assert normalize_method("scrypt") == "scrypt:32768:8:1"
+        assert normalize_method("scrypt:65536") == "scrypt:65536:8:1"
+        assert normalize_method("pbkdf2:sha256:600000") == "pbkdf2:sha256:600000"
+    
+    def test_needs_rehash(self):
+        """Test detección de hashes con otro método o coste"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=0, PASSWORD_HASH_METHOD="scrypt")
+        
+        assert hasher.needs_rehash(generate_password_hash("password123")) is False
+        assert hasher.needs_rehash(generate_password_hash("password123", "pbkdf2:sha256:1000")) is True
+        assert hasher.needs_rehash(generate_password_hash("password123", "scrypt:16384:8:1")) is True
+    
+    def test_login_upgrades_outdated_hash(self, client, test_user, mock_db):
+        """Test que el login reescribe en segundo plano un hash antiguo"""
+        users_collection = mock_db.get_collection('users')
+        old_hash = generate_password_hash("testpassword123", "pbkdf2:sha256:1000")
+        users_collection.update_one({"userId": test_user["userId"]}, {"$set": {"password": old_hash}})
+        
+        response = client.post('/auth/login', json={
+            "email": "test@example.com",
+            "password": "testpassword123"
+        })
+        
+        # Esperar a que termine la actualización en segundo plano
+        PasswordHasher.get_instance()._background.submit(lambda: None).result()
+        
+        assert response.status_code == 200
+        new_hash = users_collection.find_one({"userId": test_user["userId"]})["password"]
+        assert new_hash.startswith(PasswordHasher.get_instance().target_method + "$")
+        assert check_password_hash(new_hash, "testpassword123")
+    
+    def test_upgrade_skipped_when_pool_busy(self):
+        """Test que la actualización cede el paso a las peticiones en curso"""
+        hasher = make_hasher(PASSWORD_POOL_SIZE=0, PASSWORD_POOL_MAX_PENDING=4)
+        hasher.pending = 2
+        
+        assert hasher.hash_in_background("password123", lambda new_hash: None) is False
+        assert hasher.stats()["upgrades_pending"] == 0
+
+class TestHasherBusyResponses:
+    """Pruebas de respuestas 503 cuando el pool está saturado"""
+    
+    def test_login_busy(self, client, test_user):
+        """Test login con el pool saturado"""
+        with patch('routes.auth.verify_password', side_effect=HasherBusyError):
+            response = client.post('/auth/login', json={
+                "email": "test@example.com",
+                "password": "testpassword123"
+            })
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    
+    def test_reset_password_busy(self, client, admin_headers, test_user, mock_db):
+        """Test reseteo de contraseña con el pool saturado"""
+        with patch('routes.users.hash_password', side_effect=HasherBusyError):
+            response = client.put(f'/users/{test_user["userId"]}/reset-password', headers=admin_headers, json={
+                "new_password": "newpassword123"
+            })
+        
+        assert response.status_code == 503
+        user = mock_db.get_collection('users').find_one({"userId": test_user["userId"]})
+        assert user["password"] == test_user["password"]
@@ -0,0 +1,99 @@
+# test_seed.py - Pruebas para el generador de datos sintéticos
+import datetime
+import random
+import pytest
+
+from benchmarks.seed import (
+    generate_day, generate_users, insert_in_batches, open_slot_weights, plan_days, seed_appointments, main
+)
+from db import Database
+
+class TestSeedGenerator:
+    """Pruebas para benchmarks/seed.py"""
+    
+    def test_users_match_signup_shape(self):
+        """Test que los usuarios tienen la forma creada por signup"""
+        users = generate_users(5, 1, "hash", random.Random(1), datetime.datetime.now())
+        
+        assert set(users[0]) == {"userId", "name", "email", "password", "rol", "token_version", "created_at"}
+        assert [user["rol"] for user in users] == ["admin", "user", "user", "user", "user"]
+        assert len({user["email"] for user in users}) == 5
+        assert all(user["password"] == "hash" and user["token_version"] == 0 for user in users)
+    
+    def test_slots_inside_clinic_hours(self):
+        """Test que los horarios generados están dentro del horario de atención"""
+        slots, weights = open_slot_weights("08:00-12:00,14:00-18:00", 15)
+        
+        assert len(slots) == len(weights) == 32
+        assert slots[0] == 8 * 60
+        assert 12 * 60 not in slots
+        assert slots[-1] == 17 * 60 + 45
+    
+    def test_plan_respects_capacity(self):
+        """Test reparto por día sin superar la capacidad ni abrir domingos"""
+        start = datetime.date(2024, 1, 1)  # Lunes
+        plan, planned = plan_days(100, start, 14, 10)
+        
+        assert planned == 100
+        assert all(count <= 10 for _, count in plan)
+        assert plan[6][1] == 0 and plan[13][1] == 0
+    
+    def test_day_has_unique_slots_and_status_mix(self):
+        """Test que no se repiten horarios y el estado depende de si la cita ya pasó"""
+        slots, weights = open_slot_weights("08:00-12:00,14:00-18:00", 5)
+        today = datetime.date(2024, 6, 1)
+        rng = random.Random(7)
+        
+        past = generate_day(datetime.date(2024, 5, 1), 90, ["u1", "u2"], slots, weights, today, rng)
+        future = generate_day(datetime.date(2024, 7, 1), 90, ["u1", "u2"], slots, weights, today, rng)
+        
+        assert len({appointment["time"] for appointment in past}) == 90
+        assert {"userId", "title", "date", "time", "description", "status", "created_at"} <= set(past[0])
+        assert all(appointment["date"] == "2024-05-01" for appointment in past)
+        assert {appointment["status"] for appointment in future} <= {"pending", "cancelled"}
+        assert "completed" in {appointment["status"] for appointment in past}
+        for appointment in past + future:
+            if appointment["status"] == "completed":
+                assert "completed_at" in appointment
+            if appointment["status"] == "cancelled":
+                assert appointment["cancelled_at"] >= appointment["created_at"]
+    
+    def test_seed_appointments_in_process(self, mock_db):
+        """Test inserción en lotes sin procesos auxiliares"""
+        result = seed_appointments(500, ["u1", "u2", "u3"], days_ahead=10, batch_size=64, workers=0, seed=3)
+        dates = list(Database.get_instance().get_collection("dates").find())
+        
+        assert result["inserted"] == result["planned"] == len(dates) == 500
+        assert result["failed"] == 0
+        assert result["to"] == (datetime.date.today() + datetime.timedelta(days=10)).isoformat()
+        active = {(d["date"], d["time"]) for d in dates if d["status"] != "cancelled"}
+        assert len(active) == sum(1 for d in dates if d["status"] != "cancelled")
+    
+    def test_main_creates_users_and_dates(self, mock_db):
+        """Test de la línea de comandos completa"""
+        assert main(["--users", "20", "--dates", "200", "--workers", "0", "--seed", "1", "--drop"]) == 0
+        
+        db = Database.get_instance()
+        assert db.get_collection("users").count_documents({}) == 20
+        assert db.get_collection("dates").count_documents({}) == 200
+    
+    def test_insert_reports_failed_indexes(self, mock_db):
+        """Test posiciones de los documentos rechazados en todos los lotes"""
+        users = Database.get_instance().get_collection("users")
+        users.create_index("email", unique=True)
+        users.insert_many([{"email": "b"}, {"email": "e"}])
+        
+        documents = [{"email": email} for email in "abcdef"]
+        assert insert_in_batches(users, documents, 2) == (4, [1, 4])
+    
+    def test_second_run_without_drop_books_no_missing_users(self, mock_db):
+        """Test que una segunda ejecución sin --drop no crea citas de usuarios inexistentes"""
+        db = Database.get_instance()
+        db.get_collection("users").create_index("email", unique=True)
+        args = ["--users", "10", "--dates", "50", "--workers", "0", "--seed", "1"]
+        assert main(args) == 0
+        
+        assert main(args) == 1
+        user_ids = {user["userId"] for user in db.get_collection("users").find()}
+        assert db.get_collection("dates").count_documents({}) == 50
+        assert set(db.get_collection("dates").distinct("userId")) <= user_ids
@@ -1,6 +1,7 @@
 # test_users.py - Pruebas unitarias para endpoints de usuarios
 import pytest
 import json
+from datetime import datetime, timedelta
 from http import HTTPStatus
 from unittest.mock import patch
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -203,6 +204,42 @@ class TestUserEndpoints:
         data = json.loads(response.data)
         assert 'data' in data
 
+    def test_get_user_dates_cursor_pagination(self, client, user_token, test_user, mock_db):
+        """Test para recorrer las citas del usuario con paginación por cursor"""
+        dates_collection = mock_db.get_collection("dates")
+        dates_collection.insert_many([
+            {"userId": test_user['userId'], "date": f"2024-12-0{day}", "time": "10:00", "status": "pending"}
+            for day in range(1, 6)
+        ])
+        
+        headers = {'Authorization': f'Bearer {user_token}'}
+        response = client.get('/users/me/dates?page_size=2&with_total=false', headers=headers)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [d['date'] for d in data['data']] == ["2024-12-01", "2024-12-02"]
+        assert data['pagination']['has_more'] is True
+        assert 'total_items' not in data['pagination']
+        
+        seen = [d['date'] for d in data['data']]
+        cursor = data['pagination']['next_cursor']
+        while cursor:
+            response = client.get(f'/users/me/dates?page_size=2&after={cursor}', headers=headers)
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            seen.extend(d['date'] for d in data['data'])
+            cursor = data['pagination']['next_cursor']
+        
+        assert seen == [f"2024-12-0{day}" for day in range(1, 6)]
+        assert data['pagination']['total_items'] == 5
+    
+    def test_get_user_dates_invalid_cursor(self, client, user_token):
+        """Test para obtener citas del usuario con un cursor inválido"""
+        headers = {'Authorization': f'Bearer {user_token}'}
+        response = client.get('/users/me/dates?after=not-a-cursor', headers=headers)
+        
+        assert response.status_code == 400
+
 
 class TestAdminUserEndpoints:
     """Pruebas para endpoints administrativos de usuarios"""
@@ -441,6 +478,21 @@ class TestAdminUserEndpoints:
         
         assert response.status_code == 403
 
+    def test_get_all_users_never_loads_password(self, client, admin_headers, test_user, mock_db):
+        """Test que el listado de usuarios no lee los hashes de contraseña"""
+        users_collection = mock_db.get_collection('users')
+        
+        with patch.object(users_collection, 'find', wraps=users_collection.find) as find:
+            response = client.get('/users?page=1&page_size=10', headers=admin_headers)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['data']) == 2
+        assert all('password' not in user for user in data['data'])
+        projection = find.call_args.args[1]
+        assert 'password' not in projection
+        assert projection['name'] == 1
+
 
 class TestUserEndpointsIntegration:
     """Pruebas de integración para endpoints de usuarios"""
@@ -478,4 +530,63 @@ class TestUserEndpointsIntegration:
     #     response = client.get('/users/me/dates', headers=headers)
         
     #     assert response.status_code == 200
-    #     mock_paginate.assert_called_once()
\ No newline at end of file
+    #     mock_paginate.assert_called_once()
+
+class TestUserETags:
+    """Pruebas para las respuestas condicionales con ETag"""
+    
+    def test_me_not_modified(self, client, auth_headers):
+        """Test 304 al repetir /me con el mismo ETag"""
+        response = client.get('/users/me', headers=auth_headers)
+        etag = response.headers['ETag']
+        
+        assert response.status_code == 200
+        assert etag.startswith('W/"507f1f77bcf86cd799439011-0-')
+        assert response.headers['Cache-Control'] == "private, no-cache"
+        
+        response = client.get('/users/me', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b""
+        assert response.headers['ETag'] == etag
+    
+    def test_etag_changes_after_update(self, client, auth_headers):
+        """Test que actualizar el perfil invalida el ETag"""
+        etag = client.get('/users/me', headers=auth_headers).headers['ETag']
+        
+        client.put('/users/me', json={"name": "Nombre Nuevo"}, headers=auth_headers)
+        response = client.get('/users/me', headers={**auth_headers, 'If-None-Match': etag})
+        
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert json.loads(response.data)['name'] == "Nombre Nuevo"
+    
+    def test_dates_etag_depends_on_query(self, client, auth_headers):
+        """Test que cada página tiene su propio ETag"""
+        first = client.get('/users/me/dates?page=1', headers=auth_headers).headers['ETag']
+        second = client.get('/users/me/dates?page=2', headers=auth_headers).headers['ETag']
+        
+        assert first != second
+        response = client.get('/users/me/dates?page=1', headers={**auth_headers, 'If-None-Match': first})
+        assert response.status_code == 304
+    
+    def test_dates_etag_changes_after_date_writes(self, client, auth_headers, admin_headers, mock_db):
+        """Test que crear o cancelar citas (también como admin) invalida el ETag"""
+        future_date = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+        etag = client.get('/users/me/dates', headers=auth_headers).headers['ETag']
+        
+        response = client.post('/dates', headers=auth_headers, json={
+            "title": "Limpieza dental",
+            "date": future_date,
+            "time": "10:00",
+            "description": "Limpieza semestral"
+        })
+        assert response.status_code == 201
+        response = client.get('/users/me/dates', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        
+        date_id = mock_db.get_collection('dates').find_one({"date": future_date})['_id']
+        client.put(f'/admin/dates/{date_id}/cancel', headers=admin_headers)
+        response = client.get('/users/me/dates', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['data'][0]['status'] == "cancelled"
@@ -0,0 +1,73 @@
+# test_utils.py - Pruebas unitarias para utilidades compartidas
+import pytest
+import json
+from unittest.mock import patch
+
+from utils import TTLCache, get_cached_user, user_cache
+
+class TestTTLCache:
+    """Pruebas para la caché LRU con expiración"""
+    
+    def test_get_and_set(self):
+        """Test guardar y recuperar un valor"""
+        cache = TTLCache(maxsize=2, ttl=30)
+        cache.set("a", 1)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+    
+    def test_evicts_least_recently_used(self):
+        """Test que se descarta la entrada menos usada al llenarse"""
+        cache = TTLCache(maxsize=2, ttl=30)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+    
+    def test_expires_entries(self):
+        """Test que las entradas expiran después del TTL"""
+        cache = TTLCache(maxsize=2, ttl=30)
+        with patch("utils.time.monotonic", return_value=100):
+            cache.set("a", 1)
+        with patch("utils.time.monotonic", return_value=131):
+            assert cache.get("a") is None
+    
+    def test_zero_ttl_disables_cache(self):
+        """Test que un TTL de 0 desactiva la caché"""
+        cache = TTLCache(maxsize=2, ttl=0)
+        cache.set("a", 1)
+        
+        assert cache.get("a") is None
+
+class TestCachedUser:
+    """Pruebas para la consulta de usuarios con caché"""
+    
+    def test_get_cached_user_hits_database_once(self, mock_db, test_user):
+        """Test que la segunda consulta se responde desde la caché"""
+        users_collection = mock_db.get_collection("users")
+        
+        with patch.object(users_collection, "find_one", wraps=users_collection.find_one) as find_one:
+            first = get_cached_user(test_user["userId"])
+            second = get_cached_user(test_user["userId"])
+        
+        assert find_one.call_count == 1
+        assert first == second
+        assert "password" not in first
+    
+    def test_update_current_user_invalidates_cache(self, client, user_token, test_user):
+        """Test que actualizar el usuario invalida la caché"""
+        headers = {'Authorization': f'Bearer {user_token}'}
+        get_cached_user(test_user["userId"])
+        
+        response = client.put('/users/me',
+                            data=json.dumps({'name': 'Nombre Nuevo'}),
+                            content_type='application/json',
+                            headers=headers)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['user']['name'] == 'Nombre Nuevo'
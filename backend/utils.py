@@ -1,29 +1,222 @@
 # utils.py - Utility functions and middleware
 from functools import wraps
-from flask import request, jsonify
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from collections import OrderedDict
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from flask import g, request, jsonify, current_app, make_response
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
 from http import HTTPStatus
+from bson.objectid import ObjectId
 from db import Database
+from config import get_config, request_id_var, REQUEST_ID_PATTERN
+
+# Answer to requests the password hashing pool can't take right now
+SERVER_BUSY_MSG = "Servidor ocupado, intente de nuevo en unos segundos"
+
+# Fields kept in the user cache (never the password hash)
+USER_CACHE_FIELDS = {"_id": 0, "userId": 1, "name": 1, "email": 1, "rol": 1, "token_version": 1}
+
+# Fields returned by user endpoints
+USER_PUBLIC_FIELDS = {"userId": 1, "name": 1, "email": 1, "rol": 1, "created_at": 1}
+
+# Fields returned by appointment endpoints
+DATE_FIELDS = {
+    "userId": 1, "title": 1, "date": 1, "time": 1, "description": 1, "status": 1,
+    "created_at": 1, "updated_at": 1, "completed_at": 1, "cancelled_at": 1
+}
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds"""
+    
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full"""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+_config = get_config()
+user_cache = TTLCache(maxsize=_config["USER_CACHE_SIZE"], ttl=_config["USER_CACHE_TTL"])
+
+def get_cached_user(user_id):
+    """Get a user (without password) through the in-process cache"""
+    user = user_cache.get(user_id)
+    if user is None:
+        db_instance = Database.get_instance()
+        users_collection = db_instance.get_collection("users")
+        user = users_collection.find_one({"userId": user_id}, USER_CACHE_FIELDS)
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id):
+    """Remove a user from the cache after it has been modified"""
+    user_cache.invalidate(user_id)
+
+def get_data_version(user_id):
+    """Read a user's change version (None if missing), refreshing the cached user"""
+    db_instance = Database.get_instance()
+    users_collection = db_instance.get_collection("users")
+    user = users_collection.find_one({"userId": user_id}, {**USER_CACHE_FIELDS, "data_version": 1})
+    if not user:
+        return None
+    
+    # The body of a 200 is built from the cache, so it must not be older than the version
+    version = user.pop("data_version", 0)
+    user_cache.set(user_id, user)
+    return version
+
+def bump_data_version(*user_ids):
+    """Change the version of users whose profile or appointments were written"""
+    db_instance = Database.get_instance()
+    users_collection = db_instance.get_collection("users")
+    users_collection.update_many({"userId": {"$in": list(user_ids)}}, {"$inc": {"data_version": 1}})
+
+def build_etag(user_id, version, path):
+    """ETag of one user's read (path and query string) at a change version"""
+    digest = hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
+    return f"{user_id}-{version}-{digest}"
+
+def create_user_token(user):
+    """Create an access token, embedding the role claim when enabled
+    
+    With ``JWT_ROLE_CLAIMS`` the token carries ``rol`` and ``ver`` (the
+    user's ``token_version``), so role checks need no user lookup. Bumping
+    ``token_version`` revokes every token minted before the change.
+    """
+    additional_claims = None
+    if current_app.config.get("JWT_ROLE_CLAIMS"):
+        additional_claims = {
+            "rol": user.get("rol"),
+            "ver": user.get("token_version", 0)
+        }
+    return create_access_token(identity=user["userId"], additional_claims=additional_claims)
+
+def get_current_role():
+    """Get the role of the current user, from the token when available"""
+    claims = get_jwt()
+    if current_app.config.get("JWT_ROLE_CLAIMS") and "ver" in claims:
+        return claims.get("rol")
+    
+    user = get_cached_user(get_jwt_identity())
+    return user.get("rol") if user else None
+
+def register_jwt_callbacks(jwt):
+    """Reject role tokens whose version no longer matches the user
+    
+    The version is read through the user cache, so this costs one users
+    read per user every USER_CACHE_TTL seconds (each request when the TTL
+    is 0), and a token revoked by another worker stays valid until that
+    worker's cached entry expires.
+    """
+    @jwt.token_in_blocklist_loader
+    def is_token_revoked(jwt_header, jwt_payload):
+        if "ver" not in jwt_payload:
+            return False
+        user = get_cached_user(jwt_payload["sub"])
+        return not user or user.get("token_version", 0) != jwt_payload["ver"]
+
+def register_request_id(app):
+    """Tag each request (and its log records) with an id, echoed in X-Request-ID"""
+    @app.before_request
+    def set_request_id():
+        # Keep the caller's id when it is safe to log, otherwise make one
+        request_id = request.headers.get("X-Request-ID", "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request_id_var.set(request_id)
+    
+    @app.after_request
+    def add_request_id_header(response):
+        response.headers["X-Request-ID"] = request_id_var.get()
+        return response
+    
+    @app.teardown_request
+    def clear_request_id(exc):
+        # Worker threads are reused; don't leak the id into unrelated logs
+        request_id_var.set("-")
+
+def hasher_busy_response(err):
+    """Error handler for HasherBusyError: 503 asking the client to retry shortly"""
+    return jsonify({"msg": SERVER_BUSY_MSG}), HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": "1"}
 
 def admin_required(fn):
     """Decorator to check if user has admin role"""
     @wraps(fn)
     def wrapper(*args, **kwargs):
         verify_jwt_in_request()
-        user_id = get_jwt_identity()
-        
-        # Get database instance
-        db_instance = Database.get_instance()
-        users_collection = db_instance.get_collection("users")
         
         # Check if user exists and has admin role
-        user = users_collection.find_one({"userId": user_id})
-        if not user or user.get("rol") != "admin":
+        if get_current_role() != "admin":
             return jsonify({"msg": "Acceso denegado: se requieren permisos de administrador"}), HTTPStatus.FORBIDDEN
         
         return fn(*args, **kwargs)
     return wrapper
 
+def etag_by_data_version(fn):
+    """Decorator answering 304 Not Modified while the user's data is unchanged
+    
+    Goes below jwt_required. The version is read before the handler runs, so
+    a write landing in between makes the next request miss instead of
+    serving stale data.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user_id = get_jwt_identity()
+        version = get_data_version(user_id)
+        if version is None:
+            return fn(*args, **kwargs)
+        
+        etag = build_etag(user_id, version, request.full_path)
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=HTTPStatus.NOT_MODIFIED)
+        else:
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code != HTTPStatus.OK:
+                return response
+        
+        response.set_etag(etag, weak=True)
+        # Browsers may keep the body but must revalidate it every time
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return wrapper
+
 def validate_request_json(required_fields):
     """Decorator to validate request JSON data"""
     def decorator(fn):
@@ -45,10 +238,7 @@ def validate_request_json(required_fields):
 
 def get_user_data(user_id):
     """Get user data from database (excluding sensitive info)"""
-    db_instance = Database.get_instance()
-    users_collection = db_instance.get_collection("users")
-    
-    user = users_collection.find_one({"userId": user_id})
+    user = get_cached_user(user_id)
     if user:
         return {
             "userId": user["userId"],
@@ -58,37 +248,106 @@ def get_user_data(user_id):
         }
     return None
 
-def paginate_results(collection, query, page=1, page_size=10, sort_by=None):
-    """Helper function to paginate query results"""
-    db_instance = Database.get_instance()
-    collection = db_instance.get_collection(collection)
+def encode_cursor(sort_value, object_id):
+    """Encode a sort key and _id into an opaque pagination token"""
+    payload = json.dumps([sort_value, str(object_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token):
+    """Decode a pagination token into its sort key and ObjectId"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_value, object_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return sort_value, ObjectId(object_id)
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+def build_page_query(query, sort_by=None, after=None, projection=None):
+    """Build the filter, sort and projection used to fetch one page
     
-    # Calculate skip value (for pagination)
-    skip = (page - 1) * page_size
+    Offset mode (page/page_size) is used unless an ``after`` token is given,
+    in which case results continue right after the document it points to
+    using a range query on the sort key plus ``_id`` (keyset pagination).
+    ``projection`` limits the returned fields; the sort field is always
+    fetched because the next cursor is built from it.
+    """
+    sort_field, sort_direction = sort_by if sort_by else ("_id", 1)
     
-    # Apply sorting if provided
-    cursor = collection.find(query)
-    if sort_by:
-        cursor = cursor.sort(sort_by[0], sort_by[1])
+    # Keyset mode: continue after the document encoded in the token
+    find_query = query
+    if after:
+        sort_value, last_id = decode_cursor(after)
+        operator = "$gt" if sort_direction == 1 else "$lt"
+        if sort_field == "_id":
+            keyset_query = {"_id": {operator: last_id}}
+        else:
+            keyset_query = {"$or": [
+                {sort_field: {operator: sort_value}},
+                {sort_field: sort_value, "_id": {operator: last_id}}
+            ]}
+        find_query = {"$and": [query, keyset_query]} if query else keyset_query
     
-    # Get total count (for pagination metadata)
-    total_count = collection.count_documents(query)
+    # Sort by the requested field with _id as a stable tie-breaker
+    sort_spec = [(sort_field, sort_direction)]
+    if sort_field != "_id":
+        sort_spec.append(("_id", sort_direction))
     
-    # Get paginated results
-    results = list(cursor.skip(skip).limit(page_size))
+    if projection and any(projection.values()):
+        projection = {**projection, sort_field: 1}
+    
+    return find_query, sort_spec, projection
+
+def build_page(results, page, page_size, sort_by=None, after=None, total_count=None):
+    """Trim the look-ahead document and build the pagination metadata"""
+    sort_field = sort_by[0] if sort_by else "_id"
     
-    # Fix ObjectIds
-    results = Database.fix_ids(results)
+    has_more = len(results) > page_size
+    results = results[:page_size]
     
-    # Calculate pagination metadata
-    total_pages = (total_count + page_size - 1) // page_size
+    next_cursor = None
+    if has_more:
+        last = results[-1]
+        sort_value = None if sort_field == "_id" else last.get(sort_field)
+        next_cursor = encode_cursor(sort_value, last["_id"])
+    
+    pagination = {
+        "current_page": None if after else page,
+        "page_size": page_size,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
+    
+    if total_count is not None:
+        pagination["total_items"] = total_count
+        pagination["total_pages"] = (total_count + page_size - 1) // page_size
     
     return {
         "data": results,
-        "pagination": {
-            "total_items": total_count,
-            "total_pages": total_pages,
-            "current_page": page,
-            "page_size": page_size
-        }
-    }
\ No newline at end of file
+        "pagination": pagination
+    }
+
+def paginate_results(collection, query, page=1, page_size=10, sort_by=None, after=None, with_total=True,
+                     projection=None):
+    """Helper function to paginate query results
+    
+    See build_page_query for the offset and keyset modes. Every response
+    includes a ``next_cursor`` that can be sent back as ``after`` to fetch
+    the following page in constant time.
+    """
+    db_instance = Database.get_instance()
+    collection = db_instance.get_collection(collection)
+    
+    find_query, sort_spec, projection = build_page_query(query, sort_by, after, projection)
+    cursor = collection.find(find_query, projection).sort(sort_spec)
+    
+    if not after:
+        # Calculate skip value (for pagination)
+        cursor = cursor.skip((page - 1) * page_size)
+    
+    # Fetch one extra document to know whether another page exists
+    results = list(cursor.limit(page_size + 1))
+    
+    # Get total count (for pagination metadata) only when requested
+    total_count = collection.count_documents(query) if with_total else None
+    
+    return build_page(results, page, page_size, sort_by, after, total_count)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { motion } from "framer-motion";
 import { useNavigate } from "react-router-dom";
 import { Calendar, Clock, CheckCircle, XCircle } from "lucide-react";
@@ -14,6 +14,37 @@ import AdminAppointmentItem from "@/components/admin-dashboard/AdminAppointmentI
 import EmptyStateAdminAppointments from "@/components/admin-dashboard/EmptyStateAdminAppointments";
 import UpdateStatusDialog from "@/components/admin-dashboard/UpdateStatusDialog";
 
+// Citas mostradas por pestaña; los totales vienen del resumen del servidor
+const LIST_PAGE_SIZE = 20;
+
+const STATUS_VALUES = {
+  pendiente: "pending",
+  completada: "completed",
+  cancelada: "cancelled",
+};
+
+const toISODate = (date) => date.toISOString().split("T")[0];
+
+// Filtros del servidor para cada pestaña (los mismos que usa el resumen)
+const tabFilters = (tab) => {
+  const today = new Date();
+  switch (tab) {
+    case "today":
+      return { dateFrom: toISODate(today), dateTo: toISODate(today) };
+    case "upcoming": {
+      const tomorrow = new Date(today);
+      tomorrow.setDate(today.getDate() + 1);
+      return { status: "pending", dateFrom: toISODate(tomorrow) };
+    }
+    case "completed":
+      return { status: "completed" };
+    case "cancelled":
+      return { status: "cancelled" };
+    default:
+      return {};
+  }
+};
+
 const AdminDashboard = () => {
   const { isAuthenticated, isAdmin, loading } = useAuth();
   const navigate = useNavigate();
@@ -27,6 +58,15 @@ const AdminDashboard = () => {
   const [searchTerm, setSearchTerm] = useState("");
   const [statusFilter, setStatusFilter] = useState("all");
   const [activeTab, setActiveTab] = useState("all");
+  // Usuarios ya consultados, por ID
+  const usersRef = useRef({});
+  const [summaryStats, setSummaryStats] = useState({
+    total: 0,
+    today: 0,
+    upcoming: 0,
+    completed: 0,
+    cancelled: 0,
+  });
 
   // Redirige si no es administrador
   useEffect(() => {
@@ -40,12 +80,12 @@ const AdminDashboard = () => {
     }
   }, [loading, isAuthenticated, isAdmin, navigate]);
 
-  // Carga las citas al iniciar
+  // Carga el resumen y las citas de la pestaña y el estado elegidos
   useEffect(() => {
     if (!loading && isAuthenticated && isAdmin()) {
       loadData();
     }
-  }, [loading, isAuthenticated, isAdmin]);
+  }, [loading, isAuthenticated, isAdmin, activeTab, statusFilter]);
 
   const translateStatus = (status) => {
     switch (status) {
@@ -62,18 +102,33 @@ const AdminDashboard = () => {
 
   const loadData = async () => {
     try {
-      // Obtener citas y usuarios
-      const appointmentsData = await dateService.getAllDates(1, 1000);
-      const usersData = await userService.getAllUsers(1, 1000);
-      
-      // Crear mapa de usuarios por ID
-      const userMap = {};
-      for (const user of usersData.data || []) {
-        userMap[user.userId] = user;
+      const filters = tabFilters(activeTab);
+      if (statusFilter !== "all" && !filters.status) {
+        filters.status = STATUS_VALUES[statusFilter];
       }
 
+      // Obtener el resumen y solo la página de citas que se muestra
+      const [summaryData, appointmentsData] = await Promise.all([
+        dateService.getDatesSummary(),
+        dateService.getAllDates(1, LIST_PAGE_SIZE, filters),
+      ]);
+      setSummaryStats(summaryData);
+      const appointments = appointmentsData.data || [];
+
+      // Obtener solo los usuarios de esas citas que aún no se conocen
+      const userMap = usersRef.current;
+      const missingIds = [...new Set(appointments.map((app) => app.userId))].filter(
+        (userId) => !(userId in userMap)
+      );
+      const users = await Promise.all(
+        missingIds.map((userId) => userService.getUserById(userId).catch(() => null))
+      );
+      missingIds.forEach((userId, index) => {
+        userMap[userId] = users[index];
+      });
+
       // Normalizar citas con info de usuario
-      const normalized = (appointmentsData.data || []).map((app) => {
+      const normalized = appointments.map((app) => {
         const user = userMap[app.userId];
 
         return {
@@ -96,24 +151,10 @@ const AdminDashboard = () => {
     }
   };
 
-  // Filtrar citas
+  // Filtrar citas (la pestaña ya se filtra en el servidor)
   useEffect(() => {
     let filtered = [...allAppointments];
 
-    if (activeTab === "today") {
-      const today = new Date().toISOString().split("T")[0];
-      filtered = filtered.filter((app) => app.date === today);
-    } else if (activeTab === "upcoming") {
-      const today = new Date();
-      filtered = filtered.filter(
-        (app) => new Date(app.date) > today && app.status === "pendiente"
-      );
-    } else if (activeTab === "completed") {
-      filtered = filtered.filter((app) => app.status === "completada");
-    } else if (activeTab === "cancelled") {
-      filtered = filtered.filter((app) => app.status === "cancelada");
-    }
-
     if (statusFilter !== "all") {
       filtered = filtered.filter((app) => app.status === statusFilter);
     }
@@ -133,7 +174,7 @@ const AdminDashboard = () => {
 
     filtered.sort((a, b) => new Date(b.date) - new Date(a.date));
     setFilteredAppointments(filtered);
-  }, [allAppointments, searchTerm, statusFilter, activeTab]);
+  }, [allAppointments, searchTerm, statusFilter]);
 
   const handleConfirmStatusChange = async () => {
     console.log(selectedAppointment);
@@ -170,19 +211,6 @@ const AdminDashboard = () => {
     setIsDialogOpen(true);
   };
 
-  const summaryStats = useMemo(() => {
-    const today = new Date().toISOString().split("T")[0];
-    return {
-      total: allAppointments.length,
-      today: allAppointments.filter((app) => app.date === today).length,
-      upcoming: allAppointments.filter(
-        (app) => new Date(app.date) > new Date() && app.status === "pendiente"
-      ).length,
-      completed: allAppointments.filter((app) => app.status === "completada").length,
-      cancelled: allAppointments.filter((app) => app.status === "cancelada").length,
-    };
-  }, [allAppointments]);
-
   const renderAppointmentsList = (appointmentsToRender) => {
     if (appointmentsToRender.length === 0) {
       return <EmptyStateAdminAppointments />;
@@ -54,11 +54,29 @@ const AppointmentForm = () => {
   }, [isAuthenticated, navigate]);
 
   useEffect(() => {
-    if (formData.date) {
-      setAvailableTimes(availableTimeSlots);
-    } else {
+    if (!formData.date) {
       setAvailableTimes([]);
+      return;
     }
+
+    let cancelled = false;
+    dateService
+      .getAvailability(formData.date)
+      .then((availability) => {
+        if (!cancelled) {
+          setAvailableTimes(availability.days?.[0]?.slots || []);
+        }
+      })
+      .catch(() => {
+        // Si falla la consulta, mostrar los horarios por defecto
+        if (!cancelled) {
+          setAvailableTimes(availableTimeSlots);
+        }
+      });
+
+    return () => {
+      cancelled = true;
+    };
   }, [formData.date]);
 
   const handleFieldChange = (field, value) => {
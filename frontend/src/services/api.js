@@ -218,6 +218,18 @@ export const dateService = {
         }
     },
 
+    // Obtener horarios libres en un rango de fechas
+    getAvailability: async (dateFrom, dateTo = dateFrom, slotMinutes = 30) => {
+        try {
+            const response = await api.get(
+                `/dates/availability?from=${dateFrom}&to=${dateTo}&slot_minutes=${slotMinutes}`
+            );
+            return response.data;
+        } catch (error) {
+            throw error;
+        }
+    },
+
     // Cancelar una cita
     cancelDate: async (dateId) => {
         try {
@@ -253,6 +265,27 @@ export const dateService = {
         }
     },
 
+    // Obtener resumen de citas para el panel (admin)
+    getDatesSummary: async (filters = {}) => {
+        try {
+            const { dateFrom, dateTo } = filters;
+            const params = new URLSearchParams();
+
+            if (dateFrom) {
+                params.append('date_from', dateFrom);
+            }
+            if (dateTo) {
+                params.append('date_to', dateTo);
+            }
+
+            const query = params.toString();
+            const response = await api.get(`/admin/dates/summary${query ? `?${query}` : ''}`);
+            return response.data;
+        } catch (error) {
+            throw error;
+        }
+    },
+
     // Actualizar una cita (admin)
     updateDate: async (dateId, dateData) => {
         try {
@@ -273,6 +306,19 @@ export const dateService = {
         }
     },
 
+    // Cambiar el estado de varias citas pendientes (admin)
+    bulkUpdateStatus: async (dateIds, status) => {
+        try {
+            const response = await api.put('/admin/dates/bulk/status', {
+                ids: dateIds,
+                status
+            });
+            return response.data;
+        } catch (error) {
+            throw error;
+        }
+    },
+
     // Marcar una cita como cancelada (admin)
     CancelDate: async (dateId) => {
         try {